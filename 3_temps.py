@@ -3,98 +3,114 @@ import board
 import adafruit_dht
 from w1thermsensor import W1ThermSensor
 import time
+import asyncio
 from datetime import datetime
+from streaming_stats import ChannelStats, TEMPERATURE_RANGE, HUMIDITY_RANGE
 import RPi.GPIO as GPIO
-
-class PIController:
-    def __init__(self, T, L):
-        # Obliczanie parametrów według tabeli
-        self.Kp = 0.9 * T / L
-        self.Ti = L / 0.3
-        self.integral = 0.0
-        self.previous_time = None
-
-    def compute(self, setpoint, measured_value):
-        current_time = time.time()
-        error = setpoint - measured_value
-
-        # Obliczenie całki (integral) z uchybu
-        if self.previous_time is not None:
-            dt = current_time - self.previous_time
-            self.integral += error * dt
-        else:
-            dt = 0
-
-        # Składowe regulatora PI
-        P = self.Kp * error
-        I = (self.Kp / self.Ti) * self.integral
-        output = P + I
-
-        self.previous_time = current_time
-
-        return max(0, min(100, output)), error, P, I
+from async_poller import AsyncPoller
+from controller_bank import ControllerBank
+from relay_autotune import RelayAutotuner
+from uplink import Uplink
+from store_forward import DurableQueue
+from device_config import DeviceConfig
+from sensor_cache import SensorCache, read_dht
+import metrics
+from actuators import open_actuator, slow_driver
+from compression import TelemetryFilter
+from temperature_estimator import TemperatureEstimator
+from w1_bus import ResolutionPolicy
+from sample_ring import SampleRing, RingDHT, RingThermometer, RingError
 
 # Klasa TerrariumLamp
 class TerrariumLamp:
-    def __init__(self, terrarium_id, dht22_t1=None, dht11_t2=None, ds18b20=None, pwm_pin=None):
+    def __init__(self, terrarium_id, dht22_t1=None, dht11_t2=None, ds18b20=None, pwm_pin=None, uplink=None,
+                 sensor_cache=None, ring=None):
         self.terrarium_id = terrarium_id
         self.dht22_t1 = dht22_t1
         self.dht11_t2 = dht11_t2
         self.ds18b20 = ds18b20
         self.pwm_pin = pwm_pin
-        self.hourly_data = []  # Lista przechowująca dane do statystyk
+        self.uplink = uplink  # Wspólna kolejka wysyłki w tle (uplink.Uplink)
+        # Wspólny bufor odczytów (sensor_cache.SensorCache): DHT czytane najwyżej
+        # raz na minimalny odstęp, niezależnie od liczby odbiorców
+        self.sensor_cache = sensor_cache if sensor_cache is not None else SensorCache()
+        self.ring = ring  # Bufor samplera (sampler.py) zamiast własnych odczytów czujników
+        self.pins = []  # Piny z konfiguracji, z których powstały czujniki i PWM
+        # Bieżące odczyty idą na API tylko po zmianie większej niż strefa martwa
+        # albo co heartbeat sekund
+        self.telemetry = TelemetryFilter()
+        # Statystyki strumieniowe (stała pamięć) zamiast listy wszystkich odczytów
+        self.stats = {
+            "dht22_temp": ChannelStats(TEMPERATURE_RANGE),
+            "dht11_temp": ChannelStats(TEMPERATURE_RANGE),
+            "humidity": ChannelStats(HUMIDITY_RANGE),
+        }
 
-    def get_dht22_readings(self):
-        if self.dht22_t1:
+    def release(self):
+        # Wyłączenie grzałki i zwolnienie czujników (zmiana pinów, usunięcie terrarium)
+        old_pwm = self.pwm_pin
+        self.pwm_pin = None
+        if old_pwm is not None:
             try:
-                temp = self.dht22_t1.temperature
-                humidity = self.dht22_t1.humidity
-                return temp, humidity
+                old_pwm.ChangeDutyCycle(100)  # Odwrócona logika: 100% to grzałka wyłączona
+                old_pwm.stop()
             except Exception as e:
-                print(f"Error reading from DHT22: {e}")
-        return None, None
+                print(f"Error stopping pwm pin: {e}")
+        for sensor in (self.dht22_t1, self.dht11_t2, self.ds18b20):
+            self.sensor_cache.forget(sensor)
+        for sensor in (self.dht22_t1, self.dht11_t2):
+            if sensor is not None:
+                try:
+                    sensor.exit()
+                except Exception as e:
+                    print(f"Error releasing DHT sensor: {e}")
+        self.dht22_t1 = self.dht11_t2 = self.ds18b20 = None
+
+    def apply_pins(self, pins):
+        # Zmiana pinów w trakcie pracy: najpierw wyłączenie starej grzałki,
+        # bo nowy PWM może używać tego samego pinu
+        self.release()
+        self.pins = pins
+        new = setup_devices(pins, self.terrarium_id, self.ring)
+        self.dht22_t1 = new["dht22_t1"]
+        self.dht11_t2 = new["dht11_t2"]
+        self.ds18b20 = new["ds18b20"]
+        self.pwm_pin = new["pwm_pin"]
+
+    def get_dht22_readings(self):
+        return read_dht(self.sensor_cache, self.dht22_t1)
 
     def get_dht11_readings(self):
-        if self.dht11_t2:
-            try:
-                temp = self.dht11_t2.temperature
-                humidity = self.dht11_t2.humidity
-                return temp, humidity
-            except Exception as e:
-                print(f"Error reading from DHT11: {e}")
-        return None, None
+        return read_dht(self.sensor_cache, self.dht11_t2)
 
     def get_ds18b20_temperature(self):
         if self.ds18b20:
-            try:
-                temp = self.ds18b20.get_temperature()
-                return temp
-            except Exception as e:
-                print(f"Error reading from DS18B20: {e}")
+            reading = self.sensor_cache.read(self.ds18b20, self.ds18b20.get_temperature)
+            if reading.error is not None:
+                print(f"Error reading from DS18B20: {reading.error}")
+            return reading.value
         return None
 
     def record_hourly_reading(self, dht22_temp, dht11_temp, dht11_humidity):
-        """Zapisuje odczyty do listy przechowującej dane do statystyk."""
-        self.hourly_data.append({
-            "dht22_temp": dht22_temp,
-            "dht11_temp": dht11_temp,
-            "humidity": dht11_humidity
-        })
+        """Dodaje odczyty do statystyk (brakujące wartości są pomijane)."""
+        self.stats["dht22_temp"].add(dht22_temp)
+        self.stats["dht11_temp"].add(dht11_temp)
+        self.stats["humidity"].add(dht11_humidity)
+
+    def window_stats(self, window="hour"):
+        """Statystyki z okna "minute", "hour" albo "day" dla wszystkich kanałów."""
+        return {channel: stats.summary(window) for channel, stats in self.stats.items()}
 
     def calculate_and_send_hourly_stats(self, stats_api_url):
-        """Oblicza średnie dane z hourly_data i wysyła je na API."""
-        if not self.hourly_data:
+        """Oblicza średnie dane od ostatniego wysłania i wysyła je na API."""
+        if not any(stats.period.count for stats in self.stats.values()):
             print(f"No data to calculate for Terrarium ID {self.terrarium_id}")
             return
 
-        # Obliczenie średnich wartości
-        dht22_temps = [data["dht22_temp"] for data in self.hourly_data if data["dht22_temp"] is not None]
-        dht11_temps = [data["dht11_temp"] for data in self.hourly_data if data["dht11_temp"] is not None]
-        humidities = [data["humidity"] for data in self.hourly_data if data["humidity"] is not None]
-
-        avg_dht22_temp = sum(dht22_temps) / len(dht22_temps) if dht22_temps else 0
-        avg_dht11_temp = sum(dht11_temps) / len(dht11_temps) if dht11_temps else 0
-        avg_humidity = sum(humidities) / len(humidities) if humidities else 0
+        # Obliczenie średnich wartości (rozpoczyna nowy okres)
+        avg_dht22_temp = self.stats["dht22_temp"].take_period()["mean"] or 0
+        avg_dht11_temp = self.stats["dht11_temp"].take_period()["mean"] or 0
+        avg_humidity = self.stats["humidity"].take_period()["mean"] or 0
 
         # Przygotowanie danych do wysyłki
         data = {
@@ -107,23 +123,30 @@ class TerrariumLamp:
         }
 
         # Wysłanie danych na API
-        try:
-            response = requests.post(stats_api_url, json=data)
-            if response.status_code == 201:
-                print(f"Hourly stats sent successfully for Terrarium ID {self.terrarium_id}.")
-            else:
-                print(f"Failed to send stats for Terrarium ID {self.terrarium_id}. Status code: {response.status_code}")
-                print(f"Response: {response.text}")
-        except requests.RequestException as e:
-            print(f"Error sending stats for Terrarium ID {self.terrarium_id}: {e}")
+        if self.uplink is not None:
+            self.uplink.post(stats_api_url, json=data, callback=self._report_stats)
+        else:
+            try:
+                response = requests.post(stats_api_url, json=data)
+                self._report_stats(None, response, None)
+            except requests.RequestException as e:
+                self._report_stats(None, None, e)
 
-        # Wyczyszczenie danych po wysłaniu
-        self.hourly_data.clear()
+    def send_readings(self, api_url_base, readings=None):
+        """Wysyła aktualne odczyty do API w celu zaktualizowania bieżących wartości.
+
+        readings = (dht22_temp, dht11_temp, dht11_humidity) pozwala wysłać
+        już wykonane odczyty zamiast czytać czujniki drugi raz.
+        """
+        if readings is None:
+            dht22_temp, dht22_humidity = self.get_dht22_readings()
+            dht11_temp, dht11_humidity = self.get_dht11_readings()
+        else:
+            dht22_temp, dht11_temp, dht11_humidity = readings
 
-    def send_readings(self, api_url_base):
-        """Wysyła aktualne odczyty do API w celu zaktualizowania bieżących wartości."""
-        dht22_temp, dht22_humidity = self.get_dht22_readings()
-        dht11_temp, dht11_humidity = self.get_dht11_readings()
+        if not self.telemetry.update({"dht22_temp": dht22_temp, "dht11_temp": dht11_temp,
+                                      "dht11_humidity": dht11_humidity}):
+            return
 
         params = {
             "current_temperature1": dht22_temp if dht22_temp is not None else 0,
@@ -132,127 +155,260 @@ class TerrariumLamp:
         }
 
         api_url = f"{api_url_base}/update/{self.terrarium_id}"
+        if self.uplink is not None:
+            self.uplink.put(api_url, params=params, callback=self._report_readings,
+                            batch_payload=dict(params, terrarium_id=self.terrarium_id), coalesce_key=api_url)
+            return
         try:
             response = requests.put(api_url, params=params)
-            if response.status_code == 200:
-                print(f"Current readings updated for Terrarium ID {self.terrarium_id}.")
-            else:
-                print(f"Failed to update readings for Terrarium ID {self.terrarium_id}.")
+            self._report_readings(None, response, None)
         except requests.RequestException as e:
-            print(f"Error sending current readings for Terrarium ID {self.terrarium_id}: {e}")
+            self._report_readings(None, None, e)
 
-# Funkcje pobierania danych
-def fetch_terrariums(user_id):
-    url = f"http://212.47.71.180:8080/terrariums/user/id/{user_id}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error fetching terrariums: {e}")
-        return []
-
-def fetch_pins(user_id):
-    url = f"http://212.47.71.180:8080/pins/pins/{user_id}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error fetching pins: {e}")
-        return []
-
-def lamp_pin_setup(terrarium_id):
-    pins = fetch_pins(user_id=1)
-    dht22_sensor = None
-    dht11_sensor = None
-    ds18b20_sensor = None
-    pwm_pin = None
+    def _report_stats(self, request, response, error):
+        if error is not None:
+            print(f"Error sending stats for Terrarium ID {self.terrarium_id}: {error}")
+        elif response.status_code == 201:
+            print(f"Hourly stats sent successfully for Terrarium ID {self.terrarium_id}.")
+        else:
+            print(f"Failed to send stats for Terrarium ID {self.terrarium_id}. Status code: {response.status_code}")
+            print(f"Response: {response.text}")
+
+    def _report_readings(self, request, response, error):
+        if error is not None:
+            print(f"Error sending current readings for Terrarium ID {self.terrarium_id}: {error}")
+        elif response.status_code == 200:
+            print(f"Current readings updated for Terrarium ID {self.terrarium_id}.")
+        else:
+            print(f"Failed to update readings for Terrarium ID {self.terrarium_id}.")
 
+# Inicjalizacja czujników i PWM terrarium z listy jego pinów.
+# Gdy działa sampler.py, czujniki czytane są z jego bufora w pamięci
+# współdzielonej, a ten proces steruje tylko PWM.
+def setup_devices(pins, terrarium_id=None, ring=None):
+    devices = {"dht22_t1": None, "dht11_t2": None, "ds18b20": None, "pwm_pin": None}
     for pin in pins:
-        if pin["terrarium_id"] == terrarium_id:
-            function = pin["function"]
-            if function == "t1":
-                try:
-                    gpio_pin = getattr(board, f"D{pin['id']}")
-                    dht22_sensor = adafruit_dht.DHT22(gpio_pin)
-                except Exception as e:
-                    print(f"Error initializing DHT22: {e}")
-            elif function == "t2":
-                try:
-                    gpio_pin = getattr(board, f"D{pin['id']}")
-                    dht11_sensor = adafruit_dht.DHT11(gpio_pin)
-                except Exception as e:
-                    print(f"Error initializing DHT11: {e}")
-            elif function == "3ce1d4433914":
-                try:
-                    ds18b20_sensor = W1ThermSensor(sensor_id=function)
-                except Exception as e:
-                    print(f"Error initializing DS18B20: {e}")
-            elif function == "pwm":
-                try:
-                    pwm_pin = pin['id']
-                    GPIO.setmode(GPIO.BCM)
-                    GPIO.setup(pwm_pin, GPIO.OUT)
-                    pwm = GPIO.PWM(pwm_pin, 100)
-                    pwm.start(100)
-                except Exception as e:
-                    print("Error initalizing pwm pin")
-
-    return TerrariumLamp(
-        terrarium_id=terrarium_id,
-        dht22_t1=dht22_sensor,
-        dht11_t2=dht11_sensor,
-        ds18b20=ds18b20_sensor,
-        pwm_pin = pwm
+        function = pin["function"]
+        if ring is not None and function in ("t1", "t2", "3ce1d4433914"):
+            name = {"t1": "dht22", "t2": "dht11"}.get(function)
+            if name is None:
+                devices["ds18b20"] = RingThermometer(ring, f"{terrarium_id}.ds18b20")
+            else:
+                key = "dht22_t1" if function == "t1" else "dht11_t2"
+                devices[key] = RingDHT(ring, f"{terrarium_id}.{name}_temp", f"{terrarium_id}.{name}_humidity")
+        elif function == "t1":
+            try:
+                gpio_pin = getattr(board, f"D{pin['id']}")
+                devices["dht22_t1"] = adafruit_dht.DHT22(gpio_pin)
+            except Exception as e:
+                print(f"Error initializing DHT22: {e}")
+        elif function == "t2":
+            try:
+                gpio_pin = getattr(board, f"D{pin['id']}")
+                devices["dht11_t2"] = adafruit_dht.DHT11(gpio_pin)
+            except Exception as e:
+                print(f"Error initializing DHT11: {e}")
+        elif function == "3ce1d4433914":
+            # Własna konwersja i rozdzielczość (AdaptiveResolution) tej lampy;
+            # wspólną konwersję całej magistrali (w1_bus) robi sampler.py
+            try:
+                devices["ds18b20"] = W1ThermSensor(sensor_id=function)
+            except Exception as e:
+                print(f"Error initializing DS18B20: {e}")
+        elif function == "pwm":
+            try:
+                GPIO.setmode(GPIO.BCM)
+                # Sprzętowy PWM albo wspólny wątek wyjść SSR zamiast GPIO.PWM
+                pwm = open_actuator(pin['id'])
+                pwm.start(100)
+                devices["pwm_pin"] = pwm
+            except Exception as e:
+                print(f"Error initalizing pwm pin: {e}")
+    return devices
+
+def lamp_pin_setup(terrarium_id, pins, ring=None):
+    lamp = TerrariumLamp(terrarium_id=terrarium_id, ring=ring, **setup_devices(pins, terrarium_id, ring))
+    lamp.pins = pins
+    return lamp
+
+async def send_hourly_stats(poller, lamp_terrariums, stats_api_url, stop_event):
+    current_hour = datetime.now().hour
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        new_hour = datetime.now().hour
+        if new_hour != current_hour:
+            # Kopia listy: lampy dochodzą i znikają przy zmianach konfiguracji
+            for lamp in list(lamp_terrariums):
+                # Ten sam wątek co on_sample, więc statystyki nie wymagają blokady
+                await loop.run_in_executor(poller.io_executor, lamp.calculate_and_send_hourly_stats, stats_api_url)
+            current_hour = new_hour
+        try:
+            await asyncio.wait_for(stop_event.wait(), 5)
+        except asyncio.TimeoutError:
+            pass
+
+async def main(poller, lamp_terrariums, stats_api_url):
+    stop_event = asyncio.Event()
+    await asyncio.gather(
+        poller.run(stop_event),
+        send_hourly_stats(poller, lamp_terrariums, stats_api_url, stop_event),
     )
 
-# Główna funkcja
-if __name__ == "__main__":
+# Główna funkcja. supervisor.py uruchamia ją w kilku procesach: terrarium_ids
+# to terraria danego workera, heartbeat(terrarium_id) sygnalizuje każdy cykl
+# lampy, a numer workera rozdziela kolejkę wysyłki i port metryk.
+def run(terrarium_ids=None, heartbeat=None, worker=None):
     T = 750.0  # Stała czasowa procesu
     L = 64.0  # Czas opóźnienia procesu
     setpoint = 34.0  # Zadana temperatura
-    pi_controller = PIController(T, L)
+    # Nowe terrarium / nowy typ grzałki: "pi", "pid", "pi_tyreus_luyben" (relay_autotune.TUNING_RULES)
+    # włącza auto-tuning przekaźnikowy przed regulacją; None = nastawy z T i L
+    autotune_rule = None
     user_id = 1
     lamp_terrariums = []
-    terrariums = fetch_terrariums(user_id)
+    # Konfiguracja z lokalnej kopii, odświeżana w tle zapytaniami warunkowymi
+    config = DeviceConfig(user_id).ensure_loaded()
+    terrariums = config.terrariums()
     stats_api_url = "http://212.47.71.180:8080/readings"
-    current_hour = datetime.now().hour
 
-    for terrarium in terrariums:
-        if terrarium["type"].lower() == "lampa":
-            lamp_terrariums.append(lamp_pin_setup(terrarium["id"]))
-    start_time = time.time()
+    # Jedna sesja keep-alive dla wszystkich terrariów, zaległe żądania czekają na dysku
+    store = DurableQueue() if worker is None else DurableQueue(f"uplink_queue.worker{worker}.sqlite3")
+    uplink = Uplink(store=store).start()
+    # Jedyny właściciel czujników: regulator, wysyłka i statystyki czytają przez bufor
+    sensors = SensorCache()
     try:
-        while True:
-            for lamp in lamp_terrariums:
+        ring = SampleRing.attach()
+        print(f"Reading sensors from sampler ring ({len(ring.channels)} channels).")
+    except RingError:
+        ring = None
+
+    def is_lamp(terrarium):
+        # Pod supervisor.py terraria spoza sharda obsługują inne workery
+        return (terrarium is not None and terrarium["type"].lower() == "lampa"
+                and (terrarium_ids is None or terrarium["id"] in terrarium_ids))
+
+    def new_lamp(terrarium_id):
+        lamp = lamp_pin_setup(terrarium_id, config.pins_for(terrarium_id), ring)
+        lamp.uplink = uplink
+        lamp.sensor_cache = sensors
+        return lamp
+
+    for terrarium in terrariums:
+        if is_lamp(terrarium):
+            lamp_terrariums.append(new_lamp(terrarium["id"]))
+    lamps_by_id = {lamp.terrarium_id: lamp for lamp in lamp_terrariums}
+
+    # Zmiany konfiguracji w trakcie pracy (wątek odświeżania DeviceConfig):
+    # nowe terraria z lampą dostają pętlę sterowania, usunięte albo o innym
+    # typie - wyłączoną grzałkę, a zmienione piny - nowe czujniki i PWM
+    def on_config_changed(config, changed_ids):
+        for terrarium_id in changed_ids:
+            lamp = lamps_by_id.get(terrarium_id)
+            wanted = is_lamp(config.terrarium(terrarium_id))
+            if lamp is not None and not wanted:
+                print(f"Terrarium ID {terrarium_id} removed or no longer a lamp, switching its heater off.")
                 try:
-                    current_temperature = lamp.ds18b20.get_temperature()
+                    poller.remove_lamp(terrarium_id, timeout=10.0)
                 except Exception as e:
-                    print(f"Error reading temperature: {e}")
-                    current_temperature = None
-                if current_temperature is not None:
-                    pi_output, error, P, I = pi_controller.compute(setpoint, current_temperature)
-                    
-                    # Odwrócona logika PWM
-                    inverted_pwm = 100 - pi_output  # Invert the duty cycle
-                    lamp.pwm_pin.ChangeDutyCycle(inverted_pwm)
-
-                    elapsed_time = time.time() - start_time
-                    print(f"Time: {elapsed_time:.1f}s, Temp: {current_temperature:.2f}°C, Error: {error:.2f}, "
-                  f"PI Output: {pi_output:.2f}%, PWM: {inverted_pwm:.2f}%, P: {P:.2f}, I: {I:.2f}")
-
-                dht22_temp, dht22_humidity = lamp.get_dht22_readings()
-                dht11_temp, dht11_humidity = lamp.get_dht11_readings()
-                lamp.record_hourly_reading(dht22_temp, dht11_temp, dht11_humidity)
-                lamp.send_readings(api_url_base="http://212.47.71.180:8080/terrariums")
-
-            new_hour = datetime.now().hour
-            if new_hour != current_hour:
-                for lamp in lamp_terrariums:
-                    lamp.calculate_and_send_hourly_stats(stats_api_url)
-                current_hour = new_hour
-
-            time.sleep(5)
+                    print(f"Error stopping control loop of Terrarium ID {terrarium_id}: {e}")
+                lamp.release()
+                del lamps_by_id[terrarium_id]
+                lamp_terrariums.remove(lamp)
+            elif lamp is None and wanted:
+                print(f"Terrarium ID {terrarium_id} added, starting its control loop.")
+                lamp = new_lamp(terrarium_id)
+                lamps_by_id[terrarium_id] = lamp
+                lamp_terrariums.append(lamp)
+                poller.add_lamp(lamp)
+            elif lamp is not None and config.pins_for(terrarium_id) != lamp.pins:
+                print(f"Pins changed for Terrarium ID {terrarium_id}, reinitializing devices.")
+                lamp.apply_pins(config.pins_for(terrarium_id))
+
+    start_time = time.time()
+
+    def on_sample(sample):
+        lamp = lamps_by_id.get(sample["terrarium_id"])
+        if lamp is None:  # Usunięte po tym cyklu
+            return
+        # Regulator działa też bez świeżego DS18B20, gdy jest estymata
+        if sample["error"] is not None:
+            elapsed_time = sample["time"] - start_time
+            temperature = "n/a" if sample["temperature"] is None else f"{sample['temperature']:.2f}°C"
+            print(f"Terrarium {lamp.terrarium_id} Time: {elapsed_time:.1f}s, Temp: {temperature}, "
+                  f"Estimate: {sample['estimate']:.2f}°C, Error: {sample['error']:.2f}, PI Output: {sample['output']:.2f}%, PWM: {sample['pwm']:.2f}%, "
+                  f"P: {sample['P']:.2f}, I: {sample['I']:.2f}")
+        lamp.record_hourly_reading(sample["dht22_temp"], sample["dht11_temp"], sample["dht11_humidity"])
+        lamp.send_readings(api_url_base="http://212.47.71.180:8080/terrariums",
+                           readings=(sample["dht22_temp"], sample["dht11_temp"], sample["dht11_humidity"]))
+
+    # Każda lampa ma własny regulator PI (kanał wspólnego banku z anti-windupem)
+    # i własny termin cyklu; regulator dostaje estymatę temperatury z filtru
+    # Kalmana (DS18B20 + DHT22 + DHT11 + moc grzałki) zamiast surowego DS18B20
+    # Sterowanie co 1 s, wysyłka odczytów co 5 s
+    controllers = ControllerBank(capacity=len(lamp_terrariums))
+
+    def on_tuned(tuner):
+        if tuner.result is not None:
+            result = tuner.result
+            print(f"Auto-tune done in {result['duration'] / 60:.0f} min: Ku={result['Ku']:.2f}, Pu={result['Pu']:.0f}s "
+                  f"-> add(kp={result['kp']:.3f}, ki={result['ki']:.5f}, kd={result['kd']:.1f}), "
+                  f"hold power {result['hold_power']:.0f}%")
+
+    def controller_factory():
+        channel = controllers.add_pi(T, L, setpoint)
+        if autotune_rule is None:
+            return channel
+        return RelayAutotuner(channel, rule=autotune_rule, on_tuned=on_tuned)
+
+    poller = AsyncPoller(lamp_terrariums, controller_factory, setpoint, period=1.0, on_sample=on_sample,
+                         publish_period=5.0, sensor_cache=sensors,
+                         estimator_factory=lambda: TemperatureEstimator(T=T, L=L),
+                         # 9 bitów (94 ms) przy nagrzewaniu, 12 bitów blisko zadanej
+                         resolution_policy=ResolutionPolicy(far=2.0, near=1.0), heartbeat=heartbeat)
+    # Subskrypcja dopiero po utworzeniu pollera, który dostaje nowe lampy
+    config.subscribe(on_config_changed)
+    config.start()
+
+    # Metryki etapów pętli: curl http://127.0.0.1:9100/metrics
+    # Profil stosów: curl "http://127.0.0.1:9100/profile?seconds=10"
+    def runtime_gauges():
+        gauges = [
+            ("uplink_queue_pending", {}, uplink.pending()),
+            ("uplink_store_rows", {}, len(uplink.store)),
+            ("uplink_dropped", {}, uplink.dropped),
+        ]
+        gauges += [(f"sensor_cache_{key}", {}, value) for key, value in sensors.stats().items()]
+        for terrarium_id, stats in poller.resolution_stats().items():
+            gauges.append(("ds18b20_resolution_bits", {"terrarium": str(terrarium_id)}, stats["resolution"]))
+            gauges.append(("ds18b20_sample_rate", {"terrarium": str(terrarium_id)}, stats["sample_rate"]))
+        for terrarium_id, timing in poller.timing_stats().items():
+            for key in ("overruns", "last_dt", "jitter_max", "duration_max"):
+                gauges.append((f"lamp_loop_{key}", {"terrarium": str(terrarium_id)}, timing[key]))
+        return gauges
+
+    metrics.REGISTRY.add_collector(runtime_gauges)
+    try:
+        port = metrics.METRICS_PORT if worker is None else metrics.METRICS_PORT + 1 + worker
+        metrics_server = metrics.serve(port=port, profiler=True)
+    except OSError as e:
+        print(f"Error starting metrics endpoint: {e}")
+        metrics_server = None
+    try:
+        asyncio.run(main(poller, lamp_terrariums, stats_api_url))
     except KeyboardInterrupt:
         print("Program zatrzymany.")
+    finally:
+        config.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        poller.close()
+        slow_driver().stop()
+        if uplink.stop():
+            uplink.store.close()
+        else:
+            print("Error stopping uplink: a request is still in flight, leaving the durable queue open")
+        if ring is not None:
+            ring.close()
+
+if __name__ == "__main__":
+    run()
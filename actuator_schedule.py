@@ -0,0 +1,333 @@
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None
+
+# Harmonogram wyjść dwustanowych (pompy, lampy, zraszacze) wszystkich
+# terrariów w jednym wątku, zamiast osobnego procesu z time.sleep() na
+# każde wyjście (water.py). Zdarzenia (włączenie z harmonogramu, wyłączenie
+# po czasie, limit bezpieczeństwa) leżą w kopcu po czasie, więc dodanie
+# zdarzenia kosztuje O(log n), a wątek śpi do najbliższego z nich.
+# Zdarzenia nieaktualne (np. wyłączenie po ręcznym przedłużeniu) nie są
+# usuwane z kopca, tylko pomijane przy zdjęciu.
+#
+# Terminy kolejnych uruchomień zapisywane są w STATE_PATH, więc po
+# restarcie harmonogram nie zaczyna się od nowa, a lampa, która powinna
+# świecić, zostaje od razu włączona do końca swojego okna. Zapis jest
+# odkładany (SAVE_INTERVAL), bo przy setkach wyjść terminy zmieniają się
+# co chwilę; po awarii najwyżej powtórzy się ostatni przegapiony termin.
+
+STATE_PATH = "actuator_schedule.json"
+DAY = 24 * 3600
+# Najdłuższy sen pętli [s]: co tyle sprawdzane jest should_stop i zdarzenia
+# dodane z innych wątków (pulse)
+IDLE_WAIT = 1.0
+SAVE_INTERVAL = 60.0  # Terminy zapisywane najwyżej raz na tyle sekund
+
+
+class Actuator:
+    """Wyjście dwustanowe z opcjonalnym limitem czasu włączenia max_on [s]."""
+
+    def __init__(self, name, pin, active_low=False, max_on=None, gpio=None, verbose=True):
+        self.name = name
+        self.pin = pin
+        self.active_low = active_low  # Np. pompa z water.py: LOW = włączona
+        self.max_on = max_on
+        self.gpio = gpio or GPIO
+        self.is_on = False
+        self.on_since = None
+        self.off_at = None
+        self.limit_trips = 0  # Wyłączenia przez max_on
+        self.verbose = verbose
+        self.gpio.setup(pin, self.gpio.OUT, initial=self._level(False))
+
+    def _level(self, on):
+        return self.gpio.HIGH if on != self.active_low else self.gpio.LOW
+
+    def set(self, on, now):
+        self.gpio.output(self.pin, self._level(on))
+        if on != self.is_on and self.verbose:
+            print(f"{self.name} {'ON' if on else 'OFF'}")
+        if on and not self.is_on:
+            self.on_since = now
+        if not on:
+            self.on_since = None
+            self.off_at = None
+        self.is_on = on
+
+
+def next_daily(at, after):
+    """Najbliższa chwila (czas uniksowy) po after o godzinie at ("HH:MM") czasu lokalnego."""
+    hour, minute = (int(part) for part in at.split(":"))
+    moment = datetime.fromtimestamp(after).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if moment.timestamp() <= after:
+        moment += timedelta(days=1)
+    return moment.timestamp()
+
+
+class Schedule:
+    """Cykliczne włączenie wyjścia na duration sekund.
+
+    Co period sekund od start albo codziennie o godzinie at ("HH:MM");
+    wersja z at liczy terminy z kalendarza, więc zmiana czasu letniego
+    nie przesuwa godziny włączenia lampy.
+    """
+
+    def __init__(self, name, actuator, duration, period=None, at=None, start=None):
+        if (period is None) == (at is None):
+            raise ValueError("Schedule needs exactly one of period or at")
+        self.name = name
+        self.actuator = actuator
+        self.duration = duration
+        self.period = period
+        self.at = at
+        self.next_fire = start
+        self.runs = 0
+
+    def following(self, fire):
+        """Termin po terminie fire."""
+        if self.at is not None:
+            return next_daily(self.at, fire)
+        return fire + self.period
+
+    def previous(self, fire):
+        if self.at is not None:
+            return next_daily(self.at, fire - DAY - 2 * 3600)
+        return fire - self.period
+
+    def catch_up(self, now):
+        """Przesuwa next_fire za now; zwraca koniec okna, które właśnie trwa, albo None."""
+        if self.next_fire > now:
+            last = self.previous(self.next_fire)
+        elif self.at is not None:
+            self.next_fire = next_daily(self.at, now)
+            last = self.previous(self.next_fire)
+        else:
+            missed = math.floor((now - self.next_fire) / self.period) + 1
+            last = self.next_fire + (missed - 1) * self.period
+            self.next_fire += missed * self.period
+        end = last + self.duration
+        return end if last <= now < end else None
+
+
+class ActuatorScheduler:
+    def __init__(self, state_path=STATE_PATH, clock=None, sleep=None, save_interval=SAVE_INTERVAL):
+        self.state_path = state_path
+        self.save_interval = save_interval
+        self.clock = clock or (lambda: time.time())
+        self.sleep = sleep or (lambda seconds: time.sleep(seconds))
+        self.actuators = {}
+        self.schedules = {}
+        self._heap = []  # (czas, nr, akcja, nazwa, klucz)
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+        self._saved = self._load()
+        self._dirty = False
+        self._last_save = self.clock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as file:
+                return json.load(file).get("next_fire", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Error loading actuator schedule state: {e}")
+            return {}
+
+    def save(self):
+        state = {"next_fire": {name: schedule.next_fire for name, schedule in self.schedules.items()}}
+        temporary = f"{self.state_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temporary, self.state_path)
+        self._dirty = False
+        self._last_save = self.clock()
+
+    def _push(self, when, action, name, key):
+        heapq.heappush(self._heap, (when, next(self._counter), action, name, key))
+
+    def add_actuator(self, actuator):
+        with self._lock:
+            self.actuators[actuator.name] = actuator
+        return actuator
+
+    def add_schedule(self, name, actuator_name, duration, period=None, at=None, start=None):
+        """Dodaje harmonogram; termin z pliku stanu ma pierwszeństwo przed start."""
+        now = self.clock()
+        schedule = Schedule(name, self.actuators[actuator_name], duration, period, at)
+        saved = self._saved.get(name)
+        if saved is not None:
+            schedule.next_fire = saved
+        elif at is not None:
+            schedule.next_fire = next_daily(at, now)
+        else:
+            schedule.next_fire = now if start is None else start
+        with self._lock:
+            self.schedules[name] = schedule
+            # Okno, które trwa (po restarcie albo codzienne dodane w ciągu dnia),
+            # jest dokańczane od razu
+            end = schedule.catch_up(now) if saved is not None or at is not None else None
+            if end is not None:
+                self._switch_on(schedule.actuator, now, end)
+            self._push(schedule.next_fire, "start", name, schedule.next_fire)
+        return schedule
+
+    def every(self, name, actuator_name, period, duration, start=None):
+        return self.add_schedule(name, actuator_name, duration, period=period, start=start)
+
+    def daily(self, name, actuator_name, at, duration):
+        return self.add_schedule(name, actuator_name, duration, at=at)
+
+    def pulse(self, actuator_name, duration):
+        """Włącza wyjście na duration sekund (można wołać z innych wątków)."""
+        with self._lock:
+            now = self.clock()
+            self._switch_on(self.actuators[actuator_name], now, now + duration)
+
+    def turn_off(self, actuator_name):
+        with self._lock:
+            self.actuators[actuator_name].set(False, self.clock())
+
+    def all_off(self):
+        """Stan bezpieczny: wszystkie wyjścia wyłączone."""
+        with self._lock:
+            now = self.clock()
+            for actuator in self.actuators.values():
+                try:
+                    actuator.set(False, now)
+                except Exception as e:
+                    print(f"Error switching off {actuator.name}: {e}")
+
+    def _switch_on(self, actuator, now, until):
+        if not actuator.is_on:
+            actuator.set(True, now)
+            if actuator.max_on is not None:
+                self._push(now + actuator.max_on, "limit", actuator.name, actuator.on_since)
+        # Nakładające się okna przedłużają włączenie, nie skracają go
+        if actuator.off_at is None or until > actuator.off_at:
+            actuator.off_at = until
+            self._push(until, "off", actuator.name, until)
+
+    def _handle(self, action, name, key, now):
+        if action == "start":
+            schedule = self.schedules.get(name)
+            if schedule is None or schedule.next_fire != key:
+                return
+            self._switch_on(schedule.actuator, now, now + schedule.duration)
+            schedule.runs += 1
+            schedule.next_fire = schedule.following(schedule.next_fire)
+            if schedule.next_fire <= now:
+                schedule.catch_up(now)
+            self._push(schedule.next_fire, "start", name, schedule.next_fire)
+            self._dirty = True
+        elif action == "off":
+            actuator = self.actuators[name]
+            if actuator.is_on and actuator.off_at == key:
+                actuator.set(False, now)
+        elif action == "limit":
+            actuator = self.actuators[name]
+            if actuator.is_on and actuator.on_since == key:
+                print(f"Error: {name} on for more than {actuator.max_on}s, switching off")
+                actuator.set(False, now)
+                actuator.limit_trips += 1
+
+    def run_pending(self):
+        """Obsługuje zdarzenia, których czas minął; zwraca czas do najbliższego albo None."""
+        while True:
+            with self._lock:
+                if not self._heap:
+                    return None
+                when, _, action, name, key = self._heap[0]
+                now = self.clock()
+                if when > now:
+                    return when - now
+                heapq.heappop(self._heap)
+                try:
+                    self._handle(action, name, key, now)
+                except Exception as e:
+                    print(f"Error in actuator event {action} {name}: {e}")
+
+    def run(self, should_stop=None):
+        """Pętla główna; kończy się, gdy should_stop() zwróci True."""
+        try:
+            while should_stop is None or not should_stop():
+                delay = self.run_pending()
+                if self._dirty and self.clock() - self._last_save >= self.save_interval:
+                    self._save_quietly()
+                self.sleep(IDLE_WAIT if delay is None else min(delay, IDLE_WAIT))
+        finally:
+            if self._dirty:
+                self._save_quietly()
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Error saving actuator schedule state: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, args=(self._stop.is_set,),
+                                            name="actuators", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from hardware_sim import VirtualClock, make_gpio_module
+
+    class _Backend:
+        def set_duty(self, pin, duty):
+            pass
+
+    gpio = make_gpio_module(_Backend())
+    clock = VirtualClock(start=time.time())
+    with tempfile.TemporaryDirectory() as workdir:
+        state_path = os.path.join(workdir, STATE_PATH)
+        scheduler = ActuatorScheduler(state_path, clock=clock.time, sleep=clock.advance)
+        terrariums = 300
+        for i in range(terrariums):
+            scheduler.add_actuator(Actuator(f"pump{i}", 100 + i, active_low=True, max_on=15, gpio=gpio, verbose=False))
+            scheduler.add_actuator(Actuator(f"lamp{i}", 1000 + i, max_on=13 * 3600, gpio=gpio, verbose=False))
+            scheduler.add_actuator(Actuator(f"mister{i}", 2000 + i, max_on=30, gpio=gpio, verbose=False))
+            scheduler.every(f"water{i}", f"pump{i}", period=3600, duration=10, start=clock.time() + i)
+            scheduler.daily(f"light{i}", f"lamp{i}", at="08:00", duration=12 * 3600)
+            scheduler.every(f"mist{i}", f"mister{i}", period=600, duration=20, start=clock.time() + i)
+        # Ręczne włączenie dłuższe niż limit: wyłączy je max_on
+        scheduler.pulse("mister0", 120)
+        start = time.perf_counter()
+        scheduler.run(lambda: clock.time() - clock.start >= DAY)
+        elapsed = time.perf_counter() - start
+        runs = sum(schedule.runs for schedule in scheduler.schedules.values())
+        trips = sum(actuator.limit_trips for actuator in scheduler.actuators.values())
+        print(f"{3 * terrariums} actuators, 1 day simulated in {elapsed:.2f}s, {runs} schedule runs, "
+              f"{trips} max_on trips")
+
+        # Restart: terminy z pliku stanu, lampa włączona od razu, jeśli jest w swoim oknie
+        restarted = ActuatorScheduler(state_path, clock=clock.time, sleep=clock.advance)
+        restarted.add_actuator(Actuator("lamp0", 1000, gpio=gpio, verbose=False))
+        schedule = restarted.daily("light0", "lamp0", at="08:00", duration=12 * 3600)
+        print(f"after restart: next light0 {datetime.fromtimestamp(schedule.next_fire):%Y-%m-%d %H:%M}, "
+              f"lamp0 {'ON' if restarted.actuators['lamp0'].is_on else 'OFF'}")
@@ -0,0 +1,331 @@
+import os
+import threading
+import time
+
+from scheduler import RateScheduler
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None
+
+# Wyjścia grzałek bez programowego PWM z RPi.GPIO (jeden zajęty wątek na pin).
+#  - SysfsPWM: sprzętowy PWM z /sys/class/pwm (GPIO 12/18 i 13/19 po
+#    dtoverlay=pwm-2chan), bez wątków i bez jittera.
+#  - SlowPWMOutput: wolne sterowanie przekaźnikiem/SSR, proporcjonalne w oknie
+#    czasowym albo sigma-delta. Wszystkie takie wyjścia obsługuje jeden wątek
+#    SlowPWMDriver, więc kolejne grzałki nie dokładają wątków.
+# Oba mają interfejs GPIO.PWM (start, ChangeDutyCycle, stop), a wypełnienie
+# dotyczy stanu pinu jak dotąd: wywołujący podaje 100 - pi_output, więc
+# 100% na pinie to grzałka wyłączona.
+
+PWM_CLASS_PATH = "/sys/class/pwm"
+# Pin BCM -> kanał pwmchip0
+HARDWARE_PWM_PINS = {12: 0, 18: 0, 13: 1, 19: 1}
+
+
+class SysfsPWM:
+    def __init__(self, channel, frequency=100, chip=0, base_path=PWM_CLASS_PATH, export_timeout=1.0):
+        self.chip_path = os.path.join(base_path, f"pwmchip{chip}")
+        self.path = os.path.join(self.chip_path, f"pwm{channel}")
+        self.channel = channel
+        self.duty = None
+        if not os.path.isdir(self.path):
+            self._write(os.path.join(self.chip_path, "export"), channel)
+            # udev potrzebuje chwili na utworzenie katalogu kanału
+            deadline = time.monotonic() + export_timeout
+            while not os.path.isdir(self.path):
+                if time.monotonic() > deadline:
+                    raise OSError(f"PWM channel {channel} did not appear in {self.chip_path}")
+                time.sleep(0.01)
+        self._duty_fd = None
+        # W sztucznym drzewie to zwykłe pliki, które trzeba przycinać po zapisie
+        self._regular_files = not os.path.realpath(self.path).startswith("/sys/")
+        # Kanał mógł zostać włączony przez poprzedni proces (np. force_off po
+        # restarcie workera): bieżące wypełnienie zostaje, bez chwilowego zera,
+        # które przy odwróconej logice włącza grzałkę
+        self.period_ns = self._read(os.path.join(self.path, "period"))
+        if self.period_ns > 0:
+            self.duty = 100.0 * self._read(os.path.join(self.path, "duty_cycle")) / self.period_ns
+        self.ChangeFrequency(frequency)
+
+    @staticmethod
+    def _write(path, value):
+        with open(path, "w") as file:
+            file.write(f"{value}\n")
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as file:
+                return int(file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def ChangeFrequency(self, frequency):
+        period_ns = int(round(1e9 / frequency))
+        if self.duty is None:
+            self._write(os.path.join(self.path, "period"), period_ns)
+        else:
+            # duty_cycle nie może przekroczyć period: przy krótszym okresie
+            # najpierw przeskalowane wypełnienie, przy dłuższym najpierw okres
+            duty_ns = int(period_ns * self.duty / 100.0)
+            order = (("duty_cycle", duty_ns), ("period", period_ns))
+            for name, value in (order if period_ns < self.period_ns else reversed(order)):
+                self._write(os.path.join(self.path, name), value)
+        self.period_ns = period_ns
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+        self._write(os.path.join(self.path, "enable"), 1)
+
+    def ChangeDutyCycle(self, duty):
+        duty = min(max(duty, 0.0), 100.0)
+        if duty == self.duty:
+            return
+        if self._duty_fd is None:
+            self._duty_fd = os.open(os.path.join(self.path, "duty_cycle"), os.O_WRONLY)
+        # Jeden pwrite na zmianę, plik zostaje otwarty
+        data = f"{int(self.period_ns * duty / 100.0)}\n".encode()
+        os.pwrite(self._duty_fd, data, 0)
+        if self._regular_files:
+            os.ftruncate(self._duty_fd, len(data))
+        self.duty = duty
+
+    def stop(self):
+        # Odwrócona logika: wyłączony kanał daje stan niski (grzałka włączona),
+        # więc zatrzymanie to pełne wypełnienie przy włączonym kanale, jak force_off
+        self._write(os.path.join(self.path, "duty_cycle"), self.period_ns)
+        self._write(os.path.join(self.path, "enable"), 1)
+        self.duty = 100.0
+        if self._duty_fd is not None:
+            os.close(self._duty_fd)
+            self._duty_fd = None
+
+
+class SlowPWMOutput:
+    """Wyjście przekaźnika/SSR sterowane przez SlowPWMDriver.
+
+    mode "window": pin w stanie wysokim przez duty% każdego okna window
+    sekund (sterowanie proporcjonalne w czasie). mode "sigma_delta": stan
+    wybierany co takt drivera tak, by średnia dążyła do duty (krótsze
+    impulsy, mniejsze tętnienia temperatury).
+    """
+
+    def __init__(self, driver, pin, mode="sigma_delta", window=10.0, min_switch=0.0):
+        if mode not in ("window", "sigma_delta"):
+            raise ValueError(f"Unknown slow PWM mode: {mode}")
+        self.driver = driver
+        self.pin = pin
+        self.mode = mode
+        self.window = window
+        self.min_switch = min_switch  # Minimalny czas między przełączeniami [s]
+        self.duty = None
+        self.state = None
+        self._accumulator = 0.0
+        self._window_start = None
+        self._last_switch = None
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+        self.driver.attach(self)
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = min(max(duty, 0.0), 100.0)
+
+    def stop(self):
+        # Pin zostaje w stanie wysokim (grzałka wyłączona); duty 100 sprawia, że
+        # równoległy takt drivera nie zapisze już stanu niskiego
+        self.duty = 100.0
+        self.driver.detach(self)
+        self.driver.gpio.output(self.pin, self.driver.gpio.HIGH)
+
+    def next_state(self, now, tick):
+        if self.duty is None:
+            return self.state
+        if self.mode == "window":
+            # Granice okna i impulsu zaokrąglone do najbliższego taktu drivera
+            if self._window_start is None or now - self._window_start + tick / 2 >= self.window:
+                self._window_start = now
+            high = now - self._window_start + tick / 2 < self.window * self.duty / 100.0
+        else:
+            self._accumulator += self.duty / 100.0
+            high = self._accumulator >= 0.5
+            if high:
+                self._accumulator -= 1.0
+        if (self.state is not None and high != self.state and self._last_switch is not None
+                and now - self._last_switch < self.min_switch):
+            # Zbyt częste przełączanie: stan zostaje, a sigma-delta
+            # odda różnicę w kolejnych taktach
+            if self.mode == "sigma_delta":
+                self._accumulator += 1.0 if high else -1.0
+            return self.state
+        return high
+
+
+class SlowPWMDriver:
+    """Jeden wątek obsługujący wszystkie wyjścia SlowPWMOutput co tick sekund."""
+
+    def __init__(self, tick=0.1, gpio=None, clock=None, sleep=None):
+        self.tick = tick
+        self.gpio = gpio or GPIO
+        self.outputs = []
+        self.scheduler = RateScheduler(clock, sleep)
+        self.clock = self.scheduler.clock
+        self.timing = self.scheduler.add("slow_pwm", tick, self.step)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def output(self, pin, mode="sigma_delta", window=10.0, min_switch=0.0):
+        self.gpio.setup(pin, self.gpio.OUT)
+        return SlowPWMOutput(self, pin, mode, window, min_switch)
+
+    def attach(self, output):
+        with self._lock:
+            if output not in self.outputs:
+                self.outputs.append(output)
+        self.start()
+
+    def detach(self, output):
+        with self._lock:
+            if output in self.outputs:
+                self.outputs.remove(output)
+        output.state = None
+
+    def step(self, dt=None):
+        now = self.clock()
+        with self._lock:
+            outputs = list(self.outputs)
+        for output in outputs:
+            state = output.next_state(now, self.tick)
+            if state is not None and state != output.state:
+                self.gpio.output(output.pin, self.gpio.HIGH if state else self.gpio.LOW)
+                output.state = state
+                output._last_switch = now
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.scheduler.run, args=(self._stop.is_set,),
+                                            name="slow-pwm", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+
+_slow_driver = None
+
+
+def slow_driver():
+    """Wspólny driver wyjść SSR dla całego procesu."""
+    global _slow_driver
+    if _slow_driver is None:
+        _slow_driver = SlowPWMDriver()
+    return _slow_driver
+
+
+def open_actuator(pin, kind="auto", frequency=100, base_path=PWM_CLASS_PATH, **slow_args):
+    """Wyjście grzałki na pinie BCM z interfejsem GPIO.PWM.
+
+    kind: "hardware" (sysfs PWM), "ssr" (SlowPWMOutput), "software" (GPIO.PWM)
+    albo "auto": sprzętowy PWM, gdy pin go ma i pwmchip0 istnieje, w przeciwnym
+    razie wyjście SSR.
+    """
+    if kind == "auto":
+        hardware = pin in HARDWARE_PWM_PINS and os.path.isdir(os.path.join(base_path, "pwmchip0"))
+        kind = "hardware" if hardware else "ssr"
+    if kind == "hardware":
+        return SysfsPWM(HARDWARE_PWM_PINS[pin], frequency, base_path=base_path)
+    if kind == "ssr":
+        return slow_driver().output(pin, **slow_args)
+    if kind == "software":
+        GPIO.setup(pin, GPIO.OUT)
+        return GPIO.PWM(pin, frequency)
+    raise ValueError(f"Unknown actuator kind: {kind}")
+
+
+def force_off(pin, gpio=None, base_path=PWM_CLASS_PATH):
+    """Wyłącza grzałkę na pinie BCM bez jej obiektu PWM (np. po śmierci procesu, który nim sterował).
+
+    Odwrócona logika: grzałka jest wyłączona przy pinie w stanie wysokim.
+    Sprzętowy PWM pracuje dalej po śmierci procesu z ostatnim wypełnieniem,
+    więc dostaje wypełnienie 100% (wyłączenie kanału dałoby stan niski).
+    """
+    if pin in HARDWARE_PWM_PINS:
+        path = os.path.join(base_path, "pwmchip0", f"pwm{HARDWARE_PWM_PINS[pin]}")
+        if os.path.isdir(path):
+            with open(os.path.join(path, "period")) as file:
+                period_ns = int(file.read().strip() or 0)
+            if period_ns > 0:
+                SysfsPWM._write(os.path.join(path, "duty_cycle"), period_ns)
+                SysfsPWM._write(os.path.join(path, "enable"), 1)
+                return
+    gpio = gpio or GPIO
+    gpio.setwarnings(False)  # Pin jest już ustawiony przez martwy proces
+    gpio.setmode(gpio.BCM)
+    # initial=HIGH: bez chwilowego stanu niskiego (grzałka włączona) przy setup
+    gpio.setup(pin, gpio.OUT, initial=gpio.HIGH)
+    gpio.output(pin, gpio.HIGH)
+
+
+def write_fake_pwm_tree(base_path, chip=0, channels=2):
+    """Sztuczne /sys/class/pwm z wyeksportowanymi kanałami do testów bez Raspberry Pi."""
+    chip_path = os.path.join(base_path, f"pwmchip{chip}")
+    os.makedirs(chip_path, exist_ok=True)
+    for name, value in (("npwm", channels), ("export", ""), ("unexport", "")):
+        with open(os.path.join(chip_path, name), "w") as file:
+            file.write(f"{value}\n")
+    for channel in range(channels):
+        path = os.path.join(chip_path, f"pwm{channel}")
+        os.makedirs(path, exist_ok=True)
+        for name in ("period", "duty_cycle", "enable"):
+            with open(os.path.join(path, name), "w") as file:
+                file.write("0\n")
+    return chip_path
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from hardware_sim import VirtualClock, make_gpio_module
+
+    with tempfile.TemporaryDirectory() as base_path:
+        write_fake_pwm_tree(base_path)
+        pwm = open_actuator(18, base_path=base_path)
+        pwm.start(100)
+        count = 20000
+        start = time.perf_counter()
+        for i in range(count):
+            pwm.ChangeDutyCycle(i % 101)
+        elapsed = time.perf_counter() - start
+        with open(os.path.join(pwm.path, "duty_cycle")) as file:
+            print(f"sysfs PWM: {elapsed / count * 1e6:.1f} us per ChangeDutyCycle, duty_cycle={file.read().strip()} ns")
+        pwm.stop()
+
+    class _Backend:
+        def set_duty(self, pin, duty):
+            pass
+
+    gpio = make_gpio_module(_Backend())
+    switches = []
+    gpio.output = lambda pin, value: switches.append(value)
+    clock = VirtualClock()
+    driver = SlowPWMDriver(tick=0.1, gpio=gpio, clock=clock.monotonic)
+    for mode in ("sigma_delta", "window"):
+        switches.clear()
+        output = driver.output(4, mode=mode, window=2.0)
+        output.ChangeDutyCycle(30)
+        driver.outputs = [output]
+        high = 0
+        for _ in range(1000):
+            driver.step()
+            high += output.state
+            clock.advance(0.1)
+        print(f"{mode}: duty 30% -> {high / 10:.1f}% high over 1000 ticks, {len(switches)} switches")
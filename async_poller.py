@@ -0,0 +1,516 @@
+import asyncio
+import concurrent.futures
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+from scheduler import TaskTiming
+from sensor_cache import SensorCache, dht_values, min_interval_for, sensor_key
+from temperature_estimator import SENSOR_NOISE
+from w1_bus import AdaptiveResolution
+
+try:
+    from w1thermsensor import AsyncW1ThermSensor, W1ThermSensor
+except ImportError:
+    AsyncW1ThermSensor = W1ThermSensor = None
+
+# Silnik asynchronicznego odpytywania czujników wielu terrariów.
+# Wszystkie terraria są czytane jednocześnie, a każda lampa ma własny
+# termin (deadline) na obliczenie PI i zapis PWM.
+
+DS18B20_TIMEOUT = 1.5  # Konwersja 12-bit trwa ~750 ms
+DHT_TIMEOUT = 1.0  # DHT potrafi powtarzać odczyt przez 0.25 s i dłużej
+
+
+def as_async_sensor(sensor):
+    """Zamienia W1ThermSensor na AsyncW1ThermSensor (jeśli jest dostępny)."""
+    if sensor is None or AsyncW1ThermSensor is None:
+        return sensor
+    # Już asynchroniczny albo nie jest czujnikiem 1-Wire (np. sample_ring.RingThermometer)
+    if isinstance(sensor, AsyncW1ThermSensor) or not isinstance(sensor, W1ThermSensor):
+        return sensor
+    try:
+        return AsyncW1ThermSensor(sensor_type=sensor.type, sensor_id=sensor.id)
+    except Exception as e:
+        print(f"Error creating async DS18B20 sensor: {e}")
+        return sensor
+
+
+def _is_async(sensor):
+    """True, gdy get_temperature() czujnika to korutyna (AsyncW1ThermSensor)."""
+    if isinstance(sensor, AdaptiveResolution):
+        sensor = sensor.sensor
+    return asyncio.iscoroutinefunction(sensor.get_temperature)
+
+
+class AsyncSensorReader:
+    """Odczyty DS18B20 i DHT z limitem czasu na każdy odczyt.
+
+    Odczyty idą przez cache (sensor_cache.SensorCache), który pilnuje
+    minimalnych odstępów urządzeń i udostępnia wyniki innym odbiorcom.
+    Wartość z bufora starsza niż max_age (albo minimalny odstęp urządzenia,
+    jeśli dłuższy) to brak odczytu, więc zepsuty czujnik nie zamraża
+    temperatury regulatora.
+    """
+
+    def __init__(self, executor, ds18b20_timeout=DS18B20_TIMEOUT, dht_timeout=DHT_TIMEOUT, cache=None,
+                 max_age=None):
+        self.executor = executor
+        self.ds18b20_timeout = ds18b20_timeout
+        self.dht_timeout = dht_timeout
+        self.max_age = max_age
+        self.cache = cache if cache is not None else SensorCache()
+        self.read_errors = REGISTRY.counter("sensor_read_errors_total", "Failed or timed out sensor reads")
+        self._histograms = {}
+        # Urządzenia, których poprzedni odczyt w wątku jeszcze trwa
+        self._busy = set()
+
+    def _histogram(self, device, terrarium=None):
+        """Histogram czasu odczytu jednego urządzenia: typ, id czujnika 1-Wire i terrarium."""
+        kind = type(device.sensor if isinstance(device, AdaptiveResolution) else device).__name__
+        labels = {"device": kind}
+        sensor_id = getattr(device, "id", None)
+        if isinstance(sensor_id, str):
+            labels["sensor"] = sensor_id
+        if terrarium is not None:
+            labels["terrarium"] = str(terrarium)
+        key = tuple(sorted(labels.items()))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = REGISTRY.histogram(
+                "sensor_read_seconds", "Sensor read latency per device", **labels)
+        return histogram
+
+    async def read_ds18b20(self, sensor, terrarium=None):
+        """Odczyt DS18B20 przez bufor: jednoczesne prośby o ten sam czujnik czekają na jedną konwersję."""
+        if sensor is None:
+            return None
+        if not _is_async(sensor):
+            # Bez AsyncW1ThermSensor odczyt blokuje na całą konwersję, więc idzie do puli
+            return await self.read_blocking(sensor, sensor.get_temperature, self.ds18b20_timeout, terrarium)
+        loop = asyncio.get_running_loop()
+
+        def convert():
+            # Wątek puli trzyma wpis bufora, a sama konwersja czeka w pętli zdarzeń
+            future = asyncio.run_coroutine_threadsafe(sensor.get_temperature(), loop)
+            try:
+                return future.result(self.ds18b20_timeout)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                raise
+
+        return await self.read_blocking(sensor, convert, self.ds18b20_timeout, terrarium)
+
+    def _current(self, device, reading):
+        """Wartość odczytu, o ile nie jest starsza niż max_age (None w przeciwnym razie)."""
+        if reading is None or reading.value is None:
+            return None
+        if self.max_age is not None:
+            limit = max(self.max_age, min_interval_for(device))
+            if self.cache.clock() - reading.monotonic > limit:
+                return None
+        return reading.value
+
+    async def read_blocking(self, device, func, timeout, terrarium=None):
+        if device is None:
+            return None
+        # Zawieszony odczyt nie może zajmować kolejnych wątków puli,
+        # w tym czasie odbiorcy dostają ostatnią znaną wartość, póki jest świeża
+        key = sensor_key(device)
+        if key in self._busy:
+            value = self._current(device, self.cache.latest(device))
+            if value is None:
+                self.read_errors.inc()
+            return value
+        loop = asyncio.get_running_loop()
+        self._busy.add(key)
+        future = loop.run_in_executor(self.executor, lambda: self.cache.read(device, func))
+        future.add_done_callback(lambda _: self._busy.discard(key))
+        start = time.perf_counter()
+        try:
+            reading = await asyncio.wait_for(asyncio.shield(future), timeout)
+            if reading.error is None:
+                return self._current(device, reading)
+            # Bufor oddaje wtedy poprzednią wartość, której nie wolno użyć jako nowej
+            print(f"Error reading from {type(device).__name__}: {reading.error}")
+        except asyncio.TimeoutError:
+            print("Error reading sensor: timeout")
+        except Exception as e:
+            print(f"Error reading sensor: {e}")
+        finally:
+            self._histogram(device, terrarium).observe(time.perf_counter() - start)
+        self.read_errors.inc()
+        return None
+
+    async def read_dht(self, device, terrarium=None):
+        result = await self.read_blocking(device, lambda: dht_values(device), self.dht_timeout, terrarium)
+        if result is None:
+            return None, None
+        return result
+
+
+class LampLoop:
+    """Pętla jednej lampy: odczyt, regulator PI i zapis PWM we własnym rytmie.
+
+    Z estimator (temperature_estimator.TemperatureEstimator) regulator dostaje
+    estymatę ze wszystkich czujników zamiast surowego DS18B20, także w cyklach,
+    w których odczyt DS18B20 się nie udał. Z resolution_policy
+    (w1_bus.ResolutionPolicy) DS18B20 czytany jest z niską rozdzielczością
+    (krótka konwersja), gdy temperatura jest daleko od zadanej.
+    """
+
+    def __init__(self, lamp, controller, setpoint, period, estimator=None, resolution_policy=None):
+        self.lamp = lamp
+        self.controller = controller
+        self.estimator = estimator
+        self.resolution_policy = resolution_policy
+        self._last_power = 0.0  # Moc grzałki [%] od poprzedniego cyklu
+        self._last_estimate = None
+        self._stamps = {}  # Czas ostatniego odczytu z bufora przekazanego estymatorowi
+        self.setpoint = setpoint
+        self.period = period
+        self._ds18b20_source = lamp.ds18b20
+        self.ds18b20 = self._wrap_ds18b20(lamp.ds18b20)
+        self.cycles = 0
+        self.last_cycle_time = None
+        self.timing = None  # scheduler.TaskTiming: zmierzony dt, jitter, przekroczenia
+        self.removed = False  # AsyncPoller.remove_lamp: pętla kończy się po bieżącym cyklu
+        terrarium = str(lamp.terrarium_id)
+        self.cycle_seconds = REGISTRY.histogram("lamp_cycle_seconds", "Whole control cycle", terrarium=terrarium)
+        self.compute_seconds = REGISTRY.histogram("controller_compute_seconds", "PI compute", terrarium=terrarium)
+        self.pwm_seconds = REGISTRY.histogram("pwm_write_seconds", "ChangeDutyCycle call", terrarium=terrarium)
+
+    def _wrap_ds18b20(self, sensor):
+        sensor = as_async_sensor(sensor)
+        if self.resolution_policy is None or sensor is None:
+            return sensor
+        # Tylko prawdziwe czujniki 1-Wire; przy odczycie z bufora samplera
+        # (sample_ring.RingThermometer) rozdzielczość zmienia sampler.py
+        if not hasattr(sensor, "set_resolution"):
+            print(f"Adaptive DS18B20 resolution disabled for Terrarium ID {self.lamp.terrarium_id}: "
+                  f"{type(sensor).__name__} cannot change resolution")
+            return sensor
+        return AdaptiveResolution(sensor, self.resolution_policy)
+
+    def _fresh(self, cache, name, device, value):
+        """value, tylko gdy bufor ma nowy odczyt sprzętowy (DHT22 czytany najwyżej co 2 s)."""
+        reading = None if value is None or device is None else cache.latest(device)
+        if reading is None or reading.monotonic == self._stamps.get(name):
+            return None
+        self._stamps[name] = reading.monotonic
+        return value
+
+    async def step(self, reader):
+        start = time.monotonic()
+        if self.lamp.ds18b20 is not self._ds18b20_source:
+            # Czujnik podmieniony w trakcie pracy (zmiana pinów)
+            self._ds18b20_source = self.lamp.ds18b20
+            self.ds18b20 = self._wrap_ds18b20(self.lamp.ds18b20)
+        temperature, (dht22_temp, dht22_humidity), (dht11_temp, dht11_humidity) = await asyncio.gather(
+            reader.read_ds18b20(self.ds18b20, self.lamp.terrarium_id),
+            reader.read_dht(self.lamp.dht22_t1, self.lamp.terrarium_id),
+            reader.read_dht(self.lamp.dht11_t2, self.lamp.terrarium_id),
+        )
+
+        sample = {
+            "terrarium_id": self.lamp.terrarium_id,
+            "time": time.time(),
+            "temperature": temperature,
+            "dht22_temp": dht22_temp,
+            "dht22_humidity": dht22_humidity,
+            "dht11_temp": dht11_temp,
+            "dht11_humidity": dht11_humidity,
+            "output": None,
+            "pwm": None,
+            "error": None,
+            "P": None,
+            "I": None,
+            "estimate": None,
+            "rate": None,
+        }
+
+        measured = temperature
+        if self.estimator is not None:
+            now = time.monotonic()
+            dt = 0.0 if self._last_estimate is None else now - self._last_estimate
+            self._last_estimate = now
+            if isinstance(self.ds18b20, AdaptiveResolution):
+                # Szum odczytu rośnie z krokiem niskiej rozdzielczości
+                self.estimator.sensor_noise["ds18b20"] = math.hypot(SENSOR_NOISE["ds18b20"],
+                                                                    self.ds18b20.step / math.sqrt(12))
+            # Powtórzona z bufora wartość to nie nowy, niezależny pomiar; bez
+            # świeżego DS18B20 estymata wygasa po max_blind
+            estimate, rate = self.estimator.step(dt, self._last_power, {
+                "ds18b20": self._fresh(reader.cache, "ds18b20", self.ds18b20, temperature),
+                "dht22_temp": self._fresh(reader.cache, "dht22_temp", self.lamp.dht22_t1, dht22_temp),
+                "dht11_temp": self._fresh(reader.cache, "dht11_temp", self.lamp.dht11_t2, dht11_temp),
+            })
+            sample.update(estimate=estimate, rate=rate)
+            measured = estimate
+
+        if measured is not None:
+            compute_start = time.perf_counter()
+            pi_output, error, P, I = self.controller.compute(self.setpoint, measured)[:4]
+            self.compute_seconds.observe(time.perf_counter() - compute_start)
+            # Odwrócona logika PWM
+            inverted_pwm = 100 - pi_output
+            pwm = self.lamp.pwm_pin  # Może zostać podmieniony przy zmianie pinów
+            if pwm is not None:
+                pwm_start = time.perf_counter()
+                pwm.ChangeDutyCycle(inverted_pwm)
+                self.pwm_seconds.observe(time.perf_counter() - pwm_start)
+            sample.update(output=pi_output, pwm=inverted_pwm, error=error, P=P, I=I)
+            self._last_power = pi_output
+            if isinstance(self.ds18b20, AdaptiveResolution):
+                bits = self.ds18b20.target(error)
+                if bits is not None:
+                    # Zapis rozdzielczości do sysfs blokuje, więc poza pętlą zdarzeń
+                    await asyncio.get_running_loop().run_in_executor(reader.executor, self.ds18b20.set_resolution,
+                                                                     bits)
+
+        self.cycles += 1
+        self.last_cycle_time = time.monotonic() - start
+        self.cycle_seconds.observe(self.last_cycle_time)
+        return sample
+
+
+class AsyncPoller:
+    """Równoległe odpytywanie wszystkich terrariów.
+
+    controller_factory tworzy osobny regulator dla każdej lampy,
+    on_sample (blokujące, np. requests.put) wykonuje się w osobnej puli,
+    więc sieć nie opóźnia sterowania grzałkami. Sterowanie działa co period,
+    a on_sample co publish_period (domyślnie tak samo). heartbeat(terrarium_id)
+    wołany jest po każdym cyklu lampy (np. dla watchdoga w supervisor.py).
+    add_lamp i remove_lamp zmieniają zestaw lamp w trakcie run() (np. po
+    zmianie konfiguracji); pula wątków czujników zachowuje rozmiar
+    z konstruktora, więc przy dodanych lampach odczyty mogą czekać w kolejce.
+    """
+
+    def __init__(self, lamps, controller_factory, setpoint, period=5.0, on_sample=None,
+                 ds18b20_timeout=DS18B20_TIMEOUT, dht_timeout=DHT_TIMEOUT, max_workers=None,
+                 publish_period=None, sensor_cache=None, estimator_factory=None, resolution_policy=None,
+                 heartbeat=None):
+        if max_workers is None:
+            # DS18B20, DHT22 i DHT11 każdej lampy mogą jednocześnie czekać w puli
+            max_workers = 3 * len(lamps) + 2
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="sensor")
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="uplink")
+        self.reader = AsyncSensorReader(self.executor, ds18b20_timeout, dht_timeout, sensor_cache, max_age=period)
+        self.sensor_cache = self.reader.cache
+        self.controller_factory = controller_factory
+        self.estimator_factory = estimator_factory
+        self.resolution_policy = resolution_policy
+        self.setpoint = setpoint
+        self.period = period
+        self.publish_period = publish_period or period
+        self.on_sample = on_sample
+        self.heartbeat = heartbeat
+        self.loops = [self._lamp_loop(lamp) for lamp in lamps]
+        self._tasks = {}
+        self._stop_event = None
+        self._event_loop = None  # Pętla asyncio działającego run()
+
+    def _lamp_loop(self, lamp):
+        estimator = self.estimator_factory() if self.estimator_factory is not None else None
+        return LampLoop(lamp, self.controller_factory(), self.setpoint, self.period, estimator,
+                        self.resolution_policy)
+
+    def _publish(self, sample):
+        if self.on_sample is None:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.io_executor, self.on_sample, sample)
+        future.add_done_callback(_log_callback_error)
+
+    async def _run_lamp(self, lamp_loop, stop_event):
+        # Terminy liczone od startu, więc czas pracy nie przesuwa kolejnych cykli
+        start = time.monotonic()
+        lamp_loop.timing = TaskTiming(lamp_loop.period, start)
+        publishing = TaskTiming(self.publish_period, start)
+        while not stop_event.is_set() and not lamp_loop.removed:
+            dt = lamp_loop.timing.begin(time.monotonic())
+            sample = await lamp_loop.step(self.reader)
+            sample["dt"] = dt
+            if self.heartbeat is not None:
+                self.heartbeat(lamp_loop.lamp.terrarium_id)
+
+            now = time.monotonic()
+            if now >= publishing.next_deadline:
+                publishing.begin(now)
+                self._publish(sample)
+                publishing.finish(now)
+
+            delay = lamp_loop.timing.finish(time.monotonic()) - time.monotonic()
+            try:
+                await asyncio.wait_for(stop_event.wait(), max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def resolution_stats(self):
+        """Rozdzielczość, czasy konwersji i częstotliwość odczytów DS18B20 każdej lampy."""
+        return {lamp_loop.lamp.terrarium_id: lamp_loop.ds18b20.stats()
+                for lamp_loop in self.loops if isinstance(lamp_loop.ds18b20, AdaptiveResolution)}
+
+    def timing_stats(self):
+        """Metryki pętli każdej lampy: zmierzony dt, jitter i przekroczenia okresu."""
+        return {lamp_loop.lamp.terrarium_id: lamp_loop.timing.stats()
+                for lamp_loop in self.loops if lamp_loop.timing is not None}
+
+    async def poll_once(self):
+        """Jeden cykl wszystkich lamp naraz, zwraca czas cyklu w sekundach."""
+        start = time.monotonic()
+        samples = await asyncio.gather(*(lamp_loop.step(self.reader) for lamp_loop in self.loops))
+        for sample in samples:
+            self._publish(sample)
+        return time.monotonic() - start
+
+    def _start(self, lamp_loop):
+        task = asyncio.ensure_future(self._run_lamp(lamp_loop, self._stop_event))
+        task.add_done_callback(self._lamp_done)
+        self._tasks[lamp_loop] = task
+
+    def _lamp_done(self, task):
+        # Wyjątek w pętli lampy kończy run() (i zgłasza się z gather poniżej)
+        if not task.cancelled() and task.exception() is not None:
+            self._stop_event.set()
+
+    def add_lamp(self, lamp):
+        """Dodaje lampę; w trakcie run() można wołać z dowolnego wątku."""
+        if self._event_loop is None:
+            self.loops = self.loops + [self._lamp_loop(lamp)]
+            return
+        # Regulator i pętla powstają w wątku asyncio, jak reszta stanu pollera
+        self._event_loop.call_soon_threadsafe(self._add_running, lamp)
+
+    def _add_running(self, lamp):
+        lamp_loop = self._lamp_loop(lamp)
+        self.loops = self.loops + [lamp_loop]
+        self._start(lamp_loop)
+
+    def remove_lamp(self, terrarium_id, timeout=None):
+        """Zatrzymuje pętlę lampy; po powrocie poller nie zmieni już jej PWM.
+
+        W trakcie run() czeka na koniec bieżącego cyklu lampy, więc nie wolno
+        jej wołać z wątku asyncio.
+        """
+        if self._event_loop is None:
+            self.loops = [lamp_loop for lamp_loop in self.loops if lamp_loop.lamp.terrarium_id != terrarium_id]
+            return
+        asyncio.run_coroutine_threadsafe(self._remove_running(terrarium_id), self._event_loop).result(timeout)
+
+    async def _remove_running(self, terrarium_id):
+        removed = [lamp_loop for lamp_loop in self.loops if lamp_loop.lamp.terrarium_id == terrarium_id]
+        self.loops = [lamp_loop for lamp_loop in self.loops if lamp_loop not in removed]
+        for lamp_loop in removed:
+            lamp_loop.removed = True
+            task = self._tasks.pop(lamp_loop, None)
+            if task is not None:
+                await asyncio.wait([task])
+
+    async def run(self, stop_event=None):
+        if stop_event is None:
+            stop_event = asyncio.Event()
+        self._stop_event = stop_event
+        self._event_loop = asyncio.get_running_loop()
+        try:
+            for lamp_loop in self.loops:
+                self._start(lamp_loop)
+            # Do zatrzymania; lampy z add_lamp dokładają w tym czasie swoje zadania
+            await stop_event.wait()
+            await asyncio.gather(*self._tasks.values())
+        finally:
+            self._event_loop = None
+            self._tasks = {}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.io_executor.shutdown(wait=True)
+
+
+def _log_callback_error(future):
+    error = future.exception()
+    if error is not None:
+        print(f"Error in sample callback: {error}")
+
+
+# Benchmark na symulowanych terrariach (bez Raspberry Pi)
+class _SimulatedDS18B20:
+    def __init__(self, conversion_time):
+        self.conversion_time = conversion_time
+
+    async def get_temperature(self):
+        await asyncio.sleep(self.conversion_time)
+        return 25.0
+
+
+class _SimulatedDHT:
+    def __init__(self, read_time):
+        self.read_time = read_time
+
+    @property
+    def temperature(self):
+        time.sleep(self.read_time)
+        return 24.0
+
+    @property
+    def humidity(self):
+        return 60.0
+
+
+class _SimulatedPWM:
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+
+
+class _SimulatedLamp:
+    def __init__(self, terrarium_id, scale):
+        self.terrarium_id = terrarium_id
+        self.ds18b20 = _SimulatedDS18B20(0.75 * scale)
+        self.dht22_t1 = _SimulatedDHT(0.25 * scale)
+        self.dht11_t2 = _SimulatedDHT(0.25 * scale)
+        self.pwm_pin = _SimulatedPWM()
+
+
+class _SimulatedController:
+    def compute(self, setpoint, measured_value):
+        error = setpoint - measured_value
+        return max(0, min(100, error)), error, error, 0.0
+
+
+def _serial_cycle(lamps):
+    # Dotychczasowa pętla z 3_temps.py: lampa po lampie
+    start = time.monotonic()
+    for lamp in lamps:
+        asyncio.run(lamp.ds18b20.get_temperature())
+        lamp.dht22_t1.temperature
+        lamp.dht11_t2.temperature
+    return time.monotonic() - start
+
+
+def benchmark(counts=(1, 8, 32), scale=0.1, cycles=3):
+    """Zwraca czasy cyklu (s) dla pętli szeregowej i równoległej."""
+    results = []
+    for count in counts:
+        lamps = [_SimulatedLamp(i, scale) for i in range(count)]
+        poller = AsyncPoller(lamps, _SimulatedController, setpoint=34.0)
+        try:
+            concurrent = [asyncio.run(poller.poll_once()) for _ in range(cycles)]
+        finally:
+            poller.close()
+        serial = _serial_cycle(lamps)
+        results.append({
+            "terrariums": count,
+            "serial_cycle_s": serial,
+            "concurrent_cycle_s": min(concurrent),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    scale = 0.1
+    print(f"Simulated sensor latencies scaled by {scale} (DS18B20 {750 * scale:.0f} ms, DHT {250 * scale:.0f} ms)")
+    for result in benchmark(scale=scale):
+        print(f"Terrariums: {result['terrariums']:3d}, serial cycle: {result['serial_cycle_s']:.3f}s, "
+              f"concurrent cycle: {result['concurrent_cycle_s']:.3f}s")
@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+import async_poller
+import binlog
+import compression
+import csv_logger
+import uplink
+from async_poller import AsyncPoller
+from controller_bank import ControllerBank, pi_gains
+from hardware_sim import make_dht_modules, make_gpio_module
+from w1_bus import W1BusReader, parse_w1_slave, write_fake_w1_tree
+
+# Zestaw benchmarków ścieżek czujników, sterowania, logów i wysyłki bez
+# Raspberry Pi: sztuczne drzewo /sys/bus/w1/devices (w1_bus.py), podróbki
+# GPIO i DHT (hardware_sim.py) oraz lokalny serwer HTTP (uplink.py).
+# Wyniki trafiają do JSON (domyślnie benchmark_results/<commit>.json), a
+# --compare porównuje je z wcześniejszym plikiem.
+
+RESULTS_DIR = "benchmark_results"
+# Wyniki, dla których mniej znaczy lepiej (czasy, wywołania systemowe,
+# współczynniki kompresji, błędy odtworzenia i regulacji);
+# reszta to przepustowości
+LOWER_IS_BETTER = ("_s", "_us", "_ms", "_syscalls", "_calls", "_ratio", "_error")
+
+
+def lower_is_better(key):
+    return key.endswith(LOWER_IS_BETTER) and not key.endswith("_per_s")
+
+
+def _rate(func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - start)
+
+
+def bench_ds18b20(quick=False):
+    count = 20000 if quick else 200000
+    content = "6e 01 4b 46 7f ff 0c 10 1c : crc=1c YES\n6e 01 4b 46 7f ff 0c 10 1c t=22875\n"
+    results = {"parse_w1_slave_per_s": _rate(lambda: parse_w1_slave(content), count)}
+    with tempfile.TemporaryDirectory() as base_path:
+        sensors = {f"3ce1d44339{i:02x}": 20.0 + i / 16 for i in range(8)}
+        write_fake_w1_tree(base_path, sensors)
+        for use_bulk_read in (True, False):
+            reader = W1BusReader(base_path, conversion_time=0.0, poll_interval=0.0, use_bulk_read=use_bulk_read)
+            name = "bulk" if use_bulk_read else "per_sensor"
+            results[f"read_all_8_sensors_{name}_per_s"] = _rate(reader.read_all, 200 if quick else 2000)
+    return results
+
+
+def bench_controller(quick=False):
+    results = {}
+    steps = 500 if quick else 5000
+    for count in (1, 32, 1024):
+        bank = ControllerBank(capacity=count)
+        for _ in range(count):
+            bank.add(*pi_gains(750.0, 64.0), setpoint=34.0)
+        measured = np.full(count, 30.0)
+        start = time.perf_counter()
+        for _ in range(steps):
+            bank.compute(measured, 1.0)
+        results[f"bank_{count}_loop_steps_per_s"] = count * steps / (time.perf_counter() - start)
+    channel = ControllerBank().add_pi(750.0, 64.0, 34.0)
+    results["channel_compute_per_s"] = _rate(lambda: channel.compute(34.0, 30.0, 1.0), steps * 4)
+    return results
+
+
+def bench_csv_logger(quick=False):
+    return csv_logger.benchmark(rows=5000 if quick else 20000)
+
+
+def bench_compression(quick=False):
+    return compression.benchmark()
+
+
+def bench_binlog(quick=False):
+    return binlog.benchmark(loads=5 if quick else 20)
+
+
+def bench_uplink(quick=False):
+    return uplink.benchmark(count=100 if quick else 500)
+
+
+class _ConstantBackend:
+    def __init__(self, temperature=25.0):
+        self.value = temperature
+        self.duty = {}
+
+    def set_duty(self, pin, duty):
+        self.duty[pin] = duty
+
+    def temperature(self):
+        return self.value
+
+
+class _FakeBusThermometer:
+    """DS18B20 czytany z pliku w1_slave sztucznego drzewa (bez konwersji)."""
+
+    def __init__(self, reader, sensor_id):
+        self.reader = reader
+        self.id = sensor_id
+
+    def get_temperature(self):
+        return self.reader.read_sensor(self.id)
+
+
+class _FakeLamp:
+    def __init__(self, terrarium_id, thermometer, dht22, dht11, pwm):
+        self.terrarium_id = terrarium_id
+        self.ds18b20 = thermometer
+        self.dht22_t1 = dht22
+        self.dht11_t2 = dht11
+        self.pwm_pin = pwm
+
+
+def bench_cycle(quick=False, counts=(1, 8, 32)):
+    """Opóźnienie pełnego cyklu AsyncPoller (odczyty, PI, PWM) dla N terrariów."""
+    backend = _ConstantBackend()
+    gpio = make_gpio_module(backend)
+    board, adafruit_dht = make_dht_modules(backend)
+    cycles = 20 if quick else 100
+    results = {}
+    with tempfile.TemporaryDirectory() as base_path:
+        sensor_ids = [f"3ce1d4{i:06x}" for i in range(max(counts))]
+        write_fake_w1_tree(base_path, {sensor_id: 25.0 for sensor_id in sensor_ids})
+        reader = W1BusReader(base_path)
+        for count in counts:
+            lamps = [_FakeLamp(i, _FakeBusThermometer(reader, sensor_ids[i]), adafruit_dht.DHT22(board.D4),
+                               adafruit_dht.DHT11(board.D5), gpio.PWM(17 + i, 100)) for i in range(count)]
+            controllers = ControllerBank(capacity=count)
+            poller = AsyncPoller(lamps, lambda: controllers.add_pi(750.0, 64.0, 34.0), setpoint=34.0)
+            try:
+                latencies = [asyncio.run(poller.poll_once()) for _ in range(cycles)]
+            finally:
+                poller.close()
+            latencies.sort()
+            results[f"cycle_{count}_terrariums_p50_ms"] = statistics.median(latencies) * 1000
+            results[f"cycle_{count}_terrariums_p95_ms"] = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+    for result in async_poller.benchmark(counts=counts, scale=0.02 if quick else 0.1):
+        results[f"simulated_{result['terrariums']}_terrariums_concurrent_cycle_s"] = result["concurrent_cycle_s"]
+    return results
+
+
+BENCHMARKS = {
+    "ds18b20": bench_ds18b20,
+    "controller": bench_controller,
+    "csv_logger": bench_csv_logger,
+    "compression": bench_compression,
+    "binlog": bench_binlog,
+    "uplink": bench_uplink,
+    "cycle": bench_cycle,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(names=None, quick=False):
+    report = {
+        "commit": _git_commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "quick": quick,
+        "results": {},
+    }
+    for name in names or BENCHMARKS:
+        start = time.perf_counter()
+        report["results"][name] = BENCHMARKS[name](quick)
+        print(f"{name}: {time.perf_counter() - start:.1f}s")
+        for key, value in report["results"][name].items():
+            print(f"  {key}: {value:.4g}")
+    return report
+
+
+def compare(old, new, threshold=0.1):
+    """Zwraca listę (benchmark, wynik, stary, nowy, zmiana) ze zmianą na gorsze ponad threshold."""
+    regressions = []
+    for name, results in new["results"].items():
+        for key, value in results.items():
+            previous = old["results"].get(name, {}).get(key)
+            if not previous or not value:
+                continue
+            if lower_is_better(key):
+                change = value / previous - 1
+            else:
+                change = previous / value - 1
+            if change > threshold:
+                regressions.append((name, key, previous, value, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the terrarium control scripts")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--output", help="JSON result path (default: benchmark_results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier JSON result to compare against")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    report = run(args.names, args.quick)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(json.load(file), report)
+        for name, key, previous, value, change in regressions:
+            print(f"Regression {name}.{key}: {previous:.4g} -> {value:.4g} ({change * 100:.0f}% worse)")
+        if not regressions:
+            print("No regressions above 10%.")
@@ -0,0 +1,404 @@
+import argparse
+import csv
+import glob
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import time
+
+import numpy as np
+
+from metrics import REGISTRY
+
+# Binarny log przebiegów zamiast CSV z tekstowymi floatami.
+# Plik: nagłówek FILE_HEADER (magic, wersja, długość opisu), opis kolumn jako
+# JSON (nazwa, jednostka, typ), wyrównanie do 8 bajtów, a potem rekordy
+# o stałej długości:
+#   "f4" / "f8" - float32 / float64
+#   "d16"      - int16, różnica względem poprzedniej wartości w krokach
+#                1/16 °C (rozdzielczość DS18B20); MISSING = brak odczytu
+#   "t32"      - int32, różnica czasu w mikrosekundach (stały przecinek,
+#                błąd najwyżej 0.5 µs, nie narasta)
+# Czytelnik mapuje plik (mmap) i zwraca kolumny jako tablice NumPy bez
+# parsowania; kolumny f8 to widoki bez kopii. Zapis tylko na końcu pliku,
+# więc urwany ostatni rekord (zanik zasilania) jest obcinany przy dopisywaniu.
+
+MAGIC = b"TLOG"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHHI")
+ALIGN = 8
+STEP = 1.0 / 16  # Krok kolumn d16 [°C]
+MISSING = -32768
+COLUMN_TYPES = {"f4": "<f4", "f8": "<f8", "d16": "<i2", "t32": "<i4"}
+STRUCT_CODES = {"f4": "f", "f8": "d", "d16": "h", "t32": "i"}
+# Kolumny różnicowe: liczba kroków na jednostkę i wartość oznaczająca brak
+SCALES = {"d16": 16, "t32": 1000000}
+MISSING_CODES = {"d16": MISSING, "t32": -2 ** 31}
+EXTENSION = ".tlog"
+
+
+class BinaryLogError(Exception):
+    pass
+
+
+def _unit(name):
+    match = re.search(r"\(([^)]*)\)\s*$", name)
+    return match.group(1) if match else ""
+
+
+def _normalize_columns(columns):
+    """Kolumny jako słowniki {name, unit, type}; przyjmuje też (nazwa, typ) i nazwy."""
+    result = []
+    for column in columns:
+        if isinstance(column, str):
+            column = {"name": column}
+        elif not isinstance(column, dict):
+            column = dict(zip(("name", "type", "unit"), column))
+        column = {"name": column["name"], "unit": column.get("unit", _unit(column["name"])),
+                  "type": column.get("type", "f8")}
+        if column["type"] not in COLUMN_TYPES:
+            raise BinaryLogError(f"Unknown column type: {column['type']}")
+        result.append(column)
+    return result
+
+
+def _record_dtype(columns):
+    return np.dtype([(column["name"], COLUMN_TYPES[column["type"]]) for column in columns])
+
+
+def _read_header(file):
+    raw = file.read(FILE_HEADER.size)
+    if len(raw) < FILE_HEADER.size:
+        raise BinaryLogError("File too short for a binary log header")
+    magic, version, _, description_size = FILE_HEADER.unpack(raw)
+    if magic != MAGIC or version != VERSION:
+        raise BinaryLogError("Not a binary log file")
+    description = json.loads(file.read(description_size).decode("utf-8"))
+    offset = FILE_HEADER.size + description_size
+    return description, offset + (-offset) % ALIGN
+
+
+class BinaryLogWriter:
+    """Dopisywanie rekordów z interfejsem CsvLogger (write_row, flush, close).
+
+    Wiersze czekają w buforze pliku i trafiają na dysk co flush_rows wierszy
+    albo co flush_interval sekund.
+    """
+
+    def __init__(self, file_path, columns, meta=None, flush_rows=60, flush_interval=10.0, fsync=False,
+                 mode="w", buffer_size=1 << 16):
+        self.file_path = file_path
+        self.columns = _normalize_columns(columns)
+        self.header = [column["name"] for column in self.columns]
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.record = struct.Struct("<" + "".join(STRUCT_CODES[column["type"]] for column in self.columns))
+        self._delta_columns = {i: column["type"] for i, column in enumerate(self.columns)
+                               if column["type"] in SCALES}
+        self._last_steps = {i: 0 for i in self._delta_columns}
+        self.rows_written = 0
+        self.rows_total = REGISTRY.counter("binlog_rows_total", "Records written to binary logs")
+        if mode == "a" and os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            self._open_existing(buffer_size)
+        else:
+            self._create(meta, buffer_size)
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+
+    def _create(self, meta, buffer_size):
+        description = json.dumps({"columns": self.columns, "meta": meta or {}}).encode("utf-8")
+        header = FILE_HEADER.pack(MAGIC, VERSION, 0, len(description)) + description
+        header += b"\0" * ((-len(header)) % ALIGN)
+        self.file = open(self.file_path, "wb", buffering=buffer_size)
+        self.file.write(header)
+
+    def _open_existing(self, buffer_size):
+        with BinaryLog(self.file_path) as existing:
+            if existing.columns != self.columns:
+                raise BinaryLogError(f"Columns of {self.file_path} do not match")
+            for i in self._delta_columns:
+                kind = self._delta_columns[i]
+                steps = decode_steps(existing.records[self.header[i]], kind) * SCALES[kind]
+                known = steps[~np.isnan(steps)]
+                self._last_steps[i] = int(round(known[-1])) if len(known) else 0
+            end = existing.offset + len(existing) * existing.dtype.itemsize
+        self.file = open(self.file_path, "r+b", buffering=buffer_size)
+        # Urwany rekord po zaniku zasilania
+        self.file.truncate(end)
+        self.file.seek(end)
+
+    def _encode(self, row):
+        values = [math.nan if value is None else value for value in row]
+        for i, kind in self._delta_columns.items():
+            value = values[i]
+            missing = MISSING_CODES[kind]
+            if isinstance(value, float) and math.isnan(value):
+                values[i] = missing
+                continue
+            steps = int(round(value * SCALES[kind]))
+            delta = steps - self._last_steps[i]
+            if not missing < delta < -missing:
+                raise BinaryLogError(f"Step of {self.header[i]} too large for {kind}: {delta / SCALES[kind]}")
+            values[i] = delta
+            self._last_steps[i] = steps
+        return self.record.pack(*values)
+
+    def write_row(self, row):
+        self.file.write(self._encode(row))
+        self.rows_written += 1
+        self.rows_total.inc()
+        self.pending_rows += 1
+        if self.pending_rows >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file is not None and not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BinaryLog:
+    """Odczyt przez mmap: log["Temperature (°C)"] zwraca kolumnę jako float64."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, "rb") as file:
+            description, self.offset = _read_header(file)
+            self.columns = description["columns"]
+            self.types = {column["name"]: column["type"] for column in self.columns}
+            self.meta = description.get("meta", {})
+            self.dtype = _record_dtype(self.columns)
+            size = os.fstat(file.fileno()).st_size
+            count = max(size - self.offset, 0) // self.dtype.itemsize
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+        # Widok rekordów bezpośrednio na zmapowanym pliku
+        if self._mmap is not None:
+            self.records = np.frombuffer(self._mmap, dtype=self.dtype, count=count, offset=self.offset)
+        else:
+            self.records = np.empty(0, dtype=self.dtype)
+
+    @property
+    def header(self):
+        return [column["name"] for column in self.columns]
+
+    @property
+    def units(self):
+        return {column["name"]: column["unit"] for column in self.columns}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, name):
+        return name in self.dtype.names
+
+    def __getitem__(self, name):
+        column = self.records[name]
+        if self.types[name] in SCALES:
+            return decode_steps(column, self.types[name])
+        if column.dtype == np.float64:
+            return column
+        return column.astype(np.float64)
+
+    def to_array(self):
+        """(nazwy kolumn, tablica float64 [wiersze, kolumny]) jak experiment_archive.parse_csv."""
+        data = np.empty((len(self), len(self.columns)))
+        for i, name in enumerate(self.header):
+            data[:, i] = self[name]
+        return self.header, data
+
+    def close(self):
+        # Widok NumPy musi zniknąć przed zamknięciem mmap; gdy wywołujący
+        # trzyma jeszcze kolumny-widoki, mmap zamknie się razem z nimi
+        self.records = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decode_steps(deltas, kind="d16"):
+    """Kolumna różnicowa (d16: kroki 1/16 °C, t32: mikrosekundy) na float64, NaN dla braków."""
+    deltas = deltas.astype(np.int64)
+    missing = deltas == MISSING_CODES[kind]
+    deltas[missing] = 0
+    # Dzielenie daje najbliższy float64 do n / skala (np. 0.798517, nie 0.7985170000000001)
+    values = np.cumsum(deltas) / SCALES[kind]
+    values[missing] = np.nan
+    return values
+
+
+def _read_csv(file_path):
+    with open(file_path, newline='', encoding="utf-8") as file:
+        # Po zaniku zasilania w logach zostają bajty NUL i urwane wiersze
+        reader = csv.reader(line.replace("\x00", "") for line in file)
+        header = next(reader)
+        rows = []
+        for line in reader:
+            if not line:
+                continue
+            try:
+                row = [float(value) if value else math.nan for value in line[:len(header)]]
+            except ValueError:
+                continue
+            # Brakujące pola (np. kolumna D w logach PI) jako NaN
+            rows.append(row + [math.nan] * (len(header) - len(row)))
+    return header, np.array(rows, dtype=np.float64).reshape(len(rows), len(header))
+
+
+def _fits_steps(known, kind):
+    steps = known * SCALES[kind]
+    limit = -MISSING_CODES[kind]
+    return np.abs(np.diff(np.round(steps), prepend=0)).max() < limit
+
+
+def choose_type(values, unit="", lossy=False):
+    """Typ kolumny bez utraty dokładności.
+
+    d16 dla wartości na siatce 1/16 (temperatury DS18B20), t32 dla czasu
+    w sekundach (zaokrąglenie do 1 µs), f4 tylko gdy float32 odtwarza
+    wszystkie wartości dokładnie, w innym razie f8. lossy=True dopuszcza
+    float32 dla wszystkich wartości poniżej 1e6 (błąd względny ~6e-8,
+    dla sekund od startu do 0.06 s).
+    """
+    known = values[~np.isnan(values)]
+    if not len(known):
+        return "f4"
+    steps = known * SCALES["d16"]
+    if np.array_equal(steps, np.round(steps)) and _fits_steps(known, "d16"):
+        return "d16"
+    if unit == "s" and np.abs(known).max() < 2 ** 53 / SCALES["t32"] and _fits_steps(known, "t32"):
+        return "t32"
+    if np.array_equal(known.astype(np.float32), known):
+        return "f4"
+    return "f4" if lossy and np.abs(known).max() < 1e6 else "f8"
+
+
+def convert_csv(source, target=None, lossy=False):
+    """Zamienia log CSV na plik binarny; zwraca ścieżkę wyniku.
+
+    Domyślnie bez strat (poza zaokrągleniem czasu do 1 µs); lossy=True
+    zapisuje pozostałe kolumny jako float32.
+    """
+    target = target or os.path.splitext(source)[0] + EXTENSION
+    header, data = _read_csv(source)
+    columns = [{"name": name, "unit": _unit(name), "type": choose_type(data[:, i], _unit(name), lossy)}
+               for i, name in enumerate(header)]
+    with BinaryLogWriter(target, columns, meta={"source": os.path.basename(source)}, flush_rows=1 << 30) as writer:
+        for row in data.tolist():
+            writer.write_row(row)
+    return target
+
+
+def to_csv(source, target=None):
+    """Odwrotna konwersja (wartości float32 zapisywane z precyzją float32)."""
+    target = target or os.path.splitext(source)[0] + ".csv"
+    with BinaryLog(source) as log:
+        header, data = log.to_array()
+        types = [column["type"] for column in log.columns]
+    with open(target, "w", newline='', encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for row in data:
+            writer.writerow(["" if math.isnan(value) else
+                             repr(float(np.float32(value))) if kind == "f4" else repr(float(value))
+                             for value, kind in zip(row, types)])
+    return target
+
+
+def convert_all(directory=".", pattern="*.csv", output_dir=None, lossy=False):
+    """Konwertuje wszystkie logi; zwraca listę (plik, bajty CSV, bajty binarne)."""
+    results = []
+    for source in sorted(glob.glob(os.path.join(directory, pattern))):
+        target = None
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            target = os.path.join(output_dir, os.path.splitext(os.path.basename(source))[0] + EXTENSION)
+        try:
+            target = convert_csv(source, target, lossy)
+        except (OSError, ValueError, BinaryLogError, StopIteration) as e:
+            print(f"Error converting {source}: {e}")
+            continue
+        results.append((os.path.basename(source), os.path.getsize(source), os.path.getsize(target)))
+    return results
+
+
+def benchmark(path="pid_temperature_log.csv", loads=20, lossy=False):
+    """Rozmiar i czas wczytania logu CSV i binarnego oraz największy błąd odtworzenia."""
+    import tempfile
+
+    from experiment_archive import parse_csv
+
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    with tempfile.TemporaryDirectory() as tmp:
+        target = convert_csv(source, os.path.join(tmp, "log" + EXTENSION), lossy)
+        start = time.perf_counter()
+        for _ in range(loads):
+            parse_csv(source)
+        csv_load = (time.perf_counter() - start) / loads
+        start = time.perf_counter()
+        for _ in range(loads):
+            with BinaryLog(target) as log:
+                log.to_array()
+        binary_load = (time.perf_counter() - start) / loads
+        _, original = _read_csv(source)
+        with BinaryLog(target) as log:
+            _, restored = log.to_array()
+        return {
+            "size_ratio": os.path.getsize(target) / os.path.getsize(source),
+            "max_abs_error": float(np.nanmax(np.abs(restored - original))) if original.size else 0.0,
+            "csv_load_ms": csv_load * 1000,
+            "binary_load_ms": binary_load * 1000,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert experiment logs between CSV and the binary log format")
+    parser.add_argument("paths", nargs="*", help="files to convert (default: all *.csv in the current directory)")
+    parser.add_argument("--output-dir", help="directory for converted files (default: next to the source)")
+    parser.add_argument("--to-csv", action="store_true", help="convert .tlog files back to CSV")
+    parser.add_argument("--lossy", action="store_true",
+                        help="store non-grid columns as float32 (smaller, ~7 significant digits)")
+    args = parser.parse_args()
+
+    if args.to_csv:
+        for path in args.paths:
+            print(f"{path} -> {to_csv(path)}")
+    else:
+        results = []
+        if args.paths:
+            for path in args.paths:
+                results += convert_all(os.path.dirname(path) or ".", os.path.basename(path), args.output_dir,
+                                       args.lossy)
+        else:
+            results = convert_all(output_dir=args.output_dir, lossy=args.lossy)
+        for name, csv_size, binary_size in results:
+            print(f"{name}: {csv_size} -> {binary_size} bytes ({csv_size / binary_size:.1f}x)")
+        total_csv = sum(csv_size for _, csv_size, _ in results)
+        total_binary = sum(binary_size for _, _, binary_size in results)
+        if total_binary:
+            print(f"Total: {total_csv} -> {total_binary} bytes ({total_csv / total_binary:.1f}x)")
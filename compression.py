@@ -0,0 +1,257 @@
+import csv
+import math
+import time
+
+# Kompresja pomiarów przed wysyłką i zapisem.
+#  - DeadbandFilter / TelemetryFilter (wysyłka bieżących odczytów): wartość
+#    idzie dalej, gdy zmieni się o więcej niż deadband od ostatnio wysłanej
+#    albo gdy od ostatniej wysyłki minęło heartbeat sekund (API wie, że
+#    czujnik żyje). DS18B20 stoi minutami na tym samym kroku 0.0625 °C, więc
+#    większość cykli nic nie wysyła.
+#  - SwingingDoor (archiwa CSV): zostają tylko punkty, między którymi
+#    interpolacja liniowa nie odbiega od pominiętych próbek o więcej niż
+#    deviation danej kolumny. Wszystkie kolumny wiersza mają wspólne punkty,
+#    więc plik zachowuje układ wierszy.
+
+# Strefy martwe kanałów wysyłanych na żywo: 2 kroki DS18B20, krok DHT22 0.1 °C,
+# krok DHT11 1 °C i 1 % wilgotności
+DEFAULT_DEADBANDS = {
+    "ds18b20": 0.125,
+    "dht22_temp": 0.2,
+    "dht22_humidity": 1.0,
+    "dht11_temp": 1.0,
+    "dht11_humidity": 1.0,
+}
+DEFAULT_HEARTBEAT = 60.0
+
+
+class DeadbandFilter:
+    """Jeden kanał: update() zwraca True, gdy wartość trzeba wysłać."""
+
+    def __init__(self, deadband, heartbeat=DEFAULT_HEARTBEAT):
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self.last_value = None
+        self.last_time = None
+
+    def should_send(self, value, now):
+        if self.last_time is None or now - self.last_time >= self.heartbeat:
+            return True
+        if (value is None) != (self.last_value is None):
+            return True
+        return value is not None and abs(value - self.last_value) > self.deadband
+
+    def sent(self, value, now):
+        self.last_value = value
+        self.last_time = now
+
+    def update(self, value, now=None):
+        now = time.monotonic() if now is None else now
+        if not self.should_send(value, now):
+            return False
+        self.sent(value, now)
+        return True
+
+
+class TelemetryFilter:
+    """Kilka kanałów wysyłanych jednym żądaniem.
+
+    Gdy którykolwiek kanał przekroczy swoją strefę martwą (albo minie
+    heartbeat), wysyłane są wszystkie i wszystkie zapamiętują nowe wartości.
+    Kanały bez strefy w deadbands przechodzą z default_deadband.
+    """
+
+    def __init__(self, deadbands=None, heartbeat=DEFAULT_HEARTBEAT, default_deadband=0.0, clock=None):
+        self.deadbands = dict(DEFAULT_DEADBANDS if deadbands is None else deadbands)
+        self.heartbeat = heartbeat
+        self.default_deadband = default_deadband
+        self.clock = clock or (lambda: time.monotonic())
+        self.channels = {}
+        self.offered = 0
+        self.passed = 0
+
+    def _channel(self, name):
+        channel = self.channels.get(name)
+        if channel is None:
+            deadband = self.deadbands.get(name, self.default_deadband)
+            channel = self.channels[name] = DeadbandFilter(deadband, self.heartbeat)
+        return channel
+
+    def update(self, values, now=None):
+        """values: {kanał: wartość}; zwraca True, gdy próbkę trzeba wysłać."""
+        now = self.clock() if now is None else now
+        self.offered += 1
+        channels = {name: self._channel(name) for name in values}
+        if not any(channel.should_send(values[name], now) for name, channel in channels.items()):
+            return False
+        for name, channel in channels.items():
+            channel.sent(values[name], now)
+        self.passed += 1
+        return True
+
+    def ratio(self):
+        """Część próbek, które przeszły filtr."""
+        return self.passed / self.offered if self.offered else None
+
+
+class SwingingDoor:
+    """Kompresja swinging door dla wierszy (czas, [wartości]).
+
+    deviations to dopuszczalny błąd interpolacji dla każdej kolumny
+    wartości; None oznacza kolumnę bez ograniczenia (brana z zachowanych
+    wierszy). max_interval wymusza zachowanie punktu co najmniej co tyle
+    jednostek czasu. add() zwraca listę wierszy do zapisania jako
+    (czas, wartości, payload), flush() ostatni wiersz serii.
+    """
+
+    def __init__(self, deviations, max_interval=None):
+        self.deviations = list(deviations)
+        self.max_interval = max_interval
+        self.anchor = None  # Ostatni zachowany wiersz
+        self.previous = None  # Ostatni wiersz, jeszcze niezapisany
+        self._lower = self._upper = None
+
+    def _archive(self, row):
+        self.anchor = row
+        self.previous = None
+        self._lower = [-math.inf] * len(self.deviations)
+        self._upper = [math.inf] * len(self.deviations)
+
+    def _fits(self, timestamp, values):
+        """Zawęża drzwi o nowy punkt; False, gdy któraś kolumna się nie mieści."""
+        anchor_time, anchor_values, _ = self.anchor
+        dt = timestamp - anchor_time
+        if self.max_interval is not None and dt > self.max_interval:
+            return False
+        lower = list(self._lower)
+        upper = list(self._upper)
+        for i, deviation in enumerate(self.deviations):
+            if deviation is None:
+                continue
+            value, anchor_value = values[i], anchor_values[i]
+            if value is None or anchor_value is None:
+                if (value is None) != (anchor_value is None):
+                    return False
+                continue
+            if dt <= 0:
+                if abs(value - anchor_value) > deviation:
+                    return False
+                continue
+            # Odcinek od zachowanego punktu do nowego musi mieścić się w drzwiach
+            # wyznaczonych przez punkty pośrednie, wtedy błąd każdego z nich
+            # jest najwyżej deviation
+            slope = (value - anchor_value) / dt
+            if not lower[i] <= slope <= upper[i]:
+                return False
+            lower[i] = max(lower[i], (value - deviation - anchor_value) / dt)
+            upper[i] = min(upper[i], (value + deviation - anchor_value) / dt)
+        self._lower, self._upper = lower, upper
+        return True
+
+    def add(self, timestamp, values, payload=None):
+        row = (timestamp, values, payload)
+        if self.anchor is None:
+            self._archive(row)
+            return [row]
+        archived = []
+        if not self._fits(timestamp, values):
+            if self.previous is None:
+                # Poprzedni punkt to już zachowany wiersz (np. po przerwie)
+                self._archive(row)
+                return [row]
+            # Drzwi się zamknęły: zostaje poprzedni punkt, od niego nowe drzwi
+            archived.append(self.previous)
+            self._archive(self.previous)
+            self._fits(timestamp, values)
+        self.previous = row
+        return archived
+
+    def flush(self):
+        """Kończy serię: zwraca niezapisany ostatni wiersz; następny add() zaczyna nową."""
+        row = self.previous
+        self.anchor = None
+        self.previous = None
+        return [] if row is None else [row]
+
+
+def swinging_door(times, rows, deviations, max_interval=None):
+    """Indeksy wierszy zachowanych przez SwingingDoor."""
+    door = SwingingDoor(deviations, max_interval)
+    kept = []
+    for i, (timestamp, values) in enumerate(zip(times, rows)):
+        kept += door.add(timestamp, values, i)
+    kept += door.flush()
+    return [i for _, _, i in kept]
+
+
+def _cell(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def compress_csv(source, target, deviations, time_column="Time (s)", max_interval=None):
+    """Kompresuje log CSV swinging door; zwraca (wiersze przed, wiersze po).
+
+    deviations: {kolumna: dopuszczalny błąd}; pozostałe kolumny są brane
+    z zachowanych wierszy bez ograniczenia błędu. Zachowane wiersze
+    zapisywane są w oryginalnej postaci tekstowej.
+    """
+    with open(source, newline='', encoding="utf-8") as file:
+        # Po zaniku zasilania w logach zostają bajty NUL i urwane wiersze
+        reader = csv.reader(line.replace("\x00", "") for line in file)
+        header = next(reader)
+        time_index = header.index(time_column)
+        columns = [i for i in range(len(header)) if i != time_index]
+        door = SwingingDoor([deviations.get(header[i]) for i in columns], max_interval)
+        rows_in = 0
+        with open(target, "w", newline='', encoding="utf-8") as output:
+            writer = csv.writer(output)
+            writer.writerow(header)
+            rows_out = 0
+            for line in reader:
+                if len(line) != len(header) or _cell(line[time_index]) is None:
+                    continue
+                rows_in += 1
+                archived = door.add(float(line[time_index]), [_cell(line[i]) for i in columns], line)
+                for _, _, kept in archived:
+                    writer.writerow(kept)
+                rows_out += len(archived)
+            for _, _, kept in door.flush():
+                writer.writerow(kept)
+                rows_out += 1
+    return rows_in, rows_out
+
+
+def benchmark(paths=("100_mocy_mata.csv", "pi_temperature_log22_12_T750L64.csv"), deviation=0.125):
+    """Redukcja wierszy logów i wysyłek na repozytoryjnych przebiegach."""
+    import os
+    import tempfile
+
+    from experiment_archive import parse_csv
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in paths:
+            name = os.path.splitext(path)[0]
+            source = os.path.join(here, path)
+            target = os.path.join(tmp, path)
+            start = time.perf_counter()
+            rows_in, rows_out = compress_csv(source, target, {"Temperature (°C)": deviation})
+            results[f"{name}_sdt_rows_per_s"] = rows_in / (time.perf_counter() - start)
+            results[f"{name}_sdt_row_ratio"] = rows_out / rows_in
+            results[f"{name}_sdt_byte_ratio"] = os.path.getsize(target) / os.path.getsize(source)
+            # Wysyłka bieżących odczytów: temperatura co cykl logu przez TelemetryFilter
+            _, data = parse_csv(source)
+            telemetry = TelemetryFilter({"ds18b20": deviation})
+            for timestamp, temperature in data[:, :2]:
+                telemetry.update({"ds18b20": temperature}, now=timestamp)
+            results[f"{name}_deadband_send_ratio"] = telemetry.ratio()
+    return results
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:.4g}")
@@ -0,0 +1,189 @@
+import math
+import time
+
+import numpy as np
+
+# Bank regulatorów PID dla wielu terrariów: stan każdego regulatora to
+# element tablicy NumPy, więc P/I/D wszystkich pętli liczone są jednym
+# krokiem wektorowym. W odróżnieniu od dawnych PIController/PIDController:
+#  - anti-windup przez back-calculation (całka nie rośnie, gdy wyjście jest
+#    obcięte do 0-100, por. I = 571 w pi_temperature_log22_12_T900L85.csv),
+#  - pochodna liczona z pomiaru (bez skoku przy zmianie wartości zadanej)
+#    i filtrowana filtrem pierwszego rzędu (Td / N),
+#  - brakujący pomiar (NaN) zostawia stan i wyjście danej pętli bez zmian.
+
+
+def pi_gains(T, L):
+    """Nastawy PI z tabeli (jak w PIController): Kp = 0.9 T / L, Ti = L / 0.3."""
+    kp = 0.9 * T / L
+    ti = L / 0.3
+    return kp, kp / ti
+
+
+class ControllerBank:
+    def __init__(self, output_min=0.0, output_max=100.0, derivative_filter=10.0, capacity=8):
+        self.output_min = output_min
+        self.output_max = output_max
+        self.derivative_filter = derivative_filter  # N: stała filtru to Td / N
+        self.size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        def grow(name, fill=0.0):
+            old = getattr(self, name, None)
+            array = np.full(capacity, fill)
+            if old is not None:
+                array[:self.size] = old[:self.size]
+            setattr(self, name, array)
+
+        for name in ("kp", "ki", "kd", "kt", "setpoint", "integral", "derivative", "output"):
+            grow(name)
+        grow("previous_measurement", np.nan)
+        grow("previous_time", np.nan)
+
+    def add(self, kp, ki, kd=0.0, setpoint=0.0, tracking_time=None):
+        """Dodaje pętlę i zwraca jej kanał (obiekt z compute() jak w PIController).
+
+        tracking_time to stała back-calculation Tt; domyślnie Ti dla PI
+        i sqrt(Ti * Td) dla PID.
+        """
+        if self.size == len(self.kp):
+            self._allocate(max(2 * len(self.kp), 1))
+        index = self.size
+        self.size += 1
+        self.setpoint[index] = setpoint
+        self.set_gains(index, kp, ki, kd, tracking_time)
+        self.reset(index)
+        return ControllerChannel(self, index)
+
+    def set_gains(self, index, kp, ki, kd=0.0, tracking_time=None):
+        """Zmienia nastawy pętli bez ruszania jej stanu (np. po auto-tuningu)."""
+        self.kp[index] = kp
+        self.ki[index] = ki
+        self.kd[index] = kd
+        if tracking_time is None and ki > 0:
+            ti = kp / ki
+            tracking_time = math.sqrt(ti * kd / kp) if kd > 0 and kp > 0 else ti
+        self.kt[index] = 1.0 / tracking_time if tracking_time else 0.0
+
+    def add_pi(self, T, L, setpoint=0.0):
+        kp, ki = pi_gains(T, L)
+        return self.add(kp, ki, 0.0, setpoint)
+
+    def reset(self, index, output=0.0):
+        self.integral[index] = output
+        self.derivative[index] = 0.0
+        self.output[index] = output
+        self.previous_measurement[index] = np.nan
+        self.previous_time[index] = np.nan
+
+    def compute(self, measured, dt, mask=None):
+        """Jeden krok wszystkich pętli (albo tylko tych z mask).
+
+        measured i dt to tablice długości size (dt może być liczbą). Zwraca
+        (output, error, P, I, D) jako tablice; pętle pominięte albo bez
+        pomiaru (NaN) zwracają poprzednie wyjście.
+        """
+        n = self.size
+        measured = np.asarray(measured, dtype=float)
+        dt = np.broadcast_to(np.asarray(dt, dtype=float), (n,))
+        active = ~np.isnan(measured) & (dt > 0)
+        if mask is not None:
+            active &= mask
+
+        kp, ki, kd = self.kp[:n], self.ki[:n], self.kd[:n]
+        error = self.setpoint[:n] - measured
+        P = kp * error
+
+        # Pochodna z pomiaru z filtrem: D = (Tf*D - Kd*dy) / (Tf + dt)
+        previous = self.previous_measurement[:n]
+        has_previous = active & ~np.isnan(previous)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            td = np.where(kp > 0, kd / kp, 0.0)
+            tf = td / self.derivative_filter
+            delta = np.where(has_previous, measured - previous, 0.0)
+            D = np.where(kd > 0, (tf * self.derivative[:n] - kd * delta) / (tf + dt), 0.0)
+        D = np.where(active, D, self.derivative[:n])
+
+        I = self.integral[:n]
+        unsaturated = P + I + D
+        output = np.clip(unsaturated, self.output_min, self.output_max)
+        # Back-calculation: nadmiar ponad nasycenie zwija całkę
+        new_integral = I + (ki * error + self.kt[:n] * (output - unsaturated)) * dt
+
+        self.integral[:n] = np.where(active, new_integral, I)
+        self.derivative[:n] = D
+        self.previous_measurement[:n] = np.where(active, measured, previous)
+        self.output[:n] = np.where(active, output, self.output[:n])
+        return self.output[:n].copy(), error, P, I.copy(), D
+
+
+class ControllerChannel:
+    """Widok jednej pętli banku z interfejsem zgodnym z PIController.compute.
+
+    compute() liczy tylko swoją pętlę skalarnie, tymi samymi równaniami co
+    ControllerBank.compute (lampy w AsyncPoller mają własne terminy, więc
+    wektorowy krok całego banku na każdą lampę kosztowałby O(rozmiar banku)).
+    """
+
+    def __init__(self, bank, index):
+        self.bank = bank
+        self.index = index
+
+    def compute(self, setpoint, measured_value, dt=None):
+        """Zwraca (output, error, P, I, D); bez dt mierzy czas od poprzedniego wywołania."""
+        bank = self.bank
+        i = self.index
+        now = time.monotonic()
+        if dt is None:
+            previous = bank.previous_time[i]
+            dt = 0.0 if np.isnan(previous) else now - previous
+        bank.previous_time[i] = now
+        bank.setpoint[i] = setpoint
+
+        kp = float(bank.kp[i])
+        I = float(bank.integral[i])
+        error = setpoint - measured_value
+        P = kp * error
+        if math.isnan(measured_value):
+            # Brak pomiaru: stan i wyjście bez zmian
+            return float(bank.output[i]), error, P, I, float(bank.derivative[i])
+        if dt <= 0:
+            # Pierwsze wywołanie: tylko część proporcjonalna, jak w PIController
+            bank.previous_measurement[i] = measured_value
+            output = min(max(P + I, bank.output_min), bank.output_max)
+            bank.output[i] = output
+            return output, error, P, I, 0.0
+
+        kd = float(bank.kd[i])
+        D = 0.0
+        if kd > 0:
+            # Pochodna z pomiaru z filtrem: D = (Tf*D - Kd*dy) / (Tf + dt)
+            previous = float(bank.previous_measurement[i])
+            delta = 0.0 if math.isnan(previous) else measured_value - previous
+            tf = (kd / kp if kp > 0 else 0.0) / bank.derivative_filter
+            D = (tf * float(bank.derivative[i]) - kd * delta) / (tf + dt)
+        unsaturated = P + I + D
+        output = min(max(unsaturated, bank.output_min), bank.output_max)
+        # Back-calculation: nadmiar ponad nasycenie zwija całkę
+        I += (float(bank.ki[i]) * error + float(bank.kt[i]) * (output - unsaturated)) * dt
+        bank.integral[i] = I
+        bank.derivative[i] = D
+        bank.previous_measurement[i] = measured_value
+        bank.output[i] = output
+        return output, error, P, I, D
+
+
+if __name__ == "__main__":
+    for count in (1, 8, 32, 256, 4096):
+        bank = ControllerBank(capacity=count)
+        for _ in range(count):
+            bank.add(*pi_gains(900.0, 85.0), kd=5.0, setpoint=34.0)
+        measured = np.full(count, 25.0)
+        steps = 2000
+        start = time.perf_counter()
+        for _ in range(steps):
+            bank.compute(measured, 1.0)
+        elapsed = time.perf_counter() - start
+        print(f"{count:5d} loops: {elapsed / steps * 1e6:7.1f} us per step, "
+              f"{count * steps / elapsed:12.0f} loop-steps/s, integral {bank.integral[0]:.2f}")
@@ -0,0 +1,188 @@
+import csv
+import os
+import time
+from datetime import datetime
+
+from metrics import REGISTRY
+
+# Logger CSV dla eksperymentów: plik jest otwarty cały czas, wiersze czekają
+# w buforze i trafiają na kartę SD co flush_rows wierszy albo co flush_interval
+# sekund. Opcjonalnie fsync i rotacja pliku po rozmiarze lub po zmianie dnia.
+# compressor (compression.SwingingDoor dla kolumn po czasie) zapisuje tylko
+# wiersze potrzebne do odtworzenia przebiegu z zadanym błędem.
+
+
+class _ByteCounter:
+    """Pośrednik zapisu liczący bajty UTF-8 (writerow zwraca liczbę znaków, a "°C" to 3 bajty)."""
+
+    def __init__(self, file, count=0):
+        self.file = file
+        self.count = count
+
+    def write(self, text):
+        self.count += len(text) if text.isascii() else len(text.encode("utf-8"))
+        return self.file.write(text)
+
+
+class CsvLogger:
+    def __init__(self, file_path, header, flush_rows=60, flush_interval=10.0, fsync=False,
+                 max_bytes=None, rotate_daily=False, mode="w", buffer_size=1 << 16, compressor=None):
+        self.file_path = file_path
+        self.header = list(header)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.buffer_size = buffer_size
+        self.compressor = compressor
+        self.rows_written = 0
+        self.file = None
+        self.rows_total = REGISTRY.counter("csv_rows_total", "Rows written to CSV logs")
+        self.flush_seconds = REGISTRY.histogram("csv_flush_seconds", "CSV buffer flush (and fsync) time")
+        self._open(mode)
+
+    def _open(self, mode):
+        self.file = open(self.file_path, mode=mode, newline='', encoding="utf-8", buffering=self.buffer_size)
+        self._counter = _ByteCounter(self.file, self.file.tell() if mode == "a" else 0)
+        self.writer = csv.writer(self._counter)
+        if self.bytes_written == 0:
+            self.writer.writerow(self.header)
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+        self.day = datetime.now().date()
+
+    def write_row(self, row):
+        if self.compressor is None:
+            self._write(row)
+            return
+        for _, _, kept in self.compressor.add(row[0], row[1:], row):
+            self._write(kept)
+
+    def _write(self, row):
+        if self._should_rotate():
+            self.rotate()
+        self.writer.writerow(row)
+        self.rows_written += 1
+        self.rows_total.inc()
+        self.pending_rows += 1
+        if self.pending_rows >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    @property
+    def bytes_written(self):
+        return self._counter.count
+
+    def flush(self):
+        start = time.perf_counter()
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.flush_seconds.observe(time.perf_counter() - start)
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+
+    def _should_rotate(self):
+        if self.max_bytes is not None and self.bytes_written >= self.max_bytes:
+            return True
+        return self.rotate_daily and datetime.now().date() != self.day
+
+    def rotate(self):
+        """Zamyka bieżący plik pod nazwą z datą i zaczyna nowy z tym samym nagłówkiem.
+
+        Po zmianie dnia plik dostaje datę dnia, którego dotyczy (self.day),
+        po przekroczeniu rozmiaru datę i godzinę rotacji; istniejący plik
+        o tej nazwie nie jest nadpisywany, nowy dostaje licznik (_1, _2, ...).
+        """
+        # Seria kompresora ciągnie się dalej w nowym pliku
+        self._close_file()
+        root, extension = os.path.splitext(self.file_path)
+        now = datetime.now()
+        rotated_path = f"{root}_{now.strftime('%Y%m%d-%H%M%S')}{extension}"
+        if self.rotate_daily and now.date() != self.day:
+            daily_path = f"{root}_{self.day.strftime('%Y%m%d')}{extension}"
+            if not os.path.exists(daily_path):
+                rotated_path = daily_path
+        # Kilka rotacji w tej samej sekundzie
+        base, counter = rotated_path, 1
+        while os.path.exists(rotated_path):
+            rotated_path = f"{os.path.splitext(base)[0]}_{counter}{extension}"
+            counter += 1
+        os.replace(self.file_path, rotated_path)
+        self._open("w")
+        return rotated_path
+
+    def close(self):
+        if self.file is not None and not self.file.closed and self.compressor is not None:
+            # Ostatni wiersz serii czeka w kompresorze
+            for _, _, kept in self.compressor.flush():
+                self._write(kept)
+        self._close_file()
+
+    def _close_file(self):
+        if self.file is not None and not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Porównanie z dotychczasowym save_to_csv (open/append/close dla każdego wiersza)
+def _legacy_save_to_csv(file_path, row):
+    with open(file_path, mode='a', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(row)
+
+
+def _write_syscalls():
+    # Liczba wywołań write() procesu (tylko Linux)
+    try:
+        with open("/proc/self/io") as file:
+            for line in file:
+                if line.startswith("syscw:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def benchmark(rows=20000, directory=None):
+    import tempfile
+
+    header = ["Time (s)", "Temperature (°C)", "Error", "PI Output", "P Component", "I Component"]
+    row = [0.7985174655914307, 23.0625, 7.9375, 0.39393812500000003, 0.36750625000000003, 0.026431875]
+    results = {}
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        legacy_path = os.path.join(tmp, "legacy.csv")
+        with open(legacy_path, mode='w', newline='') as file:
+            csv.writer(file).writerow(header)
+        syscalls = _write_syscalls()
+        start = time.perf_counter()
+        for _ in range(rows):
+            _legacy_save_to_csv(legacy_path, row)
+        elapsed = time.perf_counter() - start
+        results["legacy_rows_per_s"] = rows / elapsed
+        if syscalls is not None:
+            results["legacy_write_syscalls"] = _write_syscalls() - syscalls
+        results["legacy_open_calls"] = rows
+
+        syscalls = _write_syscalls()
+        start = time.perf_counter()
+        with CsvLogger(os.path.join(tmp, "buffered.csv"), header) as logger:
+            for _ in range(rows):
+                logger.write_row(row)
+        elapsed = time.perf_counter() - start
+        results["buffered_rows_per_s"] = rows / elapsed
+        if syscalls is not None:
+            results["buffered_write_syscalls"] = _write_syscalls() - syscalls
+        results["buffered_open_calls"] = 1
+    return results
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:.0f}")
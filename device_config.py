@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+# Konfiguracja terrariów i pinów z lokalną kopią na dysku.
+# Przy starcie sterowanie rusza od razu z ostatniej zapisanej kopii, a wątek
+# w tle odświeża ją zapytaniami warunkowymi (If-None-Match / If-Modified-Since),
+# więc niedziałające API nie blokuje grzania. Lista pinów pobierana jest raz
+# i indeksowana po terrarium_id (zamiast fetch_pins dla każdego terrarium).
+
+API_URL_BASE = "http://212.47.71.180:8080"
+SNAPSHOT_PATH = "device_config.json"
+
+
+class ConfigResource:
+    """Jeden zasób API z walidatorami do zapytań warunkowych."""
+
+    def __init__(self, url, data=None, etag=None, last_modified=None, digest=None):
+        self.url = url
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+
+    def fetch(self, session, timeout):
+        """Zwraca True, gdy dane się zmieniły (odpowiedź 304 to brak zmian)."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        response = session.get(self.url, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        # Bez walidatorów zmianę wykrywa skrót treści
+        digest = hashlib.sha1(response.content).hexdigest()
+        if digest == self.digest:
+            return False
+        self.digest = digest
+        self.data = response.json()
+        return True
+
+    def to_dict(self):
+        return {"url": self.url, "data": self.data, "etag": self.etag,
+                "last_modified": self.last_modified, "digest": self.digest}
+
+
+class DeviceConfig:
+    """Terraria i piny użytkownika, odświeżane w tle co refresh_interval sekund.
+
+    subscribe(callback) rejestruje callback(config, changed_ids), wywoływany
+    w wątku odświeżania, gdy terraria o podanych id zmienią piny albo zostaną
+    dodane, usunięte lub zmienione (np. typ); terrarium(id) zwraca wtedy
+    None dla usuniętych.
+    """
+
+    def __init__(self, user_id, api_url_base=API_URL_BASE, path=SNAPSHOT_PATH, refresh_interval=300.0,
+                 timeout=5.0, session=None):
+        self.user_id = user_id
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.terrariums_resource = ConfigResource(f"{api_url_base}/terrariums/user/id/{user_id}")
+        self.pins_resource = ConfigResource(f"{api_url_base}/pins/pins/{user_id}")
+        self.updated = None  # Czas ostatniego udanego odświeżenia
+        self._pins_by_terrarium = {}
+        self._terrariums_by_id = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """Wczytuje zapisaną kopię; zwraca False, gdy jej nie ma."""
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"Error loading device config snapshot: {e}")
+            return False
+        if snapshot.get("user_id") != self.user_id:
+            return False
+        for resource, key in ((self.terrariums_resource, "terrariums"), (self.pins_resource, "pins")):
+            saved = snapshot.get(key, {})
+            if saved.get("url") == resource.url:
+                resource.data = saved.get("data")
+                resource.etag = saved.get("etag")
+                resource.last_modified = saved.get("last_modified")
+                resource.digest = saved.get("digest")
+        self.updated = snapshot.get("updated")
+        with self._lock:
+            self._pins_by_terrarium = index_pins(self.pins_resource.data or [])
+            self._terrariums_by_id = index_terrariums(self.terrariums_resource.data or [])
+        return self.terrariums_resource.data is not None
+
+    def save(self):
+        snapshot = {
+            "user_id": self.user_id,
+            "updated": self.updated,
+            "terrariums": self.terrariums_resource.to_dict(),
+            "pins": self.pins_resource.to_dict(),
+        }
+        # Zapis przez plik tymczasowy, żeby przerwany zapis nie zepsuł kopii;
+        # osobny dla każdego procesu (workery supervisor.py dzielą kopię)
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file)
+        os.replace(temporary, self.path)
+
+    def refresh(self):
+        """Odpytuje API; zwraca zbiór id zmienionych terrariów (piny albo opis) lub None przy błędzie."""
+        try:
+            terrariums_changed = self.terrariums_resource.fetch(self.session, self.timeout)
+            pins_changed = self.pins_resource.fetch(self.session, self.timeout)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Error refreshing device config: {e}")
+            return None
+        self.updated = time.time()
+
+        # Indeksy zawsze od nowa z danych obu zasobów: gdy poprzednie
+        # odświeżenie pobrało terraria, a na pinach padło, ta zmiana
+        # przychodzi teraz jako 304 i widać ją tylko w porównaniu indeksów
+        pins = index_pins(self.pins_resource.data or [])
+        terrariums = index_terrariums(self.terrariums_resource.data or [])
+        with self._lock:
+            changed = _changed_ids(self._pins_by_terrarium, pins) | _changed_ids(self._terrariums_by_id, terrariums)
+            self._pins_by_terrarium = pins
+            self._terrariums_by_id = terrariums
+        if terrariums_changed or pins_changed or changed:
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Error saving device config snapshot: {e}")
+        if changed:
+            for callback in list(self._listeners):
+                try:
+                    callback(self, changed)
+                except Exception as e:
+                    print(f"Error applying device config change: {e}")
+        return changed
+
+    def ensure_loaded(self):
+        """Start: kopia z dysku, a bez niej jedno (blokujące) odświeżenie."""
+        if not self.load():
+            self.refresh()
+        return self
+
+    def terrariums(self):
+        return list(self.terrariums_resource.data or [])
+
+    def terrarium(self, terrarium_id):
+        with self._lock:
+            return self._terrariums_by_id.get(terrarium_id)
+
+    def pins_for(self, terrarium_id):
+        with self._lock:
+            return list(self._pins_by_terrarium.get(terrarium_id, []))
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="device-config", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        # Pierwsze odświeżenie, gdy kopia z dysku się zestarzeje (bez kopii od razu)
+        delay = 0.0
+        if self.updated is not None:
+            delay = min(max(self.updated + self.refresh_interval - time.time(), 0.0), self.refresh_interval)
+        while not self._stop.wait(delay):
+            self.refresh()
+            delay = self.refresh_interval
+
+
+def _changed_ids(old, new):
+    return {key for key in set(old) | set(new) if old.get(key) != new.get(key)}
+
+
+def index_terrariums(terrariums):
+    return {terrarium.get("id"): terrarium for terrarium in terrariums}
+
+
+def index_pins(pins):
+    """Piny pogrupowane po terrarium_id, w stałej kolejności (do porównań)."""
+    index = {}
+    for pin in pins:
+        index.setdefault(pin.get("terrarium_id"), []).append(pin)
+    for terrarium_pins in index.values():
+        terrarium_pins.sort(key=lambda pin: (str(pin.get("function")), str(pin.get("id"))))
+    return index
@@ -4,6 +4,7 @@ import adafruit_dht
 from w1thermsensor import W1ThermSensor
 import time
 from datetime import datetime
+from streaming_stats import ChannelStats, TEMPERATURE_RANGE, HUMIDITY_RANGE
 
 # Klasa TerrariumLamp
 class TerrariumLamp:
@@ -12,7 +13,12 @@ class TerrariumLamp:
         self.dht22_t1 = dht22_t1
         self.dht11_t2 = dht11_t2
         self.ds18b20 = ds18b20
-        self.hourly_data = []  # Lista przechowująca dane do statystyk
+        # Statystyki strumieniowe (stała pamięć) zamiast listy wszystkich odczytów
+        self.stats = {
+            "dht22_temp": ChannelStats(TEMPERATURE_RANGE),
+            "dht11_temp": ChannelStats(TEMPERATURE_RANGE),
+            "humidity": ChannelStats(HUMIDITY_RANGE),
+        }
 
     def get_dht22_readings(self):
         if self.dht22_t1:
@@ -44,27 +50,25 @@ class TerrariumLamp:
         return None
 
     def record_hourly_reading(self, dht22_temp, dht11_temp, dht11_humidity):
-        """Zapisuje odczyty do listy przechowującej dane do statystyk."""
-        self.hourly_data.append({
-            "dht22_temp": dht22_temp,
-            "dht11_temp": dht11_temp,
-            "humidity": dht11_humidity
-        })
+        """Dodaje odczyty do statystyk (brakujące wartości są pomijane)."""
+        self.stats["dht22_temp"].add(dht22_temp)
+        self.stats["dht11_temp"].add(dht11_temp)
+        self.stats["humidity"].add(dht11_humidity)
+
+    def window_stats(self, window="hour"):
+        """Statystyki z okna "minute", "hour" albo "day" dla wszystkich kanałów."""
+        return {channel: stats.summary(window) for channel, stats in self.stats.items()}
 
     def calculate_and_send_hourly_stats(self, stats_api_url):
-        """Oblicza średnie dane z hourly_data i wysyła je na API."""
-        if not self.hourly_data:
+        """Oblicza średnie dane od ostatniego wysłania i wysyła je na API."""
+        if not any(stats.period.count for stats in self.stats.values()):
             print(f"No data to calculate for Terrarium ID {self.terrarium_id}")
             return
 
-        # Obliczenie średnich wartości
-        dht22_temps = [data["dht22_temp"] for data in self.hourly_data if data["dht22_temp"] is not None]
-        dht11_temps = [data["dht11_temp"] for data in self.hourly_data if data["dht11_temp"] is not None]
-        humidities = [data["humidity"] for data in self.hourly_data if data["humidity"] is not None]
-
-        avg_dht22_temp = sum(dht22_temps) / len(dht22_temps) if dht22_temps else 0
-        avg_dht11_temp = sum(dht11_temps) / len(dht11_temps) if dht11_temps else 0
-        avg_humidity = sum(humidities) / len(humidities) if humidities else 0
+        # Obliczenie średnich wartości (rozpoczyna nowy okres)
+        avg_dht22_temp = self.stats["dht22_temp"].take_period()["mean"] or 0
+        avg_dht11_temp = self.stats["dht11_temp"].take_period()["mean"] or 0
+        avg_humidity = self.stats["humidity"].take_period()["mean"] or 0
 
         # Przygotowanie danych do wysyłki
         data = {
@@ -87,9 +91,6 @@ class TerrariumLamp:
         except requests.RequestException as e:
             print(f"Error sending stats for Terrarium ID {self.terrarium_id}: {e}")
 
-        # Wyczyszczenie danych po wysłaniu
-        self.hourly_data.clear()
-
     def send_readings(self, api_url_base):
         """Wysyła aktualne odczyty do API w celu zaktualizowania bieżących wartości."""
         dht22_temp, dht22_humidity = self.get_dht22_readings()
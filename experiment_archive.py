@@ -0,0 +1,360 @@
+import glob
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+import binlog
+
+# Archiwum logów eksperymentów (*.csv w katalogu repozytorium, albo *.tlog
+# z binlog.py przy pattern="*.tlog").
+# Każdy plik jest parsowany raz do tablicy NumPy (.npy, ładowanej przez mmap)
+# zapisanej pod skrótem SHA-1 zawartości. Parametry strojenia, które są tylko
+# w nazwach plików (w różnych formatach), trafiają do indeksu, po którym
+# można filtrować. KPI odpowiedzi skokowej liczone są wektorowo dla wszystkich
+# przebiegów naraz.
+
+CACHE_DIR = ".experiment_cache"
+INDEX_FILE = "index.json"
+
+COLUMN_NAMES = {
+    "Time (s)": "time",
+    "Timestamp": "time",
+    "Temperature (°C)": "temperature",
+    "Temperature": "temperature",
+    "Error": "error",
+    "PI Output": "output",
+    "PID Output": "output",
+    "P Component": "p",
+    "I Component": "i",
+    "D Component": "d",
+}
+
+
+def _number(text):
+    # W części nazw plików przecinek jest separatorem dziesiętnym (Kp4,63)
+    return float(text.replace(",", "."))
+
+
+def parse_filename(file_name):
+    """Wyciąga z nazwy pliku metadane eksperymentu.
+
+    Przykłady: pi_temperature_26-36_kp_0.8_ki_0.00133.csv,
+    Inz34-lampa80_Kp130Ki0,0005Kd50.csv, 100_mocy_mata_test_40%.csv,
+    pi_temperature_log22_12_T750L64.csv, temperature_100_percent_power_lamp_50W.csv
+    """
+    name = os.path.splitext(os.path.basename(file_name))[0]
+    lower = name.lower()
+    meta = {
+        "file": os.path.basename(file_name),
+        "heater": None,
+        "heater_setting": None,  # liczba po nazwie grzałki, np. lampa80, mata20
+        "start_temperature": None,
+        "setpoint": None,
+        "kp": None,
+        "ki": None,
+        "kd": None,
+        "ti": None,
+        "T": None,
+        "L": None,
+        "power": None,  # moc w % dla prób w pętli otwartej
+        "watts": None,
+    }
+
+    heater = re.search(r"(lampa|lamp|mata)(\d+)?", lower)
+    if heater:
+        meta["heater"] = "mata" if heater.group(1) == "mata" else "lampa"
+        if heater.group(2):
+            meta["heater_setting"] = int(heater.group(2))
+
+    setpoint_range = re.search(r"pi_temperature_(\d+|x)-(\d+)", lower)
+    if setpoint_range:
+        if setpoint_range.group(1) != "x":
+            meta["start_temperature"] = float(setpoint_range.group(1))
+        meta["setpoint"] = float(setpoint_range.group(2))
+    else:
+        setpoint = re.search(r"^inz(\d+)|^przebieg\d+(?:_\w+?)?-(\d+)", lower)
+        if setpoint:
+            meta["setpoint"] = float(setpoint.group(1) or setpoint.group(2))
+
+    for key in ("kp", "ki", "kd", "ti"):
+        gain = re.search(rf"{key}_?(\d+(?:[.,]\d+)?)", lower)
+        if gain:
+            meta[key] = _number(gain.group(1))
+    if meta["ti"] and meta["kp"] and meta["ki"] is None:
+        meta["ki"] = meta["kp"] / meta["ti"]
+
+    time_constants = re.search(r"T(\d+)L(\d+)", name)
+    if time_constants:
+        meta["T"] = float(time_constants.group(1))
+        meta["L"] = float(time_constants.group(2))
+        # Nastawy tak jak w controller_bank.pi_gains(T, L)
+        meta["kp"] = 0.9 * meta["T"] / meta["L"]
+        meta["ti"] = meta["L"] / 0.3
+        meta["ki"] = meta["kp"] / meta["ti"]
+
+    power = re.search(r"test_(\d+)%", lower) or re.search(r"(\d+)_(?:mocy|percent_power)", lower)
+    if power:
+        meta["power"] = float(power.group(1))
+    watts = re.search(r"_(\d+)w$", lower)
+    if watts:
+        meta["watts"] = float(watts.group(1))
+    return meta
+
+
+def parse_csv(file_path):
+    """Zwraca (nazwy kolumn, tablica float64). Brakujące pola to NaN."""
+    with open(file_path, encoding="utf-8") as file:
+        header = file.readline().strip().split(",")
+        columns = [COLUMN_NAMES.get(column, column) for column in header]
+        rows = []
+        skipped = 0
+        for line in file:
+            # Po zaniku zasilania w pliku zostają bajty NUL i urwane wiersze
+            values = line.replace("\x00", "").strip().split(",")
+            if values == [""]:
+                continue
+            try:
+                row = [float(value) if value else np.nan for value in values[:len(columns)]]
+            except ValueError:
+                skipped += 1
+                continue
+            row.extend([np.nan] * (len(columns) - len(row)))
+            rows.append(row)
+        if skipped:
+            print(f"Skipped {skipped} malformed rows in {os.path.basename(file_path)}")
+    data = np.array(rows, dtype=np.float64).reshape(len(rows), len(columns))
+    return columns, data
+
+
+def _file_hash(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Run:
+    """Jeden przebieg: metadane i kolumny jako widoki na tablicę z mmap."""
+
+    def __init__(self, meta, columns, data):
+        self.meta = meta
+        self.columns = columns
+        self.data = data
+
+    def __getitem__(self, column):
+        return self.data[:, self.columns.index(column)]
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def name(self):
+        return self.meta["file"]
+
+    @property
+    def closed_loop(self):
+        return "error" in self.columns
+
+
+class ExperimentArchive:
+    def __init__(self, directory=".", pattern="*.csv", cache_dir=None):
+        self.directory = directory
+        self.pattern = pattern
+        self.cache_dir = cache_dir or os.path.join(directory, CACHE_DIR)
+        self.index = {}
+        self._runs = {}
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def build(self):
+        """Parsuje nowe lub zmienione pliki, resztę bierze z cache. Zwraca self."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        old_index = {}
+        if os.path.exists(self._index_path()):
+            with open(self._index_path(), encoding="utf-8") as file:
+                old_index = json.load(file)
+
+        index = {}
+        for file_path in sorted(glob.glob(os.path.join(self.directory, self.pattern))):
+            file_name = os.path.basename(file_path)
+            stat = os.stat(file_path)
+            entry = old_index.get(file_name)
+            # Rozmiar i mtime bez zmian - nie trzeba liczyć skrótu od nowa
+            if not (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                    and os.path.exists(self._array_path(entry["hash"]))):
+                content_hash = _file_hash(file_path)
+                if not os.path.exists(self._array_path(content_hash)):
+                    try:
+                        columns, data = parse_log(file_path)
+                    except (OSError, ValueError) as e:
+                        print(f"Error parsing {file_name}: {e}")
+                        continue
+                    np.save(self._array_path(content_hash), data)
+                else:
+                    columns = [COLUMN_NAMES.get(c, c) for c in _read_header(file_path)]
+                    data = np.load(self._array_path(content_hash), mmap_mode="r")
+                entry = {
+                    "hash": content_hash,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "columns": columns,
+                    "rows": int(data.shape[0]),
+                }
+            # Metadane z nazwy są tanie, więc zawsze liczone od nowa
+            entry["meta"] = parse_filename(file_name)
+            index[file_name] = entry
+
+        with open(self._index_path(), "w", encoding="utf-8") as file:
+            json.dump(index, file, indent=1, ensure_ascii=False)
+        self.index = index
+        self._runs = {}
+        return self
+
+    def _array_path(self, content_hash):
+        return os.path.join(self.cache_dir, f"{content_hash}.npy")
+
+    def load(self, file_name):
+        run = self._runs.get(file_name)
+        if run is None:
+            entry = self.index[file_name]
+            data = np.load(self._array_path(entry["hash"]), mmap_mode="r")
+            run = Run(entry["meta"], entry["columns"], data)
+            self._runs[file_name] = run
+        return run
+
+    def query(self, closed_loop=None, min_rows=0, **filters):
+        """Zwraca przebiegi pasujące do filtrów.
+
+        Filtr to wartość (równość) albo funkcja, np.
+        query(heater="mata", power=lambda p: p is not None and p >= 40).
+        """
+        runs = []
+        for file_name, entry in self.index.items():
+            if entry["rows"] < min_rows:
+                continue
+            if closed_loop is not None and ("error" in entry["columns"]) != closed_loop:
+                continue
+            meta = entry["meta"]
+            matched = True
+            for key, expected in filters.items():
+                value = meta.get(key)
+                if callable(expected):
+                    matched = expected(value)
+                else:
+                    matched = value == expected
+                if not matched:
+                    break
+            if matched:
+                runs.append(self.load(file_name))
+        return runs
+
+
+def parse_log(file_path):
+    """parse_csv albo odczyt logu binarnego (binlog.py), z tymi samymi nazwami kolumn."""
+    if file_path.endswith(binlog.EXTENSION):
+        with binlog.BinaryLog(file_path) as log:
+            header, data = log.to_array()
+        return [COLUMN_NAMES.get(column, column) for column in header], data
+    return parse_csv(file_path)
+
+
+def _read_header(file_path):
+    if file_path.endswith(binlog.EXTENSION):
+        with binlog.BinaryLog(file_path) as log:
+            return log.header
+    with open(file_path, encoding="utf-8") as file:
+        return file.readline().strip().split(",")
+
+
+def _pad(runs, column):
+    length = max(len(run) for run in runs)
+    matrix = np.full((len(runs), length), np.nan)
+    for row, run in enumerate(runs):
+        matrix[row, :len(run)] = run[column]
+    return matrix
+
+
+def _first_time(condition, time):
+    # Czas pierwszej próbki spełniającej warunek (NaN, gdy nigdy)
+    hit = condition.any(axis=1)
+    index = condition.argmax(axis=1)
+    return np.where(hit, time[np.arange(len(time)), index], np.nan)
+
+
+def step_response_kpis(runs, band=0.5):
+    """KPI odpowiedzi skokowej dla wszystkich przebiegów w jednym przejściu.
+
+    Wartość zadana to temperatura + uchyb (pętla zamknięta) albo średnia z
+    ostatnich 5% próbek (pętla otwarta). band to pasmo ustalenia w °C.
+    Zwraca słownik tablic: rise_time, overshoot (%), settling_time, iae, ise.
+    """
+    runs = [run for run in runs if len(run) >= 2]
+    time = _pad(runs, "time")
+    temperature = _pad(runs, "temperature")
+    lengths = np.array([len(run) for run in runs])
+    time = time - time[:, :1]
+
+    setpoint = np.empty(len(runs))
+    for row, run in enumerate(runs):
+        if run.closed_loop:
+            setpoint[row] = np.nanmedian(run["temperature"] + run["error"])
+        else:
+            tail = max(1, len(run) // 20)
+            setpoint[row] = np.mean(run["temperature"][-tail:])
+
+    initial = temperature[:, :1]
+    step = setpoint[:, None] - initial
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normalized = (temperature - initial) / step
+    valid = ~np.isnan(temperature)
+
+    rise_time = _first_time(valid & (normalized >= 0.9), time) - _first_time(valid & (normalized >= 0.1), time)
+    with np.errstate(invalid="ignore"):
+        overshoot = np.clip(np.nanmax(normalized, axis=1) - 1.0, 0.0, None) * 100.0
+
+    error = setpoint[:, None] - temperature
+    outside = valid & (np.abs(error) > band)
+    # Ostatnia próbka poza pasmem; przebieg ustalony, jeśli nie jest to ostatnia próbka
+    last_outside = np.where(outside.any(axis=1), time.shape[1] - 1 - outside[:, ::-1].argmax(axis=1), -1)
+    settled = last_outside < lengths - 1
+    settle_index = np.minimum(last_outside + 1, lengths - 1)
+    settling_time = np.where(settled, time[np.arange(len(runs)), settle_index], np.nan)
+
+    dt = np.diff(time, axis=1)
+    iae = np.nansum(np.abs(error[:, 1:]) * dt, axis=1)
+    ise = np.nansum(error[:, 1:] ** 2 * dt, axis=1)
+
+    return {
+        "run": [run.name for run in runs],
+        "setpoint": setpoint,
+        "rise_time": rise_time,
+        "overshoot": overshoot,
+        "settling_time": settling_time,
+        "iae": iae,
+        "ise": ise,
+    }
+
+
+if __name__ == "__main__":
+    import time as timer
+
+    start = timer.perf_counter()
+    archive = ExperimentArchive(os.path.dirname(os.path.abspath(__file__))).build()
+    print(f"Index of {len(archive.index)} files built in {timer.perf_counter() - start:.3f}s")
+
+    start = timer.perf_counter()
+    runs = archive.query(closed_loop=True, min_rows=50)
+    kpis = step_response_kpis(runs)
+    print(f"KPIs for {len(runs)} closed-loop runs in {timer.perf_counter() - start:.3f}s")
+    print(f"{'run':45s} {'sp':>5s} {'rise':>7s} {'over%':>6s} {'settle':>7s} {'IAE':>9s}")
+    for i, name in enumerate(kpis["run"]):
+        print(f"{name:45s} {kpis['setpoint'][i]:5.1f} {kpis['rise_time'][i]:7.0f} {kpis['overshoot'][i]:6.1f} "
+              f"{kpis['settling_time'][i]:7.0f} {kpis['iae'][i]:9.0f}")
@@ -0,0 +1,171 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from experiment_archive import ExperimentArchive
+
+# Identyfikacja modelu inercyjnego z opóźnieniem (FOPDT) z prób skokowych
+# w pętli otwartej (temperature_100_percent_power*.csv, 100_mocy_*.csv):
+#
+#     y(t) = y0 + K * u * (1 - exp(-(t - L) / T))   dla t > L
+#
+# Dla ustalonych T i L model jest liniowy względem y0 i K, więc dla całej
+# siatki (T, L) naraz liczone jest rozwiązanie najmniejszych kwadratów,
+# a potem siatka jest zagęszczana wokół minimum. Pliki liczone są równolegle
+# w puli procesów. Wynik to T i L gotowe do ControllerBank.add_pi(T, L).
+
+RESAMPLE_POINTS = 400
+MIN_DURATION = 300.0  # Krótsze próby nie niosą informacji o stałej czasowej
+
+
+def _resample(time, temperature, points=RESAMPLE_POINTS):
+    valid = ~(np.isnan(time) | np.isnan(temperature))
+    time = time[valid] - time[valid][0]
+    temperature = temperature[valid]
+    grid = np.linspace(0.0, time[-1], min(points, len(time)))
+    return grid, np.interp(grid, time, temperature)
+
+
+def _grid_fit(time, temperature, T_values, L_values):
+    # phi[T, L, t] - odpowiedź jednostkowa dla każdej pary (T, L)
+    delay = np.clip(time[None, None, :] - L_values[None, :, None], 0.0, None)
+    phi = 1.0 - np.exp(-delay / T_values[:, None, None])
+    n = len(time)
+    sum_phi = phi.sum(axis=2)
+    sum_phi2 = (phi * phi).sum(axis=2)
+    sum_y = temperature.sum()
+    sum_phi_y = (phi * temperature).sum(axis=2)
+    determinant = n * sum_phi2 - sum_phi ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gain = (n * sum_phi_y - sum_phi * sum_y) / determinant
+        offset = (sum_y - gain * sum_phi) / n
+    residual = temperature - offset[..., None] - gain[..., None] * phi
+    sse = np.where(determinant > 1e-12, (residual ** 2).sum(axis=2), np.inf)
+    i, j = np.unravel_index(np.argmin(sse), sse.shape)
+    return T_values[i], L_values[j], offset[i, j], gain[i, j], sse[i, j]
+
+
+def fit_fopdt(time, temperature, power=100.0):
+    """Dopasowuje model FOPDT do jednej próby skokowej.
+
+    Zwraca słownik z K (°C na 100% mocy), T, L (s), y0, rmse, r2,
+    odchyleniami standardowymi parametrów i oceną pewności dopasowania.
+    """
+    time, temperature = _resample(np.asarray(time, dtype=float), np.asarray(temperature, dtype=float))
+    duration = time[-1]
+    T_values = np.geomspace(10.0, 20.0 * duration, 80)
+    L_values = np.linspace(0.0, 0.5 * duration, 60)
+    for _ in range(3):
+        T, L, y0, step_gain, sse = _grid_fit(time, temperature, T_values, L_values)
+        # Zagęszczenie siatki wokół minimum
+        T_values = np.geomspace(max(T / 1.5, 1.0), T * 1.5, 40)
+        L_values = np.linspace(max(L - 0.05 * duration, 0.0), L + 0.05 * duration, 40)
+
+    n = len(time)
+    residual_variance = sse / max(n - 4, 1)
+    total = ((temperature - temperature.mean()) ** 2).sum()
+    r2 = 1.0 - sse / total if total > 0 else 0.0
+
+    # Niepewność parametrów z linearyzacji modelu w minimum (Gauss-Newton)
+    delay = np.clip(time - L, 0.0, None)
+    decay = np.exp(-delay / T)
+    active = time > L
+    jacobian = np.column_stack([
+        np.ones(n),
+        1.0 - decay,
+        -step_gain * decay * delay / T ** 2,
+        np.where(active, -step_gain * decay / T, 0.0),
+    ])
+    try:
+        covariance = residual_variance * np.linalg.inv(jacobian.T @ jacobian)
+        errors = np.sqrt(np.clip(np.diag(covariance), 0.0, None))
+    except np.linalg.LinAlgError:
+        errors = np.full(4, np.inf)
+
+    u = power / 100.0
+    T_error = errors[2]
+    if r2 > 0.98 and T_error < 0.1 * T and T < 3 * duration:
+        confidence = "high"
+    elif r2 > 0.9 and T_error < 0.3 * T:
+        confidence = "medium"
+    else:
+        confidence = "low"
+    return {
+        "K": step_gain / u,
+        "T": T,
+        "L": L,
+        "y0": y0,
+        "K_std": errors[1] / u,
+        "T_std": T_error,
+        "L_std": errors[3],
+        "rmse": math.sqrt(sse / n),
+        "r2": r2,
+        "duration": duration,
+        "confidence": confidence,
+    }
+
+
+def _fit_job(job):
+    name, heater, power, time, temperature = job
+    try:
+        result = fit_fopdt(time, temperature, power)
+    except Exception as e:
+        return {"run": name, "heater": heater, "power": power, "error": str(e)}
+    result.update(run=name, heater=heater, power=power)
+    return result
+
+
+def identify_all(archive, workers=None):
+    """Dopasowuje FOPDT do wszystkich prób w pętli otwartej z archiwum, równolegle."""
+    jobs = []
+    for run in archive.query(closed_loop=False, power=lambda p: p is not None):
+        time = np.array(run["time"])
+        if len(run) < 20 or time[-1] - time[0] < MIN_DURATION:
+            continue
+        jobs.append((run.name, run.meta["heater"] or "unknown", run.meta["power"], time, np.array(run["temperature"])))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_fit_job, jobs))
+
+
+def summarize_by_heater(results, min_confidence="medium"):
+    """Średnie T i L na typ grzałki ważone odwrotnością wariancji dopasowania."""
+    accepted = ("high",) if min_confidence == "high" else ("high", "medium")
+    summary = {}
+    for heater in sorted({result["heater"] for result in results}):
+        fits = [r for r in results if r["heater"] == heater and r.get("confidence") in accepted]
+        if not fits:
+            continue
+        entry = {"runs": len(fits)}
+        for key in ("K", "T", "L"):
+            values = np.array([fit[key] for fit in fits])
+            if key == "L":
+                # Opóźnienie nieodróżnialne od zera (np. mata) zastępujemy jego
+                # niepewnością, bo pi_gains(T, L) dzieli przez L
+                values = np.maximum(values, [fit["L_std"] for fit in fits])
+            weights = 1.0 / np.maximum(np.array([fit[f"{key}_std"] for fit in fits]), 1e-6) ** 2
+            entry[key] = float((values * weights).sum() / weights.sum())
+            entry[f"{key}_std"] = float(math.sqrt(1.0 / weights.sum()))
+        summary[heater] = entry
+    return summary
+
+
+if __name__ == "__main__":
+    import time as timer
+
+    archive = ExperimentArchive(os.path.dirname(os.path.abspath(__file__))).build()
+    start = timer.perf_counter()
+    results = identify_all(archive)
+    print(f"Fitted {len(results)} step logs in {timer.perf_counter() - start:.2f}s")
+    print(f"{'run':42s} {'heater':7s} {'pow':>4s} {'K':>6s} {'T':>7s} {'L':>6s} {'R2':>6s} confidence")
+    for r in results:
+        if "error" in r:
+            print(f"{r['run']:42s} error: {r['error']}")
+            continue
+        print(f"{r['run']:42s} {r['heater']:7s} {r['power']:4.0f} {r['K']:6.1f} {r['T']:7.0f} {r['L']:6.0f} "
+              f"{r['r2']:6.3f} {r['confidence']} (T ±{r['T_std']:.0f}, L ±{r['L_std']:.0f})")
+    print()
+    for heater, entry in summarize_by_heater(results).items():
+        print(f"{heater}: add_pi(T={entry['T']:.0f}, L={entry['L']:.0f})  "
+              f"K={entry['K']:.1f} °C/100%, from {entry['runs']} runs")
@@ -0,0 +1,147 @@
+import itertools
+
+import numpy as np
+
+from controller_bank import ControllerBank
+
+# Symulator pętli zamkniętej do przeszukiwania nastaw bez fizycznych przebiegów.
+# Obiekt to model FOPDT (fopdt_ident.py) z nasyceniem grzałki 0-100%,
+# opóźnieniem transportowym i odwróconym PWM (ChangeDutyCycle(100 - pi_output)).
+# Tysiące kombinacji nastaw symulowane są naraz jako wektory NumPy, a wynik to
+# ranking i front Pareto (czas ustalania, przeregulowanie, energia).
+
+DS18B20_STEP = 0.0625
+
+
+class ThermalPlant:
+    """Model FOPDT terrarium: K °C na 100% mocy, T i L w sekundach."""
+
+    def __init__(self, K, T, L, ambient=24.0, heater_watts=None, quantization=DS18B20_STEP):
+        self.K = K
+        self.T = T
+        self.L = L
+        self.ambient = ambient
+        self.heater_watts = heater_watts
+        self.quantization = quantization
+
+
+def gain_grid(kp_values, ki_values, kd_values=(0.0,)):
+    """Wszystkie kombinacje nastaw jako trzy tablice o równej długości."""
+    combinations = np.array(list(itertools.product(kp_values, ki_values, kd_values)), dtype=float)
+    return combinations[:, 0], combinations[:, 1], combinations[:, 2]
+
+
+def simulate(plant, kp, ki, kd=None, setpoint=34.0, duration=3600.0, dt=1.82, start_temperature=None):
+    """Symuluje wszystkie nastawy naraz.
+
+    Regulator to ControllerBank z controller_bank.py, ten sam co w pid.py
+    i 3_temps.py (anti-windup, pochodna z pomiaru, wyjście 0-100). Dla
+    nastaw z tabeli użyj controller_bank.pi_gains(T, L).
+    Zwraca słownik z trajektoriami temperature i power o kształcie (kroki, N).
+    """
+    kp = np.asarray(kp, dtype=float)
+    ki = np.asarray(ki, dtype=float)
+    kd = np.zeros_like(kp) if kd is None else np.asarray(kd, dtype=float)
+    count = kp.shape[0]
+    steps = int(duration / dt)
+    delay_steps = max(int(round(plant.L / dt)), 0)
+
+    temperature = np.full(count, plant.ambient if start_temperature is None else start_temperature)
+    start = temperature.copy()
+    controllers = ControllerBank(capacity=count)
+    for index in range(count):
+        controllers.add(kp[index], ki[index], kd[index], setpoint)
+    # Bufor kołowy mocy, która dotrze do obiektu po czasie L
+    pending_power = np.zeros((delay_steps + 1, count))
+    decay = np.exp(-dt / plant.T)
+
+    temperatures = np.empty((steps, count))
+    powers = np.empty((steps, count))
+    for step in range(steps):
+        measured = temperature
+        if plant.quantization:
+            measured = np.floor(temperature / plant.quantization) * plant.quantization
+        # Moc grzałki to wyjście regulatora (odwrócenie PWM dotyczy tylko stanu pinu)
+        power = controllers.compute(measured, dt)[0]
+
+        slot = step % (delay_steps + 1)
+        pending_power[slot] = power
+        delayed = pending_power[(step + 1) % (delay_steps + 1)] if delay_steps else power
+        target = plant.ambient + plant.K * delayed / 100.0
+        temperature = target + (temperature - target) * decay
+
+        temperatures[step] = temperature
+        powers[step] = power
+    return {"time": np.arange(1, steps + 1) * dt, "temperature": temperatures, "power": powers, "dt": dt,
+            "start": start}
+
+
+def evaluate(result, setpoint, band=0.5, plant=None):
+    """KPI dla każdej symulacji: settling_time, overshoot, energy, iae."""
+    time = result["time"]
+    temperature = result["temperature"]
+    start = result.get("start", temperature[0])
+    step = setpoint - start
+    # Przeregulowanie w kierunku skoku: ponad setpoint przy grzaniu, poniżej przy chłodzeniu
+    beyond = np.where(step >= 0, temperature.max(axis=0) - setpoint, setpoint - temperature.min(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        overshoot = np.where(step != 0, np.clip(beyond / np.abs(step), 0.0, None) * 100.0, 0.0)
+
+    outside = np.abs(temperature - setpoint) > band
+    steps = temperature.shape[0]
+    last_outside = np.where(outside.any(axis=0), steps - 1 - outside[::-1].argmax(axis=0), -1)
+    settled = last_outside < steps - 1
+    settling_time = np.where(settled, time[np.minimum(last_outside + 1, steps - 1)], np.inf)
+
+    # Energia w %·s albo w Wh, gdy znana moc grzałki
+    energy = result["power"].sum(axis=0) * result["dt"]
+    if plant is not None and plant.heater_watts:
+        energy = energy / 100.0 * plant.heater_watts / 3600.0
+    iae = np.abs(setpoint - temperature).sum(axis=0) * result["dt"]
+    return {"settling_time": settling_time, "overshoot": overshoot, "energy": energy, "iae": iae}
+
+
+def pareto_front(*objectives):
+    """Indeksy rozwiązań niezdominowanych (wszystkie cele minimalizowane)."""
+    points = np.column_stack(objectives)
+    order = np.lexsort(points.T[::-1])
+    front = []
+    for index in order:
+        candidate = points[index]
+        if not any(np.all(points[other] <= candidate) and np.any(points[other] < candidate) for other in front):
+            front.append(index)
+    return np.array(front, dtype=int)
+
+
+def search(plant, kp, ki, kd=None, setpoint=34.0, duration=3600.0, dt=1.82, band=0.5, start_temperature=None):
+    """Symulacja + KPI + front Pareto; zwraca listę słowników posortowaną po czasie ustalania."""
+    kd = np.zeros_like(np.asarray(kp, dtype=float)) if kd is None else kd
+    result = simulate(plant, kp, ki, kd, setpoint, duration, dt, start_temperature)
+    kpis = evaluate(result, setpoint, band, plant)
+    front = pareto_front(kpis["settling_time"], kpis["overshoot"], kpis["energy"])
+    table = [{
+        "kp": float(kp[i]),
+        "ki": float(ki[i]),
+        "kd": float(kd[i]),
+        "settling_time": float(kpis["settling_time"][i]),
+        "overshoot": float(kpis["overshoot"][i]),
+        "energy": float(kpis["energy"][i]),
+        "iae": float(kpis["iae"][i]),
+    } for i in front]
+    return sorted(table, key=lambda row: (row["settling_time"], row["overshoot"]))
+
+
+if __name__ == "__main__":
+    import time
+
+    # Model lampy z fopdt_ident.py (100_mocy_lampa*.csv)
+    plant = ThermalPlant(K=17.5, T=366.0, L=70.0, ambient=24.0)
+    kp, ki, kd = gain_grid(np.geomspace(0.5, 100, 30), np.geomspace(1e-4, 0.1, 30), (0.0, 5.0, 50.0))
+    start = time.perf_counter()
+    table = search(plant, kp, ki, kd, setpoint=34.0, duration=3600.0)
+    elapsed = time.perf_counter() - start
+    print(f"Simulated {len(kp)} gain sets x 1 h in {elapsed:.2f}s, Pareto front: {len(table)}")
+    print(f"{'Kp':>8s} {'Ki':>9s} {'Kd':>6s} {'settle s':>9s} {'over %':>7s} {'energy %s':>10s}")
+    for row in table[:15]:
+        print(f"{row['kp']:8.2f} {row['ki']:9.5f} {row['kd']:6.1f} {row['settling_time']:9.0f} "
+              f"{row['overshoot']:7.1f} {row['energy']:10.0f}")
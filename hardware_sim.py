@@ -0,0 +1,296 @@
+import bisect
+import collections
+import csv
+import math
+import os
+import runpy
+import sys
+import tempfile
+import time
+import types
+
+# Uruchamianie skryptów sterujących bez Raspberry Pi.
+# Zamiast RPi.GPIO, w1thermsensor, board i adafruit_dht podstawiane są
+# podróbki, które czytają temperaturę z backendu: odtwarzanie zapisanego
+# CSV (ReplayBackend) albo symulowany obiekt reagujący na wypełnienie PWM
+# (PlantBackend). Wirtualny zegar sprawia, że time.sleep() nie czeka
+# naprawdę, więc godzinny przebieg trwa ułamek sekundy.
+
+
+class VirtualClock:
+    """Zegar, który przesuwa się tylko przez sleep() i czas konwersji czujników.
+
+    Po osiągnięciu stop_at sleep() zgłasza KeyboardInterrupt, tak jak Ctrl+C,
+    więc skrypty sprzątają GPIO w swoich blokach finally.
+    """
+
+    def __init__(self, start=0.0, stop_at=None):
+        self.now = start
+        self.start = start
+        self.stop_at = stop_at
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def advance(self, seconds):
+        self.now += max(seconds, 0.0)
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+        if self.stop_at is not None and self.now - self.start >= self.stop_at:
+            raise KeyboardInterrupt
+
+
+class ReplayBackend:
+    """Temperatura z zapisanego przebiegu (kolumny Time (s), Temperature (°C))."""
+
+    def __init__(self, csv_path, clock):
+        self.clock = clock
+        self.times = []
+        self.temperatures = []
+        with open(csv_path, encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader)
+            for row in reader:
+                try:
+                    self.times.append(float(row[0]))
+                    self.temperatures.append(float(row[1]))
+                except (ValueError, IndexError):
+                    continue
+        self.duty = {}
+
+    def set_duty(self, pin, duty):
+        self.duty[pin] = duty
+
+    def temperature(self):
+        elapsed = self.clock.time() - self.clock.start
+        index = max(bisect.bisect_right(self.times, elapsed) - 1, 0)
+        return self.temperatures[index]
+
+
+class PlantBackend:
+    """Obiekt FOPDT (jak w gain_search.py) sterowany przez wypełnienie PWM.
+
+    Odwrócona logika: wypełnienie 0% to pełna moc grzałki.
+    """
+
+    def __init__(self, clock, K=17.5, T=366.0, L=70.0, ambient=24.0, heater_pin=None):
+        self.clock = clock
+        self.K = K
+        self.T = T
+        self.L = L
+        self.ambient = ambient
+        self.heater_pin = heater_pin
+        self.state = ambient
+        self.last_update = clock.time()
+        self.duty = {}
+        # Historia (czas, moc) na potrzeby opóźnienia transportowego
+        self.history = collections.deque([(clock.time(), 0.0)])
+
+    def _power(self):
+        if not self.duty:
+            return 0.0
+        duty = self.duty.get(self.heater_pin, next(iter(self.duty.values())))
+        return 100.0 - duty
+
+    def set_duty(self, pin, duty):
+        self._advance()
+        self.duty[pin] = duty
+        self.history.append((self.clock.time(), self._power()))
+
+    def _delayed_power(self, moment):
+        while len(self.history) > 1 and self.history[1][0] <= moment - self.L:
+            self.history.popleft()
+        return self.history[0][1]
+
+    def _advance(self):
+        now = self.clock.time()
+        while self.last_update < now:
+            step = min(1.0, now - self.last_update)
+            target = self.ambient + self.K * self._delayed_power(self.last_update) / 100.0
+            self.state = target + (self.state - target) * math.exp(-step / self.T)
+            self.last_update += step
+
+    def temperature(self):
+        self._advance()
+        return self.state
+
+
+class FakePWM:
+    def __init__(self, backend, pin, frequency):
+        self.backend = backend
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = None
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+        self.backend.set_duty(self.pin, duty)
+
+    def stop(self):
+        self.duty = None
+
+
+def make_gpio_module(backend):
+    gpio = types.ModuleType("RPi.GPIO")
+    gpio.BCM = 11
+    gpio.BOARD = 10
+    gpio.OUT = 0
+    gpio.IN = 1
+    gpio.HIGH = 1
+    gpio.LOW = 0
+    gpio.outputs = {}
+    gpio.setmode = lambda mode: None
+    gpio.setwarnings = lambda flag: None
+    gpio.setup = lambda pin, mode, **kwargs: gpio.outputs.setdefault(pin, gpio.LOW)
+    gpio.output = lambda pin, value: gpio.outputs.__setitem__(pin, value)
+    gpio.input = lambda pin: gpio.outputs.get(pin, gpio.LOW)
+    gpio.cleanup = lambda *pins: None
+    gpio.PWM = lambda pin, frequency: FakePWM(backend, pin, frequency)
+    return gpio
+
+
+def make_w1thermsensor_module(backend, clock, conversion_time=0.75, resolution=0.0625):
+    module = types.ModuleType("w1thermsensor")
+
+    class W1ThermSensor:
+        def __init__(self, sensor_type=None, sensor_id=None, **kwargs):
+            self.type = sensor_type
+            self.id = sensor_id or "3ce1d4433914"
+            self.resolution_bits = 12
+
+        @classmethod
+        def get_available_sensors(cls, types=None):
+            return [cls()]
+
+        def get_resolution(self):
+            return self.resolution_bits
+
+        def set_resolution(self, bits, persist=False):
+            if not 9 <= bits <= 12:
+                raise ValueError(f"The given sensor resolution '{bits}' is out of range (9-12)")
+            self.resolution_bits = bits
+            return True
+
+        def get_temperature(self, unit=None):
+            # Odczyt DS18B20 blokuje na czas konwersji; każdy bit mniej to
+            # dwa razy krótsza konwersja i dwa razy większy krok
+            scale = 2 ** (12 - self.resolution_bits)
+            clock.advance(conversion_time / scale)
+            step = resolution * scale
+            return math.floor(backend.temperature() / step) * step
+
+    class AsyncW1ThermSensor(W1ThermSensor):
+        async def get_temperature(self, unit=None):
+            return W1ThermSensor.get_temperature(self, unit)
+
+    module.W1ThermSensor = W1ThermSensor
+    module.AsyncW1ThermSensor = AsyncW1ThermSensor
+    return module
+
+
+def make_dht_modules(backend):
+    board = types.ModuleType("board")
+    for pin in range(28):
+        setattr(board, f"D{pin}", pin)
+
+    adafruit_dht = types.ModuleType("adafruit_dht")
+
+    class _DHT:
+        resolution = 0.1
+
+        def __init__(self, pin, use_pulseio=True):
+            self.pin = pin
+
+        @property
+        def temperature(self):
+            return round(backend.temperature() / self.resolution) * self.resolution
+
+        @property
+        def humidity(self):
+            return 60.0
+
+        def exit(self):
+            pass
+
+    class DHT22(_DHT):
+        pass
+
+    class DHT11(_DHT):
+        resolution = 1.0
+
+    adafruit_dht.DHT22 = DHT22
+    adafruit_dht.DHT11 = DHT11
+    return board, adafruit_dht
+
+
+def fake_modules(backend, clock):
+    """Słownik modułów do podstawienia w sys.modules."""
+    gpio = make_gpio_module(backend)
+    rpi = types.ModuleType("RPi")
+    rpi.GPIO = gpio
+    board, adafruit_dht = make_dht_modules(backend)
+    return {
+        "RPi": rpi,
+        "RPi.GPIO": gpio,
+        "w1thermsensor": make_w1thermsensor_module(backend, clock),
+        "board": board,
+        "adafruit_dht": adafruit_dht,
+    }
+
+
+def run_script(script, backend_factory, duration=3600.0, workdir=None):
+    """Uruchamia skrypt (np. pid.py) na podróbkach sprzętu i wirtualnym zegarze.
+
+    backend_factory(clock) tworzy backend (ReplayBackend, PlantBackend).
+    Pliki CSV skryptu trafiają do workdir (domyślnie katalog tymczasowy),
+    żeby nie nadpisać logów z repozytorium. Zwraca (backend, workdir).
+    """
+    script = os.path.abspath(script)
+    clock = VirtualClock(stop_at=duration)
+    backend = backend_factory(clock)
+    workdir = workdir or tempfile.mkdtemp(prefix="terrarium_sim_")
+
+    saved_modules = {name: sys.modules.get(name) for name in fake_modules(backend, clock)}
+    saved_time = (time.time, time.sleep, time.monotonic)
+    saved_cwd = os.getcwd()
+    saved_path = list(sys.path)
+    sys.modules.update(fake_modules(backend, clock))
+    time.time, time.sleep, time.monotonic = clock.time, clock.sleep, clock.monotonic
+    sys.path.insert(0, os.path.dirname(script))
+    os.chdir(workdir)
+    try:
+        with open(os.devnull, "w") as devnull:
+            stdout = sys.stdout
+            sys.stdout = devnull
+            try:
+                runpy.run_path(script, run_name="__main__")
+            finally:
+                sys.stdout = stdout
+    finally:
+        os.chdir(saved_cwd)
+        sys.path[:] = saved_path
+        time.time, time.sleep, time.monotonic = saved_time
+        for name, module in saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+    return backend, workdir
+
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    for script in ("better_pid.py", "pid.py", "just_heat.py"):
+        start = time.perf_counter()
+        backend, workdir = run_script(os.path.join(here, script), lambda clock: PlantBackend(clock), duration=3600.0)
+        elapsed = time.perf_counter() - start
+        logs = [name for name in os.listdir(workdir) if name.endswith(".csv")]
+        with open(os.path.join(workdir, logs[0]), encoding="utf-8") as file:
+            rows = sum(1 for _ in file) - 1
+        print(f"{script}: 1 h simulated in {elapsed:.2f}s, {rows} rows, final temperature {backend.state:.2f}°C")
@@ -1,5 +1,5 @@
 import time
-import csv
+from csv_logger import CsvLogger
 import RPi.GPIO as GPIO
 from w1thermsensor import W1ThermSensor
 
@@ -21,11 +21,9 @@ sensor = W1ThermSensor()
 # Ścieżka do pliku CSV
 csv_file = "100_mocy_lampa.csv"
 
-# Inicjalizacja pliku CSV
-with open(csv_file, mode='w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(["Time (s)", "Temperature (°C)"])
-    print(f"Plik {csv_file} został utworzony.")
+# Inicjalizacja pliku CSV (plik zostaje otwarty, zapis buforowany)
+csv_log = CsvLogger(csv_file, ["Time (s)", "Temperature (°C)"])
+print(f"Plik {csv_file} został utworzony.")
 
 # Rozpoczęcie eksperymentu
 start_time = time.time()
@@ -43,9 +41,7 @@ try:
 
         # Zapis do pliku CSV
         if temperature is not None:
-            with open(csv_file, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow([elapsed_time, temperature])
+            csv_log.write_row([elapsed_time, temperature])
             print(f"Czas: {elapsed_time:.2f}s, Temperatura: {temperature:.2f}°C")
 
         # Czekamy 1 sekundę przed kolejnym odczytem
@@ -56,6 +52,7 @@ except KeyboardInterrupt:
 
 finally:
     # Czyszczenie GPIO
+    csv_log.close()
     pwm.stop()
     GPIO.cleanup()
     print("GPIO cleaned up.")
@@ -0,0 +1,241 @@
+import bisect
+import collections
+import sys
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Pomiary czasu etapów pętli (odczyt czujnika, regulator, PWM, HTTP, CSV)
+# zbierane w histogramy opóźnień i liczniki, udostępniane lokalnie na
+# http://127.0.0.1:9100/metrics w formacie tekstowym Prometheusa.
+# Zapis do histogramu to bisect + inkrementacja, bez blokad: przy
+# jednoczesnych zapisach z kilku wątków pojedyncze zliczenia mogą przepaść,
+# co dla statystyk opóźnień nie ma znaczenia.
+#
+# /profile?seconds=10 (gdy serwer uruchomiono z profiler=True) zbiera próbki
+# stosów wszystkich wątków i zwraca je w formacie "collapsed" (flamegraph.pl,
+# speedscope).
+
+# Granice kubełków w sekundach: od 100 µs (PWM, CSV) do 10 s (HTTP, DHT)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+METRICS_PORT = 9100
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = array("Q", [0] * (len(self.buckets) + 1))  # Ostatni: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def percentile(self, fraction):
+        """Górna granica kubełka, w którym leży dany percentyl."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            if total >= target:
+                return bound
+        return float("inf")
+
+    def render(self, name, labels):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {total}")
+        lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {self.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self, name, labels):
+        return [f"{name}{_format_labels(labels)} {self.value}"]
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class MetricsRegistry:
+    """Metryki nazwane jak w Prometheusie; etykiety podawane jako argumenty nazwane.
+
+    Obiekty metryk warto pobrać raz (np. w __init__) i na gorącej ścieżce
+    wołać tylko observe()/inc().
+    """
+
+    def __init__(self):
+        self._metrics = collections.OrderedDict()  # (nazwa, etykiety) -> metryka
+        self._help = {}
+        self._types = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, kind, factory, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = factory()
+                    self._types.setdefault(name, kind)
+                    if help:
+                        self._help.setdefault(name, help)
+        return metric
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS, **labels):
+        return self._get("histogram", lambda: LatencyHistogram(buckets), name, help, labels)
+
+    def counter(self, name, help="", **labels):
+        return self._get("counter", Counter, name, help, labels)
+
+    def timer(self, name, help="", **labels):
+        """Context manager mierzący czas bloku: with registry.timer("csv_flush_seconds"): ..."""
+        return self.histogram(name, help, **labels).time()
+
+    def add_collector(self, func):
+        """func() zwraca listę (nazwa, {etykiety}, wartość); renderowane jako gauge."""
+        self._collectors.append(func)
+
+    def render(self):
+        # Format Prometheusa wymaga, żeby próbki jednej metryki były razem
+        grouped = collections.OrderedDict()
+        for (name, labels), metric in list(self._metrics.items()):
+            grouped.setdefault(name, []).append((labels, metric))
+        lines = []
+        seen = set(grouped)
+        for name, series in grouped.items():
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._types[name]}")
+            for labels, metric in series:
+                lines.extend(metric.render(name, labels))
+        gauges = collections.OrderedDict()
+        for func in self._collectors:
+            try:
+                values = func()
+            except Exception as e:
+                print(f"Error in metrics collector: {e}")
+                continue
+            for name, labels, value in values:
+                if value is not None and name not in seen:
+                    labels = _format_labels(tuple(sorted(labels.items())))
+                    gauges.setdefault(name, []).append(f"{name}{labels} {value}")
+        for name, samples in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def sample_stacks(seconds=10.0, interval=0.005, skip_thread=None):
+    """Próbkujący profiler: {"wątek;funkcja;...;funkcja": liczba próbek}."""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = collections.Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_thread:
+                continue
+            calls = []
+            while frame is not None:
+                code = frame.f_code
+                calls.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            stacks[";".join([names.get(ident, str(ident))] + calls[::-1])] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def serve(registry=REGISTRY, port=METRICS_PORT, host="127.0.0.1", profiler=False):
+    """Uruchamia serwer metryk w wątku w tle i zwraca go (server.shutdown() zatrzymuje)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                body = registry.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif url.path == "/profile" and profiler:
+                try:
+                    seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+                except ValueError:
+                    self.send_error(400, "seconds must be a number")
+                    return
+                if not seconds > 0:
+                    self.send_error(400, "seconds must be positive")
+                    return
+                stacks = sample_stacks(min(seconds, 60.0), skip_thread=threading.get_ident())
+                body = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()).encode("utf-8")
+                content_type = "text/plain; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    histogram = LatencyHistogram()
+    count = 200000
+    start = time.perf_counter()
+    for i in range(count):
+        histogram.observe(i * 1e-7)
+    observe_cost = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(count):
+        with histogram.time():
+            pass
+    timer_cost = (time.perf_counter() - start) / count
+    print(f"observe(): {observe_cost * 1e9:.0f} ns, with time(): {timer_cost * 1e9:.0f} ns")
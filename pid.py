@@ -1,45 +1,20 @@
 import time
 import RPi.GPIO as GPIO
 from w1thermsensor import W1ThermSensor
-import csv
+from csv_logger import CsvLogger
+from scheduler import RateScheduler
+from controller_bank import ControllerBank
 from datetime import datetime
 
-class PIDController:
-    def __init__(self, Kp, Ki, Kd):
-        self.Kp = Kp
-        self.Ki = Ki
-        self.Kd = Kd
-        self.previous_error = 0
-        self.integral = 0
-
-    def compute(self, setpoint, current_temperature, dt):
-        error = setpoint - current_temperature
-        self.integral += error * dt
-        derivative = (error - self.previous_error) / dt
-
-        # Obliczenie poszczególnych części regulatora
-        P = self.Kp * error
-        I = self.Ki * self.integral
-        D = self.Kd * derivative
-
-        output = P + I + D
-        self.previous_error = error
-
-        # Zwraca wynik ograniczony od 0 do 100 oraz poszczególne składowe
-        return max(0, min(100, output)), error, P, I, D
-
-# Funkcja inicjalizująca plik CSV
+# Funkcja inicjalizująca plik CSV (plik zostaje otwarty, zapis buforowany)
 def initialize_csv(file_path):
-    with open(file_path, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Time (s)", "Temperature (°C)", "Error", "PID Output", "P Component", "I Component"])
+    csv_log = CsvLogger(file_path, ["Time (s)", "Temperature (°C)", "Error", "PID Output", "P Component", "I Component"])
     print(f"Plik {file_path} zainicjalizowany.")
+    return csv_log
 
 # Funkcja zapisująca dane do pliku CSV
-def save_to_csv(file_path, elapsed_time, temperature, error, pid_output, P, I):
-    with open(file_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([elapsed_time, temperature, error, pid_output, P, I])
+def save_to_csv(csv_log, elapsed_time, temperature, error, pid_output, P, I):
+    csv_log.write_row([elapsed_time, temperature, error, pid_output, P, I])
     print(f"Zapisano: Czas = {elapsed_time:.1f}s, Temp = {temperature:.2f}°C, Error = {error:.2f}, Output = {pid_output:.2f}%, P = {P:.2f}, I = {I:.2f}")
 
 # Inicjalizacja GPIO
@@ -56,52 +31,69 @@ sensor = W1ThermSensor()
 
 # Parametry PID
 setpoint = 31.0  # Zadana temperatura
-dt = 1.0  # Odstęp czasu w sekundach
+dt = 1.0  # Okres pętli sterowania w sekundach
 Kp = 0.0463
 Ki = 0.00333
 Kd = 0.0
 
-pid = PIDController(Kp=Kp, Ki=Ki, Kd=Kd)
+# Regulator PID z anti-windupem i pochodną z pomiaru
+pid = ControllerBank().add(Kp, Ki, Kd, setpoint)
 
 # Plik CSV do zapisu danych
 csv_file = "pid_temperature_log.csv"
-initialize_csv(csv_file)
+csv_log = initialize_csv(csv_file)
 
 start_time = time.time()  # Czas początkowy programu
+pending_dt = 0.0  # Czas od ostatniego udanego obliczenia PID
 
-try:
-    while True:
-        # Odczyt temperatury z DS18B20
-        try:
-            current_temperature = sensor.get_temperature()
-        except Exception as e:
-            print(f"Error reading temperature: {e}")
-            current_temperature = None
+def control_step(measured_dt):
+    global pending_dt
+    pending_dt += measured_dt
+
+    # Odczyt temperatury z DS18B20
+    try:
+        current_temperature = sensor.get_temperature()
+    except Exception as e:
+        print(f"Error reading temperature: {e}")
+        current_temperature = None
+
+    if current_temperature is not None:
+        # Oblicz wartość PID dla rzeczywistego czasu od poprzedniego obliczenia
+        pid_output, error, P, I, D = pid.compute(setpoint, current_temperature, pending_dt)
+        pending_dt = 0.0
 
-        if current_temperature is not None:
-            # Oblicz wartość PID oraz dodatkowe informacje
-            pid_output, error, P, I, D = pid.compute(setpoint, current_temperature, dt)
+        # Odwrócona logika PWM
+        inverted_pwm = 100 - pid_output  # Invert the duty cycle
+        pwm.ChangeDutyCycle(inverted_pwm)
 
-            # Odwrócona logika PWM
-            inverted_pwm = 100 - pid_output  # Invert the duty cycle
-            pwm.ChangeDutyCycle(inverted_pwm)
+        # Obliczenie czasu
+        elapsed_time = time.time() - start_time
 
-            # Obliczenie czasu
-            elapsed_time = time.time() - start_time
+        # Wyświetlenie danych
+        print(f"Time: {elapsed_time:.1f}s, Temp: {current_temperature:.2f}°C, Error: {error:.2f}, "
+              f"PID Output: {pid_output:.2f}%, PWM: {inverted_pwm:.2f}%, P: {P:.2f}, I: {I:.2f}")
 
-            # Wyświetlenie danych
-            print(f"Time: {elapsed_time:.1f}s, Temp: {current_temperature:.2f}°C, Error: {error:.2f}, "
-                  f"PID Output: {pid_output:.2f}%, PWM: {inverted_pwm:.2f}%, P: {P:.2f}, I: {I:.2f}")
+        # Zapis do pliku CSV
+        save_to_csv(csv_log, elapsed_time, current_temperature, error, pid_output, P, I)
 
-            # Zapis do pliku CSV
-            save_to_csv(csv_file, elapsed_time, current_temperature, error, pid_output, P, I)
+def report_timing(measured_dt):
+    control = scheduler.stats()["control"]
+    print(f"Control loop: {control['runs']} runs, overruns: {control['overruns']}, "
+          f"jitter max: {control['jitter_max'] * 1000:.1f} ms, work max: {control['duration_max'] * 1000:.0f} ms")
 
-        time.sleep(dt)
+# Pętla sterowania co dt bez dryfu (czas pracy nie wydłuża okresu)
+scheduler = RateScheduler()
+scheduler.add("control", dt, control_step)
+scheduler.add("timing", 60.0, report_timing, offset=60.0)
+
+try:
+    scheduler.run()
 
 except KeyboardInterrupt:
     print("\nStopping...")
 finally:
     # Czyszczenie GPIO
+    csv_log.close()
     pwm.stop()
     GPIO.cleanup()
     print("GPIO cleaned up.")
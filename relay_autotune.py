@@ -0,0 +1,210 @@
+import math
+import time
+
+# Auto-tuning regulatora metodą przekaźnikową (Åström–Hägglund).
+# Zamiast wielogodzinnych przebiegów próbnych (kp_9_ti_330, Kp130Ki0,0005Kd50,
+# T900L85, ...) grzałka pracuje dwustanowo wokół wartości zadanej:
+# bias + d poniżej setpoint - h, bias - d powyżej setpoint + h. Obiekt
+# z opóźnieniem wpada w stabilne oscylacje, z których w locie mierzone są:
+#  - okres krytyczny Pu (odstęp między kolejnymi przełączeniami w górę),
+#  - wzmocnienie krytyczne Ku = 4 d / (pi * sqrt(a^2 - h^2)), a to połowa
+#    amplitudy międzyszczytowej temperatury.
+# Gdy kilka kolejnych cykli daje zgodne Pu i Ku, nastawy liczone są z tabeli
+# TUNING_RULES i wpisywane do kanału ControllerBank. Przekazanie sterowania
+# jest bezuderzeniowe: następuje, gdy temperatura przechodzi przez setpoint
+# w górę (uchyb i część P bliskie zeru), a całka startuje od średniej mocy
+# przekaźnika z pomiarowych cykli, czyli mocy potrzebnej do utrzymania
+# temperatury.
+
+# (Kp / Ku, Ti / Pu, Td / Pu); Td = 0 oznacza PI
+TUNING_RULES = {
+    "pi": (0.45, 1 / 1.2, 0.0),  # Ziegler–Nichols
+    "pid": (0.6, 0.5, 0.125),  # Ziegler–Nichols
+    "pi_tyreus_luyben": (1 / 3.2, 2.2, 0.0),  # Mniejsze przeregulowanie
+    "pid_no_overshoot": (0.2, 0.5, 1 / 3.0),
+}
+
+
+def relay_gains(ku, pu, rule="pi"):
+    """Nastawy (Kp, Ki, Kd) z wzmocnienia i okresu krytycznego."""
+    kp_factor, ti_factor, td_factor = TUNING_RULES[rule]
+    kp = kp_factor * ku
+    ti = ti_factor * pu
+    return kp, kp / ti, kp * td_factor * pu
+
+
+class RelayAutotuner:
+    """Tryb auto-tuningu dla kanału ControllerBank.
+
+    compute() ma interfejs ControllerChannel.compute, więc tuner wstawia się
+    w miejsce regulatora (np. w controller_factory AsyncPoller). Po
+    wyznaczeniu nastaw (albo po max_duration, wtedy z dotychczasowymi
+    nastawami) sterowanie przejmuje kanał. bias i amplitude w %; domyślnie
+    przekaźnik wykorzystuje cały zakres 0-100. hysteresis w °C chroni przed
+    przełączaniem na szumie i krokach DS18B20.
+    """
+
+    def __init__(self, channel, bias=None, amplitude=None, hysteresis=0.25, rule="pi", cycles=3, tolerance=0.1,
+                 max_duration=4 * 3600.0, on_tuned=None):
+        bank = channel.bank
+        self.channel = channel
+        self.bias = (bank.output_min + bank.output_max) / 2 if bias is None else bias
+        largest = min(self.bias - bank.output_min, bank.output_max - self.bias)
+        self.amplitude = largest if amplitude is None else min(amplitude, largest)
+        self.hysteresis = hysteresis
+        self.rule = rule
+        self.cycles = cycles  # Ile zgodnych cykli (poza pierwszym, rozbiegowym) wystarcza
+        self.tolerance = tolerance  # Dopuszczalny względny rozrzut Pu i Ku
+        self.max_duration = max_duration
+        self.on_tuned = on_tuned
+        self.time = 0.0
+        self._last_call = None
+        self.high = True
+        self._cycle_start = None  # Czas ostatniego przełączenia w górę
+        self._switch_low = None  # Czas przełączenia w dół w bieżącym cyklu
+        self._peak = -math.inf
+        self._trough = math.inf
+        self.periods = []  # (Pu, Ku, czas wysokiego stanu) kolejnych cykli
+        self.result = None  # Słownik z Ku, Pu, nastawami i mocą podtrzymania
+        self.tuning = True
+        self.failed = False
+
+    @property
+    def output(self):
+        return self.bias + self.amplitude if self.high else self.bias - self.amplitude
+
+    def _cycle(self):
+        """Zamyka cykl przy przełączeniu w górę; zwraca (Pu, Ku) albo None."""
+        now = self.time
+        if self._cycle_start is not None and self._switch_low is not None:
+            period = now - self._cycle_start
+            a = (self._peak - self._trough) / 2
+            if period > 0 and a > self.hysteresis:
+                ku = 4 * self.amplitude / (math.pi * math.sqrt(a ** 2 - self.hysteresis ** 2))
+                self.periods.append((period, ku, self._switch_low - self._cycle_start))
+        self._cycle_start = now
+        self._switch_low = None
+        self._peak = -math.inf
+        self._trough = math.inf
+
+    def _converged(self):
+        # Pierwszy cykl to rozbieg od temperatury startowej
+        recent = self.periods[1:][-self.cycles:]
+        if len(recent) < self.cycles:
+            return None
+        for column in (0, 1):
+            values = [cycle[column] for cycle in recent]
+            mean = sum(values) / len(values)
+            if max(values) - min(values) > self.tolerance * mean:
+                return None
+        pu = sum(cycle[0] for cycle in recent) / len(recent)
+        ku = sum(cycle[1] for cycle in recent) / len(recent)
+        # Średnia moc przekaźnika w cyklu = moc potrzebna do utrzymania setpoint
+        duty = sum(cycle[2] / cycle[0] for cycle in recent) / len(recent)
+        hold = self.bias - self.amplitude + 2 * self.amplitude * duty
+        kp, ki, kd = relay_gains(ku, pu, self.rule)
+        return {"Ku": ku, "Pu": pu, "kp": kp, "ki": ki, "kd": kd, "hold_power": hold, "rule": self.rule}
+
+    def _hand_over(self):
+        bank = self.channel.bank
+        index = self.channel.index
+        if self.result is not None:
+            bank.set_gains(index, self.result["kp"], self.result["ki"], self.result["kd"])
+            self.result["duration"] = self.time
+            hold = self.result["hold_power"]
+        else:
+            hold = bank.output[index]
+        # Całka = moc podtrzymania, pochodna i dt liczone od nowa
+        bank.reset(index, min(max(hold, bank.output_min), bank.output_max))
+        self.tuning = False
+        if self.on_tuned is not None:
+            self.on_tuned(self)
+
+    def compute(self, setpoint, measured_value, dt=None):
+        """Zwraca (output, error, P, I, D); w trakcie tuningu P to wychylenie przekaźnika, I to bias."""
+        if not self.tuning:
+            return self.channel.compute(setpoint, measured_value, dt)
+        now = time.monotonic()
+        if dt is None:
+            dt = 0.0 if self._last_call is None else now - self._last_call
+        self._last_call = now
+        self.time += max(dt, 0.0)
+        error = setpoint - measured_value
+        self._peak = max(self._peak, measured_value)
+        self._trough = min(self._trough, measured_value)
+
+        if self.result is not None:
+            # Nastawy gotowe: przekazanie przy przejściu przez setpoint w górę
+            if self.high and error <= 0:
+                self._hand_over()
+                return self.channel.compute(setpoint, measured_value, 0.0)
+        elif self.time > self.max_duration:
+            self.failed = True
+            print(f"Error auto-tuning: no steady oscillation after {self.time:.0f}s, keeping current gains")
+            self._hand_over()
+            return self.channel.compute(setpoint, measured_value, 0.0)
+
+        if self.high and error < -self.hysteresis:
+            self.high = False
+            self._switch_low = self.time
+        elif not self.high and error > self.hysteresis:
+            self.high = True
+            self._cycle()
+            if self.result is None:
+                self.result = self._converged()
+        output = self.output
+        return output, error, output - self.bias, self.bias, 0.0
+
+
+def simulate(K=17.5, T=366.0, L=70.0, ambient=24.0, setpoint=34.0, dt=1.0, duration=6 * 3600.0, rule="pi",
+             step=0.0625, **kwargs):
+    """Auto-tuning na symulowanym obiekcie FOPDT i regulacja po przekazaniu.
+
+    Zwraca wynik tuningu oraz przeregulowanie i średni błąd bezwzględny
+    w ostatniej godzinie pracy z wyznaczonymi nastawami.
+    """
+    from collections import deque
+
+    from controller_bank import ControllerBank
+
+    tuner = RelayAutotuner(ControllerBank().add(0.0, 0.0, setpoint=setpoint), rule=rule, **kwargs)
+    temperature = ambient
+    powers = deque([0.0] * max(int(round(L / dt)), 1))
+    decay = math.exp(-dt / T)
+    handover = None
+    peak = -math.inf
+    errors = []
+    for i in range(int(duration / dt)):
+        measured = math.floor(temperature / step) * step
+        output = tuner.compute(setpoint, measured, dt)[0]
+        if not tuner.tuning:
+            if handover is None:
+                handover = i * dt
+            peak = max(peak, measured)
+            errors.append(abs(setpoint - measured))
+        powers.append(output)
+        target = ambient + K * powers.popleft() / 100.0
+        temperature = target + (temperature - target) * decay
+    last_hour = errors[-int(3600 / dt):]
+    return {
+        "result": tuner.result,
+        "failed": tuner.failed,
+        "handover": handover,
+        "overshoot": None if handover is None else peak - setpoint,
+        "mean_abs_error": sum(last_hour) / len(last_hour) if last_hour else None,
+    }
+
+
+if __name__ == "__main__":
+    # Modele z fopdt_ident.py: lampa i mata grzewcza
+    for heater, (K, T, L) in {"lampa": (17.5, 366.0, 70.0), "mata": (25.4, 957.0, 16.0)}.items():
+        for rule in ("pi", "pi_tyreus_luyben", "pid"):
+            summary = simulate(K, T, L, rule=rule)
+            result = summary["result"]
+            if summary["failed"] or result is None:
+                print(f"{heater} {rule}: tuning failed")
+                continue
+            print(f"{heater} {rule}: Ku={result['Ku']:.1f} Pu={result['Pu']:.0f}s -> kp={result['kp']:.2f} "
+                  f"ki={result['ki']:.5f} kd={result['kd']:.1f}, hold {result['hold_power']:.0f}%, "
+                  f"tuned in {summary['handover'] / 60:.0f} min, overshoot {summary['overshoot']:.2f}°C, "
+                  f"MAE {summary['mean_abs_error']:.3f}°C")
@@ -0,0 +1,248 @@
+import json
+import math
+import struct
+import time
+
+import numpy as np
+
+try:
+    import sysv_ipc
+except ImportError:
+    sysv_ipc = None
+
+from multiprocessing import resource_tracker, shared_memory
+
+# Bufor kołowy próbek w pamięci współdzielonej.
+# Jeden proces (sampler.py) zapisuje próbki: czas + wartości wszystkich kanałów
+# (NaN = brak odczytu). Dowolna liczba procesów czyta ostatnią próbkę albo okno
+# ostatnich próbek bez blokad: każdy slot ma licznik seqlock (nieparzysty
+# w trakcie zapisu), a czytelnik ponawia odczyt, gdy licznik się zmienił.
+#
+# Układ segmentu:
+#   nagłówek  HEADER (magic, wersja, sloty, kanały, liczba zapisanych próbek)
+#   nazwy kanałów jako JSON (NAMES_SIZE bajtów)
+#   sloty     [seq u64, czas f64, wartości f64 * kanały] * sloty
+#
+# Z sysv_ipc (jest w venv na Raspberry Pi) segment ma klucz RING_KEY, bez
+# niego używany jest multiprocessing.shared_memory o nazwie RING_NAME.
+
+RING_KEY = 0x54455252  # "TERR"
+RING_NAME = "terrarium_samples"
+MAGIC = b"TRB1"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQ")
+NAMES_SIZE = 4096
+DEFAULT_SLOTS = 4096
+
+
+class RingError(Exception):
+    pass
+
+
+def _slot_dtype(channel_count):
+    return np.dtype([("seq", "<u8"), ("time", "<f8"), ("values", "<f8", (channel_count,))])
+
+
+def _segment_size(slots, channel_count):
+    return HEADER.size + NAMES_SIZE + slots * _slot_dtype(channel_count).itemsize
+
+
+class _Segment:
+    """Segment pamięci współdzielonej (sysv_ipc albo shared_memory)."""
+
+    def __init__(self, create, size=0, key=RING_KEY, name=RING_NAME):
+        self.sysv = sysv_ipc is not None
+        if self.sysv:
+            if create:
+                try:
+                    sysv_ipc.remove_shared_memory(sysv_ipc.SharedMemory(key).id)
+                except sysv_ipc.ExistentialError:
+                    pass
+                self.memory = sysv_ipc.SharedMemory(key, sysv_ipc.IPC_CREX, mode=0o644, size=size)
+            else:
+                try:
+                    self.memory = sysv_ipc.SharedMemory(key)
+                except sysv_ipc.ExistentialError as e:
+                    raise RingError(f"No sample ring with key {key:#x}") from e
+            self.buffer = memoryview(self.memory)
+        else:
+            if create:
+                try:
+                    old = shared_memory.SharedMemory(name=name)
+                    old.close()
+                    old.unlink()
+                except FileNotFoundError:
+                    pass
+                self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            else:
+                try:
+                    self.memory = shared_memory.SharedMemory(name=name)
+                except FileNotFoundError as e:
+                    raise RingError(f"No sample ring named {name}") from e
+                # Czytelnik nie jest właścicielem: bez tego resource_tracker
+                # usunąłby segment przy wyjściu procesu czytelnika
+                resource_tracker.unregister(self.memory._name, "shared_memory")
+            self.buffer = self.memory.buf
+        self.owner = create
+
+    def close(self):
+        self.buffer.release()
+        if self.sysv:
+            self.memory.detach()
+            if self.owner:
+                self.memory.remove()
+        else:
+            self.memory.close()
+            if self.owner:
+                self.memory.unlink()
+
+
+class SampleRing:
+    """Bufor kołowy próbek; create() dla samplera, attach() dla czytelników."""
+
+    def __init__(self, segment, channels, slots):
+        self.segment = segment
+        self.channels = list(channels)
+        self.index = {name: i for i, name in enumerate(self.channels)}
+        self.slots = slots
+        offset = HEADER.size + NAMES_SIZE
+        # Widok NumPy bezpośrednio na pamięci współdzielonej (bez kopii)
+        self._table = np.ndarray((slots,), dtype=_slot_dtype(len(self.channels)),
+                                 buffer=segment.buffer, offset=offset)
+        self._count = np.ndarray((1,), dtype="<u8", buffer=segment.buffer, offset=HEADER.size - 8)
+
+    @classmethod
+    def create(cls, channels, slots=DEFAULT_SLOTS, **segment_args):
+        names = json.dumps(list(channels)).encode("utf-8")
+        if len(names) > NAMES_SIZE:
+            raise RingError("Too many channels for the ring header")
+        segment = _Segment(True, _segment_size(slots, len(channels)), **segment_args)
+        HEADER.pack_into(segment.buffer, 0, MAGIC, VERSION, slots, len(channels), 0)
+        segment.buffer[HEADER.size:HEADER.size + len(names)] = names
+        ring = cls(segment, channels, slots)
+        ring._table["seq"] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, **segment_args):
+        segment = _Segment(False, **segment_args)
+        magic, version, slots, channel_count, _ = HEADER.unpack_from(segment.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            segment.close()
+            raise RingError("Shared memory segment is not a sample ring")
+        names = bytes(segment.buffer[HEADER.size:HEADER.size + NAMES_SIZE]).rstrip(b"\0")
+        return cls(segment, json.loads(names), slots)
+
+    @property
+    def count(self):
+        """Liczba próbek zapisanych od startu samplera."""
+        return int(self._count[0])
+
+    def write(self, timestamp, values):
+        """Zapis próbki (tylko jeden pisarz); values to lista/słownik kanałów."""
+        if isinstance(values, dict):
+            row = np.full(len(self.channels), np.nan)
+            for name, value in values.items():
+                if value is not None and name in self.index:
+                    row[self.index[name]] = value
+        else:
+            row = np.array([np.nan if value is None else value for value in values], dtype=float)
+        number = self.count
+        slot = self._table[number % self.slots]
+        slot["seq"] = 2 * number + 1  # Nieparzysty: zapis w toku
+        slot["time"] = timestamp
+        slot["values"] = row
+        slot["seq"] = 2 * number + 2
+        self._count[0] = number + 1
+
+    def latest(self, retries=100):
+        """(czas, {kanał: wartość}) ostatniej próbki albo None, gdy pusto."""
+        result = self.window(1, retries)
+        if result is None:
+            return None
+        times, values = result
+        return float(times[0]), {name: (None if math.isnan(value) else float(value))
+                          for name, value in zip(self.channels, values[0])}
+
+    def window(self, count, retries=100):
+        """(czasy, wartości[próbki, kanały]) ostatnich count próbek, od najstarszej.
+
+        Kopiowane są tylko wybrane sloty; sloty nadpisane w trakcie kopiowania
+        są czytane ponownie (najwyżej retries razy), a potem pomijane.
+        """
+        for _ in range(retries + 1):
+            end = self.count
+            start = max(end - min(count, self.slots - 1), 0)
+            if end == start:
+                return None
+            numbers = np.arange(start, end, dtype=np.int64)
+            slots = numbers % self.slots
+            expected = 2 * numbers + 2
+            # Seqlock: licznik przed i po kopii musi być ten sam i parzysty
+            before = self._table["seq"][slots]
+            rows = self._table[slots]  # Kopia wybranych slotów
+            after = self._table["seq"][slots]
+            valid = (before == expected) & (after == expected)
+            if valid.all():
+                return rows["time"], rows["values"]
+        if not valid.any():
+            return None
+        return rows["time"][valid], rows["values"][valid]
+
+    def channel(self, name, count):
+        """(czasy, wartości) jednego kanału z ostatnich count próbek."""
+        result = self.window(count)
+        if result is None:
+            return np.empty(0), np.empty(0)
+        times, values = result
+        return times, values[:, self.index[name]]
+
+    def close(self):
+        # Widoki NumPy muszą zniknąć przed zwolnieniem bufora
+        del self._table
+        del self._count
+        self.segment.close()
+
+
+# Czujniki czytane z bufora zamiast ze sprzętu, z tym samym interfejsem co
+# W1ThermSensor i adafruit_dht (błąd, gdy próbka jest starsza niż max_age)
+class RingThermometer:
+    def __init__(self, ring, channel, max_age=5.0):
+        self.ring = ring
+        self.channel = channel
+        self.max_age = max_age
+
+    def get_temperature(self):
+        return _latest_value(self.ring, self.channel, self.max_age)
+
+
+class RingDHT:
+    def __init__(self, ring, temperature_channel, humidity_channel, max_age=5.0):
+        self.ring = ring
+        self.temperature_channel = temperature_channel
+        self.humidity_channel = humidity_channel
+        self.max_age = max_age
+
+    @property
+    def temperature(self):
+        return _latest_value(self.ring, self.temperature_channel, self.max_age)
+
+    @property
+    def humidity(self):
+        return _latest_value(self.ring, self.humidity_channel, self.max_age)
+
+    def exit(self):
+        pass
+
+
+def _latest_value(ring, channel, max_age):
+    sample = ring.latest()
+    if sample is None:
+        raise RuntimeError("sample ring is empty")
+    timestamp, values = sample
+    if time.time() - timestamp > max_age:
+        raise RuntimeError(f"sampler stalled, last sample {time.time() - timestamp:.1f}s old")
+    value = values.get(channel)
+    if value is None:
+        raise RuntimeError(f"no reading for {channel}")
+    return value
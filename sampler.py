@@ -0,0 +1,153 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import adafruit_dht
+import board
+
+from device_config import DeviceConfig
+from sample_ring import SampleRing
+from scheduler import RateScheduler
+from sensor_cache import SensorCache, dht_values
+from w1_bus import ResolutionPolicy, W1BusReader
+
+# Proces samplera: jedyny właściciel czujników DS18B20 i DHT.
+# Co period sekund czyta wszystkie czujniki (DS18B20 jedną wspólną konwersją,
+# DHT równolegle w wątkach z limitem czasu) i zapisuje próbkę do bufora
+# kołowego w pamięci współdzielonej (sample_ring.py). Regulator, wysyłka
+# i logi działają w osobnych procesach i tylko czytają bufor, więc
+# zawieszony odczyt czujnika nie zatrzymuje sterowania grzałką.
+# Z resolution_policy (w1_bus.ResolutionPolicy) i setpoint sampler sam zmienia
+# rozdzielczość DS18B20 według uchybu, bo regulator nie ma dostępu do magistrali.
+
+DHT_TIMEOUT = 1.0
+
+
+def build_sources(config, bus, terrarium_type="lampa"):
+    """Kanały bufora i czujniki z konfiguracji pinów.
+
+    Zwraca (kanały, [(DHT, kanał temperatury, kanał wilgotności)],
+    {id DS18B20: kanał}). Kanały mają nazwy "<terrarium_id>.<pomiar>".
+    """
+    channels = []
+    dhts = []
+    thermometers = {}
+    bus_ids = set(bus.sensor_ids())
+    for terrarium in config.terrariums():
+        if terrarium["type"].lower() != terrarium_type:
+            continue
+        terrarium_id = terrarium["id"]
+        for pin in config.pins_for(terrarium_id):
+            function = pin["function"]
+            if function in ("t1", "t2"):
+                name = "dht22" if function == "t1" else "dht11"
+                sensor_class = adafruit_dht.DHT22 if function == "t1" else adafruit_dht.DHT11
+                try:
+                    device = sensor_class(getattr(board, f"D{pin['id']}"))
+                except Exception as e:
+                    print(f"Error initializing {name.upper()}: {e}")
+                    continue
+                temperature_channel = f"{terrarium_id}.{name}_temp"
+                humidity_channel = f"{terrarium_id}.{name}_humidity"
+                channels += [temperature_channel, humidity_channel]
+                dhts.append((device, temperature_channel, humidity_channel))
+            elif function in bus_ids:
+                channel = f"{terrarium_id}.ds18b20"
+                channels.append(channel)
+                thermometers[function] = channel
+    return channels, dhts, thermometers
+
+
+class Sampler:
+    def __init__(self, ring, dhts, thermometers, bus, period=1.0, dht_timeout=DHT_TIMEOUT, resolution_policy=None,
+                 setpoint=None):
+        self.ring = ring
+        self.dhts = dhts
+        self.thermometers = thermometers
+        self.bus = bus
+        self.period = period
+        self.dht_timeout = dht_timeout
+        self.cache = SensorCache()
+        self.resolution_policy = resolution_policy if setpoint is not None else None
+        self.setpoint = setpoint
+        self.executor = ThreadPoolExecutor(max_workers=len(dhts) + 1, thread_name_prefix="sampler")
+        self._pending = {}  # Odczyty, które jeszcze trwają (zawieszony czujnik)
+        self.scheduler = RateScheduler()
+        self.scheduler.add("sample", period, self.sample)
+
+    def _submit(self, key, func):
+        future = self._pending.get(key)
+        if future is None or future.done():
+            future = self._pending[key] = self.executor.submit(func)
+        return future
+
+    def sample(self, dt=None):
+        values = {}
+        futures = {}
+        if self.thermometers:
+            futures["ds18b20"] = self._submit("ds18b20", lambda: self.bus.read_all(list(self.thermometers)))
+        for device, temperature_channel, humidity_channel in self.dhts:
+            futures[id(device)] = self._submit(
+                id(device), lambda device=device: self.cache.read(device, lambda: dht_values(device)))
+        # DS18B20 czeka na konwersję, DHT mają własny limit
+        wait(futures.values(), timeout=max(self.bus.conversion_time * 2, self.dht_timeout))
+
+        ds18b20 = futures.get("ds18b20")
+        if ds18b20 is not None and ds18b20.done() and ds18b20.exception() is None:
+            for sensor_id, temperature in ds18b20.result().items():
+                values[self.thermometers[sensor_id]] = temperature
+                self._adjust_resolution(sensor_id, temperature)
+        for device, temperature_channel, humidity_channel in self.dhts:
+            future = futures[id(device)]
+            reading = future.result() if future.done() and future.exception() is None else self.cache.latest(device)
+            if reading is not None and reading.value is not None and reading.error is None:
+                values[temperature_channel], values[humidity_channel] = reading.value
+        self.ring.write(time.time(), values)
+
+    def _adjust_resolution(self, sensor_id, temperature):
+        if self.resolution_policy is None or temperature is None:
+            return
+        current = self.bus.resolutions.get(sensor_id, 12)
+        bits = self.resolution_policy.choose(current, self.setpoint - temperature)
+        if bits == current:
+            return
+        try:
+            self.bus.set_resolution(sensor_id, bits)
+        except (OSError, ValueError) as e:
+            # Np. bez uprawnień do zapisu w sysfs: dalej ze stałą rozdzielczością
+            print(f"Error setting DS18B20 {sensor_id} resolution to {bits} bit, adaptive resolution disabled: {e}")
+            self.resolution_policy = None
+
+    def run(self, should_stop=None):
+        self.scheduler.run(should_stop)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for device, _, _ in self.dhts:
+            try:
+                device.exit()
+            except Exception as e:
+                print(f"Error releasing DHT sensor: {e}")
+
+
+if __name__ == "__main__":
+    user_id = 1
+    setpoint = 34.0  # Zadana temperatura jak w 3_temps.py
+    config = DeviceConfig(user_id).ensure_loaded()
+    bus = W1BusReader()
+    channels, dhts, thermometers = build_sources(config, bus)
+    ring = SampleRing.create(channels)
+    # 9 bitów (94 ms) przy nagrzewaniu, 12 bitów blisko zadanej
+    sampler = Sampler(ring, dhts, thermometers, bus, period=1.0,
+                      resolution_policy=ResolutionPolicy(far=2.0, near=1.0), setpoint=setpoint)
+    print(f"Sampler started: {len(channels)} channels, {ring.slots} slots")
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    try:
+        sampler.run(lambda: bool(stopping))
+    except KeyboardInterrupt:
+        print("Sampler zatrzymany.")
+    finally:
+        sampler.close()
+        ring.close()
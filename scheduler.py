@@ -0,0 +1,108 @@
+import heapq
+import math
+import time
+
+from streaming_stats import RunningStats
+
+# Harmonogram zadań okresowych na zegarze monotonicznym.
+# Terminy liczone są od startu (start + n * okres), a nie "praca + sleep(dt)",
+# więc czas pracy nie przesuwa kolejnych cykli. Każde zadanie dostaje
+# zmierzony dt od poprzedniego uruchomienia oraz liczniki opóźnień (jitter)
+# i przekroczeń okresu.
+
+
+class TaskTiming:
+    """Terminy i metryki jednego zadania okresowego."""
+
+    def __init__(self, period, start, offset=0.0):
+        self.period = period
+        self.next_deadline = start + offset
+        self.last_start = None
+        self.runs = 0
+        self.overruns = 0  # Cykle pominięte, bo praca trwała dłużej niż okres
+        self.jitter = RunningStats()  # Spóźnienie startu względem terminu [s]
+        self.duration = RunningStats()  # Czas pracy [s]
+        self.last_dt = None
+
+    def begin(self, now):
+        """Rejestruje start zadania, zwraca zmierzony dt (przy pierwszym razie okres)."""
+        self.jitter.add(max(now - self.next_deadline, 0.0))
+        dt = self.period if self.last_start is None else now - self.last_start
+        self.last_start = now
+        self.last_dt = dt
+        self.runs += 1
+        return dt
+
+    def finish(self, now):
+        """Rejestruje koniec zadania i wyznacza kolejny termin na siatce okresu."""
+        self.duration.add(now - self.last_start)
+        self.next_deadline += self.period
+        if now > self.next_deadline:
+            missed = math.ceil((now - self.next_deadline) / self.period)
+            self.overruns += missed
+            self.next_deadline += missed * self.period
+        return self.next_deadline
+
+    def stats(self):
+        return {
+            "period": self.period,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "last_dt": self.last_dt,
+            "jitter_mean": self.jitter.mean if self.jitter.count else None,
+            "jitter_max": self.jitter.max if self.jitter.count else None,
+            "duration_mean": self.duration.mean if self.duration.count else None,
+            "duration_max": self.duration.max if self.duration.count else None,
+        }
+
+
+class RateScheduler:
+    """Uruchamia zadania o różnych okresach w jednym wątku.
+
+    Zadanie to func(dt), gdzie dt to rzeczywisty czas od poprzedniego
+    uruchomienia. clock i sleep można podmienić (np. VirtualClock
+    z hardware_sim.py).
+    """
+
+    def __init__(self, clock=None, sleep=None):
+        self.clock = clock or (lambda: time.monotonic())
+        self.sleep = sleep or (lambda seconds: time.sleep(seconds))
+        self.tasks = {}
+        self._heap = []
+        self._start = None
+
+    def add(self, name, period, func, offset=0.0):
+        if self._start is None:
+            self._start = self.clock()
+        timing = TaskTiming(period, self._start, offset)
+        self.tasks[name] = (timing, func)
+        heapq.heappush(self._heap, (timing.next_deadline, name))
+        return timing
+
+    def run_pending(self):
+        """Uruchamia zadania, których termin minął; zwraca czas do najbliższego terminu."""
+        while self._heap:
+            deadline, name = self._heap[0]
+            now = self.clock()
+            if deadline > now:
+                return deadline - now
+            heapq.heappop(self._heap)
+            timing, func = self.tasks[name]
+            dt = timing.begin(now)
+            try:
+                func(dt)
+            except Exception as e:
+                print(f"Error in task {name}: {e}")
+            heapq.heappush(self._heap, (timing.finish(self.clock()), name))
+        return None
+
+    def run(self, should_stop=None):
+        """Pętla główna; kończy się, gdy should_stop() zwróci True."""
+        while should_stop is None or not should_stop():
+            delay = self.run_pending()
+            if delay is None:
+                return
+            self.sleep(delay)
+
+    def stats(self):
+        return {name: timing.stats() for name, (timing, _) in self.tasks.items()}
@@ -1,13 +1,13 @@
 import adafruit_dht
 import board
 import time
-from w1thermsensor import W1ThermSensor
+from w1_bus import W1BusReader
 
 # Initialize the DHT22 sensor
 dht_device = adafruit_dht.DHT22(board.D17)  # DHT22 on GPIO 17
 
-# Initialize the DS18B20 sensor
-ds18b20_sensor = W1ThermSensor()
+# Initialize the DS18B20 bus (one conversion for all sensors)
+ds18b20_bus = W1BusReader()
 
 try:
     while True:
@@ -21,9 +21,9 @@ try:
 
         # Read data from the DS18B20
         try:
-            for sensor in W1ThermSensor.get_available_sensors():
-                temperature_ds18b20 = sensor.get_temperature()
-                print(f"DS18B20 - Temperature: {temperature_ds18b20:.2f}°C (Sensor ID: {sensor.id})")
+            for sensor_id, temperature_ds18b20 in ds18b20_bus.read_all().items():
+                if temperature_ds18b20 is not None:
+                    print(f"DS18B20 - Temperature: {temperature_ds18b20:.2f}°C (Sensor ID: {sensor_id})")
         except Exception as error:
             print(f"Error reading DS18B20: {error}")
 
@@ -0,0 +1,155 @@
+import threading
+import time
+
+# Wspólny bufor odczytów czujników.
+# Każde fizyczne urządzenie czytane jest tylko przez bufor: odczyt młodszy niż
+# minimalny odstęp urządzenia (DHT22: 2 s) jest zwracany z pamięci, a
+# jednoczesne prośby o to samo urządzenie czekają na jeden odczyt sprzętowy.
+# Regulator, wysyłka i logi dostają tę samą wartość razem z czasem odczytu.
+# Czujniki 1-Wire kluczowane są swoim id, więc W1ThermSensor,
+# AsyncW1ThermSensor i AdaptiveResolution tego samego DS18B20 dzielą wpis.
+
+MIN_INTERVALS = {
+    "DHT22": 2.0,  # Karta katalogowa: nie częściej niż co 2 s
+    "DHT11": 1.0,
+}
+
+
+def sensor_key(device):
+    """Klucz wpisu: id czujnika 1-Wire albo sam obiekt (nie id(), które wraca po GC)."""
+    sensor_id = getattr(device, "id", None)
+    if isinstance(sensor_id, str):
+        return ("w1", sensor_id)
+    return device
+
+
+def min_interval_for(device):
+    """Minimalny odstęp odczytów według typu urządzenia (0 dla nieznanych)."""
+    for cls in type(device).__mro__:
+        if cls.__name__ in MIN_INTERVALS:
+            return MIN_INTERVALS[cls.__name__]
+    return 0.0
+
+
+class SensorReading:
+    __slots__ = ("value", "time", "monotonic", "error")
+
+    def __init__(self, value, time, monotonic, error=None):
+        self.value = value
+        self.time = time  # Czas odczytu (time.time())
+        self.monotonic = monotonic
+        self.error = error  # Wyjątek, gdy ta próba odczytu się nie udała
+
+    def age(self, now=None):
+        return (time.monotonic() if now is None else now) - self.monotonic
+
+
+class _Entry:
+    __slots__ = ("lock", "reading", "last_attempt", "min_interval")
+
+    def __init__(self, min_interval):
+        self.lock = threading.Lock()
+        self.reading = None  # Ostatni udany odczyt
+        self.last_attempt = None
+        self.min_interval = min_interval
+
+
+class SensorCache:
+    """Ostatnie odczyty urządzeń, kluczowane sensor_key(urządzenie)."""
+
+    def __init__(self, clock=None, wall_clock=None):
+        self.clock = clock or (lambda: time.monotonic())
+        self.wall_clock = wall_clock or (lambda: time.time())
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.reads = 0  # Odczyty sprzętowe
+        self.hits = 0  # Odczyty obsłużone z pamięci
+        self.coalesced = 0  # Prośby, które doczekały się cudzego odczytu
+        self.errors = 0
+
+    def _entry(self, device, min_interval):
+        with self._lock:
+            key = sensor_key(device)
+            entry = self._entries.get(key)
+            if entry is None:
+                if min_interval is None:
+                    min_interval = min_interval_for(device)
+                entry = self._entries[key] = _Entry(min_interval)
+            return entry
+
+    def read(self, device, func, min_interval=None, max_age=None):
+        """Zwraca SensorReading urządzenia, czytając sprzęt tylko gdy trzeba.
+
+        func() wykonuje odczyt sprzętowy. Nowy odczyt następuje, gdy ostatnia
+        próba jest starsza niż min_interval i (jeśli podano) wartość starsza
+        niż max_age. Po błędzie wywołujący dostaje poprzednią wartość
+        z ustawionym error (value None, gdy udanego odczytu nie było).
+        """
+        entry = self._entry(device, min_interval)
+        waited = entry.lock.locked()
+        requested = self.clock()
+        with entry.lock:
+            now = self.clock()
+            # Odczyt zakończony, gdy czekaliśmy na blokadę, też jest świeży
+            joined = waited and entry.reading is not None and entry.reading.monotonic >= requested
+            if joined or self._fresh(entry, now, max_age):
+                if waited:
+                    self.coalesced += 1
+                else:
+                    self.hits += 1
+                return entry.reading or SensorReading(None, None, None)
+            entry.last_attempt = now
+            self.reads += 1
+            try:
+                value = func()
+            except Exception as e:
+                self.errors += 1
+                previous = entry.reading or SensorReading(None, None, None)
+                return SensorReading(previous.value, previous.time, previous.monotonic, e)
+            entry.reading = SensorReading(value, self.wall_clock(), self.clock())
+            return entry.reading
+
+    def _fresh(self, entry, now, max_age):
+        if entry.last_attempt is None:
+            return False
+        if now - entry.last_attempt < entry.min_interval:
+            return True
+        return max_age is not None and entry.reading is not None and now - entry.reading.monotonic <= max_age
+
+    def update(self, device, value):
+        """Zapisuje odczyt wykonany poza buforem (np. asynchroniczny DS18B20)."""
+        entry = self._entry(device, None)
+        now = self.clock()
+        entry.last_attempt = now
+        entry.reading = SensorReading(value, self.wall_clock(), now)
+        return entry.reading
+
+    def latest(self, device):
+        """Ostatni odczyt bez dotykania sprzętu (None, gdy go nie było)."""
+        entry = self._entries.get(sensor_key(device))
+        return None if entry is None else entry.reading
+
+    def forget(self, device):
+        with self._lock:
+            self._entries.pop(sensor_key(device), None)
+
+    def stats(self):
+        return {"devices": len(self._entries), "reads": self.reads, "hits": self.hits,
+                "coalesced": self.coalesced, "errors": self.errors}
+
+
+def dht_values(device):
+    # Jeden pomiar DHT daje temperaturę i wilgotność
+    return device.temperature, device.humidity
+
+
+def read_dht(cache, device, max_age=None):
+    """(temperatura, wilgotność) DHT przez bufor; (None, None) bez odczytu."""
+    if device is None:
+        return None, None
+    reading = cache.read(device, lambda: dht_values(device), max_age=max_age)
+    if reading.error is not None:
+        print(f"Error reading from {type(device).__name__}: {reading.error}")
+    if reading.value is None:
+        return None, None
+    return reading.value
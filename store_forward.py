@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Trwała kolejka żądań na dysku (SQLite w trybie WAL) na czas, gdy API jest
+# niedostępne. Dopisanie to jeden INSERT, opróżnianie idzie paczkami od
+# najstarszych wpisów. Rozmiar jest ograniczony, bo karta SD jest mała i wolna.
+
+DEFAULT_PATH = "uplink_queue.sqlite3"
+
+
+class DurableQueue:
+    """Kolejka FIFO żądań HTTP przetrwająca restart Raspberry Pi.
+
+    max_rows ogranicza liczbę wpisów (najstarsze są usuwane), a compact()
+    oddaje zwolnione strony bazy i skraca plik WAL.
+    coalesce_key pozwala trzymać tylko najnowszą wersję żądania, np. PUT
+    bieżących odczytów terrarium, których starsze wartości nie mają sensu.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_rows=50000, compact_every=1000):
+        self.path = path
+        self.max_rows = max_rows
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self._deleted_since_compact = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum musi być ustawione przed utworzeniem tabeli
+        self.connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created REAL NOT NULL,
+                method TEXT NOT NULL,
+                url TEXT NOT NULL,
+                params TEXT,
+                body TEXT,
+                batch_payload TEXT,
+                coalesce_key TEXT
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS items_coalesce_key ON items (coalesce_key)")
+        self._count = self.connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def __len__(self):
+        return self._count
+
+    def append(self, method, url, params=None, json_body=None, batch_payload=None, coalesce_key=None, created=None):
+        if created is None:
+            created = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            if coalesce_key is not None:
+                removed = self.connection.execute(
+                    "DELETE FROM items WHERE coalesce_key = ?", (coalesce_key,)).rowcount
+                self._count -= removed
+            self.connection.execute(
+                "INSERT INTO items (created, method, url, params, body, batch_payload, coalesce_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (created, method, url, _dumps(params), _dumps(json_body), _dumps(batch_payload), coalesce_key))
+            self.connection.execute("COMMIT")
+            self._count += 1
+            if self._count > self.max_rows:
+                self._drop_oldest(self._count - self.max_rows)
+
+    def peek(self, limit=100):
+        """Zwraca do limit najstarszych wpisów jako listę słowników."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, created, method, url, params, body, batch_payload, coalesce_key "
+                "FROM items ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [{
+            "id": row[0],
+            "created": row[1],
+            "method": row[2],
+            "url": row[3],
+            "params": _loads(row[4]),
+            "json": _loads(row[5]),
+            "batch_payload": _loads(row[6]),
+            "coalesce_key": row[7],
+        } for row in rows]
+
+    def ack(self, ids):
+        """Usuwa wysłane wpisy."""
+        if not ids:
+            return
+        with self.lock:
+            self.connection.execute("BEGIN")
+            removed = self.connection.executemany("DELETE FROM items WHERE id = ?", [(i,) for i in ids]).rowcount
+            self.connection.execute("COMMIT")
+            self._count -= removed
+            self._after_delete(removed)
+
+    def discard_key(self, coalesce_key):
+        """Usuwa zaległe wersje żądania, gdy nowsza właśnie dotarła do API."""
+        with self.lock:
+            removed = self.connection.execute(
+                "DELETE FROM items WHERE coalesce_key = ?", (coalesce_key,)).rowcount
+            self._count -= removed
+            self._after_delete(removed)
+
+    def _drop_oldest(self, count):
+        self.connection.execute(
+            "DELETE FROM items WHERE id IN (SELECT id FROM items ORDER BY id LIMIT ?)", (count,))
+        self._count -= count
+        self.dropped += count
+        print(f"Durable queue full, dropped {count} oldest entries")
+        self._after_delete(count)
+
+    def _after_delete(self, removed):
+        self._deleted_since_compact += removed
+        if self._count == 0 or self._deleted_since_compact >= self.compact_every:
+            self._compact()
+
+    def compact(self):
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        # execute() wykonuje tylko jeden krok pragmy (jedną stronę), executescript() całość
+        self.connection.executescript("PRAGMA incremental_vacuum;")
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._deleted_since_compact = 0
+
+    def size_bytes(self):
+        total = 0
+        for suffix in ("", "-wal"):
+            if os.path.exists(self.path + suffix):
+                total += os.path.getsize(self.path + suffix)
+        return total
+
+    def close(self):
+        with self.lock:
+            self._compact()
+            self.connection.close()
+
+
+def _dumps(value):
+    return None if value is None else json.dumps(value)
+
+
+def _loads(value):
+    return None if value is None else json.loads(value)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = DurableQueue(os.path.join(directory, "queue.sqlite3"), max_rows=20000)
+        count = 5000
+        start = time.perf_counter()
+        for i in range(count):
+            store.append("POST", "http://localhost/readings", json_body={"terrarium_id": 1, "temperature_1": 24.0 + i})
+        append_time = time.perf_counter() - start
+        start = time.perf_counter()
+        drained = 0
+        while len(store):
+            batch = store.peek(500)
+            store.ack([item["id"] for item in batch])
+            drained += len(batch)
+        drain_time = time.perf_counter() - start
+        print(f"Append: {count / append_time:.0f} rows/s, drain: {drained / drain_time:.0f} rows/s, "
+              f"file after compaction: {store.size_bytes()} bytes")
+        store.close()
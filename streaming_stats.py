@@ -0,0 +1,192 @@
+import math
+import time
+from array import array
+
+# Statystyki strumieniowe o stałej pamięci: średnia i wariancja (Welford),
+# min/max, liczba próbek i przybliżone percentyle z histogramu, jednocześnie
+# dla okien minuty, godziny i doby. Okno to pierścień kubełków czasowych,
+# więc pamięć nie zależy od częstotliwości próbkowania.
+
+
+class RunningStats:
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        # Łączenie dwóch zbiorów (Chan et al.)
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+
+class Histogram:
+    """Histogram o stałych przedziałach na tablicy array; wartości spoza zakresu trafiają do skrajnych."""
+
+    __slots__ = ("low", "bin_width", "counts")
+
+    def __init__(self, low, high, bin_width):
+        self.low = low
+        self.bin_width = bin_width
+        self.counts = array("I", bytes(4 * int(math.ceil((high - low) / bin_width))))
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+
+    def add(self, value):
+        index = int((value - self.low) / self.bin_width)
+        self.counts[min(max(index, 0), len(self.counts) - 1)] += 1
+
+    def merge(self, other):
+        counts = self.counts
+        for i, count in enumerate(other.counts):
+            if count:
+                counts[i] += count
+
+    def percentile(self, q):
+        total = sum(self.counts)
+        if total == 0:
+            return None
+        target = q / 100.0 * total
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count:
+                return self.low + (i + 0.5) * self.bin_width
+        return self.low + (len(self.counts) - 0.5) * self.bin_width
+
+
+class WindowedStats:
+    """Statystyki z ostatnich window sekund w buckets kubełkach."""
+
+    def __init__(self, window, buckets=12, histogram_range=None, clock=time.monotonic):
+        self.window = window
+        self.bucket_span = window / buckets
+        self.clock = clock
+        self.histogram_range = histogram_range
+        self.indexes = [None] * buckets
+        self.stats = [RunningStats() for _ in range(buckets)]
+        self.histograms = [Histogram(*histogram_range) for _ in range(buckets)] if histogram_range else None
+
+    def _bucket(self, now):
+        index = int(now // self.bucket_span)
+        slot = index % len(self.indexes)
+        if self.indexes[slot] != index:
+            # Kubełek z poprzedniego obiegu pierścienia jest już poza oknem
+            self.indexes[slot] = index
+            self.stats[slot].reset()
+            if self.histograms:
+                self.histograms[slot].reset()
+        return slot
+
+    def add(self, value, now=None):
+        slot = self._bucket(self.clock() if now is None else now)
+        self.stats[slot].add(value)
+        if self.histograms:
+            self.histograms[slot].add(value)
+
+    def summary(self, now=None, percentiles=(50, 90, 99)):
+        now = self.clock() if now is None else now
+        oldest = int(now // self.bucket_span) - len(self.indexes) + 1
+        total = RunningStats()
+        histogram = Histogram(*self.histogram_range) if self.histograms else None
+        for slot, index in enumerate(self.indexes):
+            if index is not None and index >= oldest:
+                total.merge(self.stats[slot])
+                if histogram is not None:
+                    histogram.merge(self.histograms[slot])
+        result = _summary(total)
+        if histogram is not None:
+            for q in percentiles:
+                result[f"p{q}"] = histogram.percentile(q) if total.count else None
+        return result
+
+
+def _summary(stats):
+    if stats.count == 0:
+        return {"count": 0, "mean": None, "variance": None, "min": None, "max": None}
+    return {"count": stats.count, "mean": stats.mean, "variance": stats.variance,
+            "min": stats.min, "max": stats.max}
+
+
+WINDOWS = {"minute": 60.0, "hour": 3600.0, "day": 86400.0}
+TEMPERATURE_RANGE = (-10.0, 70.0, 0.25)
+HUMIDITY_RANGE = (0.0, 100.0, 0.5)
+
+
+class ChannelStats:
+    """Jeden kanał pomiarowy: okna minuty/godziny/doby oraz okres od ostatniego raportu."""
+
+    def __init__(self, histogram_range=TEMPERATURE_RANGE, windows=WINDOWS, buckets=12, clock=time.monotonic):
+        self.windows = {name: WindowedStats(span, buckets, histogram_range, clock) for name, span in windows.items()}
+        self.period = RunningStats()
+
+    def add(self, value, now=None):
+        if value is None:
+            return
+        self.period.add(value)
+        for window in self.windows.values():
+            window.add(value, now)
+
+    def summary(self, window, now=None):
+        return self.windows[window].summary(now)
+
+    def take_period(self):
+        """Zwraca statystyki od ostatniego wywołania i zaczyna nowy okres."""
+        result = _summary(self.period)
+        self.period.reset()
+        return result
+
+
+if __name__ == "__main__":
+    import random
+    import tracemalloc
+
+    tracemalloc.start()
+    channel = ChannelStats()
+    start = time.perf_counter()
+    samples = 86400
+    for second in range(samples):
+        channel.add(30.0 + random.gauss(0, 0.5), now=float(second))
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    print(f"{samples / elapsed:.0f} samples/s, memory per channel ~{current / 1024:.0f} KiB")
+    for name in WINDOWS:
+        print(name, channel.summary(name, now=float(samples - 1)))
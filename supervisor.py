@@ -0,0 +1,362 @@
+import argparse
+import importlib
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+
+import metrics
+from actuators import force_off
+from device_config import DeviceConfig
+
+# Nadzorca wielu procesów dla 3_temps.py. Terraria z lampami dzielone są
+# między workery (domyślnie tyle, ile rdzeni), więc zawieszony odczyt DHT,
+# wiszące żądanie HTTP albo wyjątek w jednej lampie zatrzymuje tylko jej
+# shard, a pozostałe grzałki są dalej sterowane.
+#  - Każdy cykl lampy zapisuje czas w HeartbeatTable (pamięć współdzielona).
+#  - Worker, który się zakończył, jest wykrywany od razu (sentinel procesu),
+#    a zawieszony po heartbeat_timeout bez cyklu którejkolwiek z jego lamp.
+#  - Martwy albo zawieszony worker jest zabijany (SIGTERM, po TERMINATE_GRACE
+#    SIGKILL), grzałki jego terrariów dostają bezpieczny stan
+#    (actuators.force_off), a worker startuje ponownie z narastającym
+#    opóźnieniem przy kolejnych awariach.
+#  - Gdy w konfiguracji zmieni się zestaw terrariów z lampą (dodane, usunięte,
+#    zmieniony typ), wszystkie workery startują od nowa z nowymi shardami;
+#    zmiany pinów obsługują same workery (3_temps.py).
+# Metryki nadzorcy: curl http://127.0.0.1:9100/metrics, workerów: port 9101+n.
+
+HEARTBEAT_TIMEOUT = 15.0  # Cykl lampy co 1 s, odczyty czujników mają timeouty 1-1.5 s
+STARTUP_GRACE = 60.0  # Import, konfiguracja i inicjalizacja czujników
+CHECK_INTERVAL = 1.0
+TERMINATE_GRACE = 3.0  # Czas na sprzątanie po SIGTERM, potem SIGKILL
+BACKOFF = (0.0, 1.0, 5.0, 15.0, 60.0)  # Opóźnienia kolejnych restartów po awariach
+HEALTHY_AFTER = 600.0  # Po tylu sekundach pracy bez awarii opóźnienie wraca do zera
+CONFIG_INTERVAL = 30.0  # Co ile sprawdzać listę terrariów w kopii konfiguracji
+
+
+def shard(items, count):
+    """Dzieli items na najwyżej count niepustych, możliwie równych części."""
+    count = max(1, min(count, len(items)))
+    return [list(items[i::count]) for i in range(count)]
+
+
+class HeartbeatTable:
+    """Czas ostatniego cyklu każdej lampy w pamięci współdzielonej.
+
+    time.monotonic() to zegar systemowy wspólny dla procesów, więc nadzorca
+    porównuje go bezpośrednio ze swoim. 0 oznacza brak cyklu od startu workera.
+    """
+
+    def __init__(self, terrarium_ids, context=multiprocessing):
+        self.index = {terrarium_id: i for i, terrarium_id in enumerate(terrarium_ids)}
+        self.times = context.RawArray("d", max(len(self.index), 1))
+
+    def beat(self, terrarium_id):
+        self.times[self.index[terrarium_id]] = time.monotonic()
+
+    def clear(self, terrarium_ids):
+        for terrarium_id in terrarium_ids:
+            self.times[self.index[terrarium_id]] = 0.0
+
+    def last(self, terrarium_id):
+        return self.times[self.index[terrarium_id]] or None
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_worker(index, terrarium_ids, heartbeats):
+    """Proces workera: 3_temps.run() tylko dla terrariów z jego sharda."""
+    # Zatrzymuje go nadzorca (SIGTERM jak Ctrl+C, 3_temps sprząta w finally);
+    # Ctrl+C w terminalu trafia do całej grupy procesów, więc jest ignorowany
+    signal.signal(signal.SIGTERM, _interrupt)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cores[index % len(cores)]})
+    temps = importlib.import_module("3_temps")
+    temps.run(terrarium_ids=set(terrarium_ids), heartbeat=heartbeats.beat, worker=index)
+
+
+class Worker:
+    def __init__(self, index, terrarium_ids):
+        self.index = index
+        self.terrarium_ids = terrarium_ids
+        self.process = None
+        self.started = None
+        self.restarts = 0
+        self.failures = 0  # Awarie od ostatniego zdrowego okresu (indeks w BACKOFF)
+        self.next_start = 0.0
+        self.last_error = None
+
+
+class Supervisor:
+    """Uruchamia workery dla shardów terrariów i pilnuje ich heartbeatów.
+
+    pins_for(terrarium_id) zwraca aktualne piny terrarium (jak
+    DeviceConfig.pins_for); grzałki z funkcją "pwm" wyłącza safe_off(pin).
+    target(index, terrarium_ids, heartbeats) to funkcja procesu workera.
+    lamp_ids() zwraca aktualne id terrariów z lampą; sprawdzane co
+    config_interval, przy zmianie terraria dzielone są od nowa na
+    worker_count workerów (reshard).
+    """
+
+    def __init__(self, shards, pins_for=None, target=run_worker, heartbeat_timeout=HEARTBEAT_TIMEOUT,
+                 startup_grace=STARTUP_GRACE, check_interval=CHECK_INTERVAL, safe_off=force_off, context="spawn",
+                 lamp_ids=None, worker_count=None, config_interval=CONFIG_INTERVAL):
+        # spawn: worker nie dziedziczy wątków, blokad ani stanu GPIO nadzorcy
+        self.context = multiprocessing.get_context(context)
+        self.pins_for = pins_for
+        self.target = target
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_grace = startup_grace
+        self.check_interval = check_interval
+        self.safe_off = safe_off
+        self.lamp_ids = lamp_ids
+        self.worker_count = worker_count or len(shards)
+        self.config_interval = config_interval
+        self.next_config_check = 0.0
+        self.last_pins = {}  # Piny z ostatniego odczytu, gdy terrarium zniknie z konfiguracji
+        self._assign(shards)
+
+    def _assign(self, shards):
+        self.workers = [Worker(index, list(terrarium_ids)) for index, terrarium_ids in enumerate(shards)]
+        self.heartbeats = HeartbeatTable([terrarium_id for terrarium_ids in shards for terrarium_id in terrarium_ids],
+                                         self.context)
+
+    def reshard(self, shards):
+        """Nowy podział terrariów: zatrzymuje wszystkie workery (grzałki wyłączone) i startuje je od nowa."""
+        self.stop()
+        self._assign(shards)
+
+    def _spawn(self, worker, now):
+        self.heartbeats.clear(worker.terrarium_ids)
+        worker.process = self.context.Process(target=self.target, name=f"terrarium-worker-{worker.index}",
+                                              args=(worker.index, worker.terrarium_ids, self.heartbeats))
+        worker.process.start()
+        worker.started = now
+        print(f"Worker {worker.index} started (pid {worker.process.pid}) for terrariums {worker.terrarium_ids}")
+
+    def _stale(self, worker, now):
+        """Id terrarium bez cyklu dłużej niż heartbeat_timeout (albo startup_grace po starcie)."""
+        for terrarium_id in worker.terrarium_ids:
+            last = self.heartbeats.last(terrarium_id)
+            if last is None:
+                if now - worker.started > self.startup_grace:
+                    return terrarium_id
+            elif now - last > self.heartbeat_timeout:
+                return terrarium_id
+        return None
+
+    @staticmethod
+    def _terminate(processes):
+        processes = [process for process in processes if process.is_alive()]
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + TERMINATE_GRACE
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0.0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def _pins(self, terrarium_id):
+        pins = self.pins_for(terrarium_id)
+        if pins:
+            self.last_pins[terrarium_id] = pins
+            return pins
+        return self.last_pins.get(terrarium_id, [])
+
+    def _safe_state(self, terrarium_ids):
+        if self.pins_for is None:
+            return
+        for terrarium_id in terrarium_ids:
+            try:
+                pins = self._pins(terrarium_id)
+            except Exception as e:
+                print(f"Error reading pins for Terrarium ID {terrarium_id}: {e}")
+                continue
+            for pin in pins:
+                if pin["function"] != "pwm":
+                    continue
+                try:
+                    self.safe_off(pin["id"])
+                except Exception as e:
+                    print(f"Error switching off heater on pin {pin['id']}: {e}")
+
+    def _fail(self, worker, reason, now):
+        self._terminate([worker.process])
+        self._safe_state(worker.terrarium_ids)
+        delay = BACKOFF[min(worker.failures, len(BACKOFF) - 1)]
+        print(f"Error in worker {worker.index} (terrariums {worker.terrarium_ids}): {reason}, "
+              f"heaters off, restarting in {delay:.0f}s")
+        worker.process = None
+        worker.restarts += 1
+        worker.failures += 1
+        worker.last_error = reason
+        worker.next_start = now + delay
+
+    def check(self, now=None):
+        """Jeden przegląd workerów: start, wykrycie awarii, restart."""
+        now = time.monotonic() if now is None else now
+        if self.lamp_ids is not None and now >= self.next_config_check:
+            self._check_config(now)
+        for worker in self.workers:
+            process = worker.process
+            if process is None:
+                if now >= worker.next_start:
+                    self._spawn(worker, now)
+                continue
+            if not process.is_alive():
+                self._fail(worker, f"exited with code {process.exitcode}", now)
+                continue
+            stale = self._stale(worker, now)
+            # Worker sam zatrzymuje lampę usuniętą z konfiguracji (kopia na dysku
+            # jest już zapisana), więc cisza może oznaczać zmianę, a nie zawieszenie
+            if stale is not None and self.lamp_ids is not None and self._check_config(now):
+                return
+            if stale is not None:
+                self._fail(worker, f"no heartbeat from Terrarium ID {stale}", now)
+            elif worker.failures and now - worker.started >= HEALTHY_AFTER:
+                worker.failures = 0
+
+    def _check_config(self, now):
+        """Porównuje listę lamp z konfiguracją; zwraca True, gdy workery dostały nowe shardy."""
+        self.next_config_check = now + self.config_interval
+        try:
+            lamp_ids = sorted(self.lamp_ids())
+        except Exception as e:
+            print(f"Error reading terrarium list: {e}")
+            return False
+        current = sorted(terrarium_id for worker in self.workers for terrarium_id in worker.terrarium_ids)
+        resharded = lamp_ids != current
+        if resharded:
+            print(f"Lamp terrariums changed from {current} to {lamp_ids}, restarting workers with new shards")
+            self.reshard(shard(lamp_ids, self.worker_count))
+        if self.pins_for is not None:
+            for terrarium_id in lamp_ids:
+                try:
+                    self._pins(terrarium_id)
+                except Exception as e:
+                    print(f"Error reading pins for Terrarium ID {terrarium_id}: {e}")
+        return resharded
+
+    def _wait(self):
+        # Budzi się od razu, gdy któryś worker się zakończy
+        sentinels = [worker.process.sentinel for worker in self.workers if worker.process is not None]
+        if sentinels:
+            multiprocessing.connection.wait(sentinels, self.check_interval)
+        else:
+            time.sleep(self.check_interval)
+
+    def run(self, should_stop=None):
+        try:
+            while should_stop is None or not should_stop():
+                self.check()
+                self._wait()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Zatrzymuje wszystkie workery i wyłącza wszystkie grzałki."""
+        self._terminate([worker.process for worker in self.workers if worker.process is not None])
+        for worker in self.workers:
+            worker.process = None
+            self._safe_state(worker.terrarium_ids)
+
+    def stats(self):
+        now = time.monotonic()
+        result = {}
+        for worker in self.workers:
+            ages = {}
+            for terrarium_id in worker.terrarium_ids:
+                last = self.heartbeats.last(terrarium_id)
+                ages[terrarium_id] = None if last is None else now - last
+            result[worker.index] = {
+                "alive": worker.process is not None and worker.process.is_alive(),
+                "restarts": worker.restarts,
+                "last_error": worker.last_error,
+                "heartbeat_age": ages,
+            }
+        return result
+
+    def gauges(self):
+        """Kolektor dla metrics.REGISTRY."""
+        gauges = []
+        for index, stats in self.stats().items():
+            labels = {"worker": str(index)}
+            gauges.append(("supervisor_worker_alive", labels, int(stats["alive"])))
+            gauges.append(("supervisor_worker_restarts", labels, stats["restarts"]))
+            for terrarium_id, age in stats["heartbeat_age"].items():
+                if age is not None:
+                    gauges.append(("supervisor_heartbeat_age_seconds", {"terrarium": str(terrarium_id)}, age))
+        return gauges
+
+
+def _demo_worker(index, terrarium_ids, heartbeats):
+    """Sztuczny worker: worker 0 pada po 2 s, worker 1 zawiesza się po 3 s."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    start = time.monotonic()
+    while True:
+        elapsed = time.monotonic() - start
+        if index == 0 and elapsed > 2.0:
+            raise RuntimeError("simulated crash")
+        if index != 1 or elapsed < 3.0:
+            for terrarium_id in terrarium_ids:
+                heartbeats.beat(terrarium_id)
+        time.sleep(0.1)
+
+
+def demo(duration=12.0, workers=3):
+    """Awaria i zawieszenie workerów bez sprzętu; zwraca statystyki nadzorcy."""
+    switched_off = []
+    supervisor = Supervisor(shard(list(range(1, 7)), workers), pins_for=lambda terrarium_id: [
+        {"id": 17 + terrarium_id, "function": "pwm"}], target=_demo_worker, heartbeat_timeout=1.0,
+        startup_grace=10.0, check_interval=0.2, safe_off=lambda pin: switched_off.append((time.monotonic(), pin)))
+    start = time.monotonic()
+    supervisor.run(lambda: time.monotonic() - start > duration)
+    return supervisor.stats(), switched_off
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run 3_temps.py lamps sharded across worker processes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--demo", action="store_true", help="simulated crash and hang without hardware")
+    args = parser.parse_args()
+
+    if args.demo:
+        stats, switched_off = demo()
+        for index, worker_stats in stats.items():
+            print(f"Worker {index}: restarts {worker_stats['restarts']}, last error: {worker_stats['last_error']}")
+        print(f"Heater switch-offs: {len(switched_off)}")
+    else:
+        config = DeviceConfig(args.user_id).ensure_loaded()
+
+        def lamp_ids():
+            # Kopię konfiguracji odświeżają workery, nadzorca tylko ją czyta
+            config.load()
+            return [terrarium["id"] for terrarium in config.terrariums() if terrarium["type"].lower() == "lampa"]
+
+        def pins_for(terrarium_id):
+            config.load()
+            return config.pins_for(terrarium_id)
+
+        supervisor = Supervisor(shard(lamp_ids(), args.workers), pins_for, lamp_ids=lamp_ids,
+                                worker_count=args.workers)
+        metrics.REGISTRY.add_collector(supervisor.gauges)
+        try:
+            metrics_server = metrics.serve()
+        except OSError as e:
+            print(f"Error starting metrics endpoint: {e}")
+            metrics_server = None
+        signal.signal(signal.SIGTERM, _interrupt)
+        try:
+            supervisor.run()
+        except KeyboardInterrupt:
+            print("Supervisor stopped.")
+        finally:
+            if metrics_server is not None:
+                metrics_server.shutdown()
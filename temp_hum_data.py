@@ -2,8 +2,10 @@ import adafruit_dht
 import board
 import time
 from w1thermsensor import W1ThermSensor
-import requests
 from datetime import datetime
+from uplink import Uplink
+from store_forward import DurableQueue
+from compression import TelemetryFilter
 
 # Initialize the sensors
 dht_device = adafruit_dht.DHT22(board.D22)  # DHT22 on GPIO 17
@@ -14,6 +16,20 @@ TERRARIUM_ID = 1
 
 # API endpoint
 API_URL = "http://212.47.71.180:8080/readings"
+
+def report_response(request, response, error):
+    if error is not None:
+        print(f"Error sending data: {error}")
+    elif response.status_code == 200 or response.status_code == 201:
+        print("Data sent successfully!")
+    else:
+        print(f"Failed to send data. Status code: {response.status_code}, Response: {response.text}")
+
+# Send in the background over one keep-alive connection,
+# readings that fail to send wait on disk until the API is back
+uplink = Uplink(store=DurableQueue()).start()
+# Send only when a value moves past its deadband, or at least every 60 s
+telemetry = TelemetryFilter()
 print("XD")
 try:
     while True:
@@ -48,17 +64,16 @@ try:
         }
 
         # Send the data to the API
-        try:
-            response = requests.post(API_URL, json=data)
-            if response.status_code == 200 or response.status_code == 201:
-                print("Data sent successfully!")
-            else:
-                print(f"Failed to send data. Status code: {response.status_code}, Response: {response.text}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error sending data: {e}")
+        if telemetry.update({"dht22_temp": temperature_1, "dht22_humidity": humidity, "ds18b20": temperature_2}):
+            uplink.post(API_URL, json=data, callback=report_response)
 
         # Wait 2 seconds before the next reading
         time.sleep(2)
 
 except KeyboardInterrupt:
     print("Program stopped.")
+finally:
+    if uplink.stop():
+        uplink.store.close()
+    else:
+        print("Error stopping uplink: a request is still in flight, leaving the durable queue open")
@@ -0,0 +1,200 @@
+import collections
+import math
+
+import numpy as np
+
+# Estymator temperatury terrarium (filtr Kalmana) łączący DS18B20, DHT22
+# i DHT11 z modelem FOPDT grzałki (fopdt_ident.py):
+#
+#     dT/dt = (ambient + K * u(t - L) / 100 - T) / tau
+#
+# Stan: [temperatura, otoczenie, przesunięcie DHT22, przesunięcie DHT11].
+# DS18B20 mierzy temperaturę wprost, DHT-y wiszą w innym miejscu, więc każdy
+# ma własne, wolno zmienne przesunięcie estymowane w locie. Brakujący odczyt
+# (None) po prostu pomija aktualizację, a sama predykcja z modelu daje
+# temperaturę i jej pochodną w każdym cyklu pętli, także między
+# konwersjami DS18B20. Odczyty fizycznie niemożliwe (85 °C po resecie
+# DS18B20, spoza VALID_RANGE) są odrzucane zawsze. Odczyty odstające o więcej
+# niż GATE odchyleń są odrzucane tylko pojedynczo: po MAX_REJECTED kolejnych
+# (np. po otwarciu pokrywy, gdy P jest już małe i bramka ma ~0.5 °C) albo
+# gdy estymata wygasła, stan startuje od nowa od odczytu.
+
+STATE_NAMES = ("temperature", "ambient", "dht22_temp", "dht11_temp")
+# Odchylenie standardowe szumu pomiaru [°C] (z rozdzielczością odczytu)
+SENSOR_NOISE = {"ds18b20": 0.1, "dht22_temp": 0.4, "dht11_temp": 1.0}
+# Szum procesu [°C/sqrt(s)]: temperatura, otoczenie, przesunięcia DHT
+PROCESS_NOISE = (0.01, 0.005, 0.001, 0.001)
+GATE = 5.0
+MAX_REJECTED = 3
+VALID_RANGE = (0.0, 60.0)  # °C, poza tym zakresem terrarium to błąd odczytu
+DS18B20_RESET = 85.0  # Wartość rejestru DS18B20 po włączeniu zasilania
+REINIT_VARIANCE = 4.0  # Wariancja stanu po ponownym starcie od odczytu [°C^2]
+
+
+class TemperatureEstimator:
+    def __init__(self, K=17.5, T=750.0, L=64.0, ambient=24.0, sensor_noise=None, process_noise=PROCESS_NOISE,
+                 max_blind=30.0):
+        self.K = K  # °C na 100% mocy
+        self.T = T
+        self.L = L
+        self.sensor_noise = dict(SENSOR_NOISE if sensor_noise is None else sensor_noise)
+        self.process_noise = np.asarray(process_noise, dtype=float)
+        self.max_blind = max_blind  # Po tylu sekundach bez odczytu estymata jest nieważna
+        self.x = np.array([ambient, ambient, 0.0, 0.0])
+        self.P = np.diag([100.0, 25.0, 4.0, 4.0])
+        self.time = 0.0
+        self.last_measurement = None
+        self.initialized = False
+        self.rejected = 0
+        self._rejected_in_row = {}
+        # Historia (czas, moc) na potrzeby opóźnienia transportowego L
+        self._power = collections.deque([(0.0, 0.0)])
+
+    def _delayed_power(self):
+        while len(self._power) > 1 and self._power[1][0] <= self.time - self.L:
+            self._power.popleft()
+        return self._power[0][1]
+
+    def predict(self, dt, power):
+        """Przesuwa stan o dt sekund; power to moc grzałki [%] przyłożona w tym czasie."""
+        if dt <= 0:
+            return
+        # Moc z chwili t - L działa teraz; dokładna dyskretyzacja członu inercyjnego
+        self._power.append((self.time, power))
+        self.time += dt
+        decay = math.exp(-dt / self.T)
+        gain = 1.0 - decay
+        F = np.eye(4)
+        F[0, 0] = decay
+        F[0, 1] = gain
+        self.x = F @ self.x
+        self.x[0] += gain * self.K * self._delayed_power() / 100.0
+        self.P = F @ self.P @ F.T + np.diag(self.process_noise ** 2 * dt)
+
+    def update(self, name, value):
+        """Aktualizacja jednym odczytem ("ds18b20", "dht22_temp", "dht11_temp"); None jest pomijane."""
+        if value is None or name not in self.sensor_noise:
+            return False
+        if not VALID_RANGE[0] <= value <= VALID_RANGE[1] or (name == "ds18b20" and value == DS18B20_RESET):
+            self.rejected += 1
+            return False
+        if not self.initialized:
+            # Pierwszy odczyt: temperatura i otoczenie startują od niego
+            self.x[0] = self.x[1] = value
+            self.initialized = True
+        elif not self.valid or self._rejected_in_row.get(name, 0) >= MAX_REJECTED:
+            self._restart(name, value)
+        H = np.zeros(4)
+        H[0] = 1.0
+        if name != "ds18b20":
+            H[STATE_NAMES.index(name)] = 1.0
+        variance = self.sensor_noise[name] ** 2
+        innovation = value - H @ self.x
+        S = H @ self.P @ H + variance
+        if innovation ** 2 > GATE ** 2 * S:
+            self.rejected += 1
+            self._rejected_in_row[name] = self._rejected_in_row.get(name, 0) + 1
+            return False
+        self._rejected_in_row[name] = 0
+        gain = self.P @ H / S
+        self.x = self.x + gain * innovation
+        self.P = self.P - np.outer(gain, H @ self.P)
+        self.last_measurement = self.time
+        return True
+
+    def _restart(self, name, value):
+        """Stan od nowa od odczytu, który bramka odrzucała (skok temperatury albo przesunięcia DHT)."""
+        if name == "ds18b20" or not self.valid:
+            # Temperatura (DHT: z jego przesunięciem) od odczytu, bez korelacji ze starym stanem
+            index = 0
+            self.x[0] = value if name == "ds18b20" else value - self.x[STATE_NAMES.index(name)]
+        else:
+            # Estymata ważna, ale DHT się z nią rozjechał: od nowa tylko jego przesunięcie
+            index = STATE_NAMES.index(name)
+            self.x[index] = value - self.x[0]
+        self.P[index, :] = 0.0
+        self.P[:, index] = 0.0
+        self.P[index, index] = REINIT_VARIANCE
+        for other in self._rejected_in_row:
+            if index == 0 or other == name:
+                self._rejected_in_row[other] = 0
+
+    def step(self, dt, power, readings):
+        """Predykcja o dt i aktualizacja dostępnymi odczytami; zwraca (temperatura, °C/s)."""
+        self.predict(dt, power)
+        for name, value in readings.items():
+            self.update(name, value)
+        return self.temperature, self.rate
+
+    @property
+    def valid(self):
+        return self.last_measurement is not None and self.time - self.last_measurement <= self.max_blind
+
+    @property
+    def temperature(self):
+        return float(self.x[0]) if self.valid else None
+
+    @property
+    def rate(self):
+        """Pochodna temperatury z modelu [°C/s]."""
+        if not self.valid:
+            return None
+        return float((self.x[1] + self.K * self._delayed_power() / 100.0 - self.x[0]) / self.T)
+
+    def offsets(self):
+        """Estymowane przesunięcia DHT względem DS18B20 [°C]."""
+        return {name: float(self.x[STATE_NAMES.index(name)]) for name in ("dht22_temp", "dht11_temp")}
+
+
+def simulate(duration=3600.0, dt=1.0, seed=0, K=17.5, T=750.0, L=64.0, ambient=24.0):
+    """Porównanie estymaty z surowym DS18B20 na symulowanym obiekcie FOPDT.
+
+    DS18B20: krok 1/16 °C, odczyt co drugi cykl (konwersja); DHT22 z
+    przesunięciem +1.5 °C; DHT11 z krokiem 1 °C, przesunięciem -1 °C
+    i 20% brakujących odczytów. Zwraca RMSE temperatury i pochodnej.
+    """
+    rng = np.random.default_rng(seed)
+    estimator = TemperatureEstimator(K, T, L, ambient)
+    state = ambient
+    powers = collections.deque([0.0] * int(round(L / dt)))
+    last_ds18b20 = None
+    rows = []
+    for i in range(int(duration / dt)):
+        power = 100.0 if (i * dt) % 1200 < 600 else 20.0
+        delayed = powers.popleft()
+        powers.append(power)
+        target = ambient + K * delayed / 100.0
+        true_rate = (target - state) / T
+        state = target + (state - target) * math.exp(-dt / T)
+        readings = {
+            "ds18b20": None,
+            "dht22_temp": round(state + 1.5 + rng.normal(0, 0.3), 1),
+            "dht11_temp": None if rng.random() < 0.2 else float(round(state - 1.0 + rng.normal(0, 0.5))),
+        }
+        if i % 2 == 0:
+            readings["ds18b20"] = last_ds18b20 = math.floor((state + rng.normal(0, 0.05)) * 16) / 16
+        estimate, rate = estimator.step(dt, power, readings)
+        rows.append((state, true_rate, last_ds18b20, estimate, rate))
+    data = np.array(rows[int(600 / dt):], dtype=float)  # Bez rozbiegu filtra
+    raw_rate = np.gradient(data[:, 2], dt)
+    return {
+        "ds18b20_rmse": float(np.sqrt(np.mean((data[:, 2] - data[:, 0]) ** 2))),
+        "estimate_rmse": float(np.sqrt(np.mean((data[:, 3] - data[:, 0]) ** 2))),
+        "ds18b20_rate_rmse": float(np.sqrt(np.mean((raw_rate - data[:, 1]) ** 2))),
+        "estimate_rate_rmse": float(np.sqrt(np.mean((data[:, 4] - data[:, 1]) ** 2))),
+        "offsets": estimator.offsets(),
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    results = simulate()
+    for key, value in results.items():
+        print(f"{key}: {value}")
+    estimator = TemperatureEstimator()
+    count = 20000
+    start = time.perf_counter()
+    for i in range(count):
+        estimator.step(1.0, 50.0, {"ds18b20": 30.0, "dht22_temp": 31.0, "dht11_temp": None})
+    print(f"step(): {(time.perf_counter() - start) / count * 1e6:.1f} us")
@@ -1,6 +1,6 @@
 import time
 from w1thermsensor import W1ThermSensor
-import csv
+from csv_logger import CsvLogger
 from datetime import datetime
 
 # Ścieżka do pliku CSV
@@ -9,26 +9,23 @@ output_file = "ds18b20_readings.csv"
 # Funkcja zapisująca nagłówki do pliku (jeśli jeszcze nie istnieją)
 def initialize_csv(file_path):
     try:
-        with open(file_path, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            # Nagłówki kolumn
-            writer.writerow(["Timestamp", "Temperature"])
+        # Nagłówki kolumn, plik zostaje otwarty do końca programu
+        csv_log = CsvLogger(file_path, ["Timestamp", "Temperature"])
         print(f"Plik {file_path} został zainicjalizowany.")
+        return csv_log
     except Exception as e:
         print(f"Błąd przy inicjalizacji pliku: {e}")
 
 # Funkcja zapisująca odczyty do pliku
-def save_reading_to_csv(file_path, timestamp, temperature):
+def save_reading_to_csv(csv_log, timestamp, temperature):
     try:
-        with open(file_path, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([timestamp, temperature])
+        csv_log.write_row([timestamp, temperature])
         print(f"Zapisano: {timestamp}, {temperature:.2f}°C")
     except Exception as e:
         print(f"Błąd przy zapisie do pliku: {e}")
 
 # Inicjalizacja pliku CSV
-initialize_csv(output_file)
+csv_log = initialize_csv(output_file)
 
 # Inicjalizacja sensora DS18B20
 sensor = W1ThermSensor()
@@ -42,7 +39,7 @@ try:
             # Aktualny czas
             timestamp = datetime.now().isoformat()
             # Zapis odczytu do pliku
-            save_reading_to_csv(output_file, timestamp, temperature)
+            save_reading_to_csv(csv_log, timestamp, temperature)
         except Exception as e:
             print(f"Błąd przy odczycie z sensora: {e}")
         
@@ -51,4 +48,7 @@ try:
 
 except KeyboardInterrupt:
     print("Zatrzymano odczytywanie temperatur.")
+finally:
+    if csv_log is not None:
+        csv_log.close()
 
@@ -0,0 +1,152 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+from actuators import SlowPWMDriver, SysfsPWM, force_off, open_actuator, write_fake_pwm_tree
+import hardware_sim
+from hardware_sim import VirtualClock
+
+
+def read(path, name):
+    with open(os.path.join(path, name)) as file:
+        return int(file.read().strip())
+
+
+def write(path, name, value):
+    with open(os.path.join(path, name), "w") as file:
+        file.write(f"{value}\n")
+
+
+class FakeGPIO:
+    BCM = "BCM"
+    OUT = "OUT"
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self):
+        self.levels = {}
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, mode, initial=None):
+        if initial is not None:
+            self.levels[pin] = initial
+
+    def output(self, pin, value):
+        self.levels[pin] = value
+
+
+def test_hardware_pwm_writes_duty_in_nanoseconds(tmp_path):
+    write_fake_pwm_tree(str(tmp_path))
+    pwm = open_actuator(18, base_path=str(tmp_path))
+    assert isinstance(pwm, SysfsPWM)
+    pwm.start(100)  # Odwrócona logika: grzałka wyłączona
+    assert read(pwm.path, "period") == 10000000
+    assert read(pwm.path, "duty_cycle") == 10000000
+    assert read(pwm.path, "enable") == 1
+    pwm.ChangeDutyCycle(25.0)
+    assert read(pwm.path, "duty_cycle") == 2500000
+    pwm.ChangeDutyCycle(150)
+    assert read(pwm.path, "duty_cycle") == 10000000
+
+
+def test_reopened_channel_keeps_current_duty(tmp_path):
+    write_fake_pwm_tree(str(tmp_path))
+    channel = os.path.join(str(tmp_path), "pwmchip0", "pwm0")
+    write(channel, "period", 10000000)
+    write(channel, "duty_cycle", 10000000)
+    pwm = SysfsPWM(0, frequency=100, base_path=str(tmp_path))
+    assert pwm.duty == 100.0
+    assert read(channel, "duty_cycle") == 10000000
+
+
+@pytest.mark.parametrize("frequency", [1000, 10])
+def test_change_frequency_keeps_duty_within_period(tmp_path, monkeypatch, frequency):
+    write_fake_pwm_tree(str(tmp_path))
+    pwm = SysfsPWM(0, frequency=100, base_path=str(tmp_path))
+    pwm.start(80)
+    state = {"period": pwm.period_ns, "duty_cycle": read(pwm.path, "duty_cycle")}
+    written = SysfsPWM._write
+
+    def checked_write(path, value):
+        state[os.path.basename(path)] = value
+        # Jądro odrzuca duty_cycle > period (EINVAL)
+        assert state["duty_cycle"] <= state["period"]
+        written(path, value)
+
+    monkeypatch.setattr(SysfsPWM, "_write", staticmethod(checked_write))
+    pwm.ChangeFrequency(frequency)
+    period_ns = int(round(1e9 / frequency))
+    assert read(pwm.path, "period") == period_ns
+    assert read(pwm.path, "duty_cycle") == int(period_ns * 0.8)
+
+
+def test_force_off_sets_full_duty_on_hardware_pwm(tmp_path):
+    write_fake_pwm_tree(str(tmp_path))
+    pwm = open_actuator(18, base_path=str(tmp_path))
+    pwm.start(0)  # Grzałka włączona, proces ginie
+    force_off(18, gpio=FakeGPIO(), base_path=str(tmp_path))
+    assert read(pwm.path, "duty_cycle") == read(pwm.path, "period")
+    assert read(pwm.path, "enable") == 1
+
+
+def test_force_off_drives_gpio_high_without_hardware_pwm(tmp_path):
+    gpio = FakeGPIO()
+    force_off(17, gpio=gpio, base_path=str(tmp_path))
+    assert gpio.levels == {17: FakeGPIO.HIGH}
+
+
+@pytest.mark.parametrize("mode", ["sigma_delta", "window"])
+def test_slow_pwm_average_matches_duty(mode):
+    clock = VirtualClock()
+    gpio = FakeGPIO()
+    driver = SlowPWMDriver(tick=0.1, gpio=gpio, clock=clock.monotonic)
+    output = driver.output(4, mode=mode, window=2.0)
+    output.ChangeDutyCycle(30)
+    driver.outputs = [output]
+    high = 0
+    for _ in range(1000):
+        driver.step()
+        high += output.state
+        clock.advance(0.1)
+    assert high == pytest.approx(300, abs=2)
+
+
+@pytest.fixture
+def temps(monkeypatch):
+    """3_temps.py zaimportowany na podróbkach sprzętu z hardware_sim."""
+    clock = VirtualClock()
+    for name, module in hardware_sim.fake_modules(hardware_sim.PlantBackend(clock), clock).items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, "3_temps", raising=False)
+    yield importlib.import_module("3_temps")
+    sys.modules.pop("3_temps", None)
+
+
+def test_release_leaves_hardware_pwm_heater_off(tmp_path, temps):
+    write_fake_pwm_tree(str(tmp_path))
+    pwm = open_actuator(18, base_path=str(tmp_path))
+    pwm.start(0)  # Grzałka na pełnej mocy
+    temps.TerrariumLamp(1, pwm_pin=pwm).release()
+    # Wyłączony kanał dałby stan niski, czyli włączoną grzałkę
+    assert read(pwm.path, "enable") == 1
+    assert read(pwm.path, "duty_cycle") == read(pwm.path, "period")
+
+
+def test_release_leaves_ssr_heater_off(temps):
+    gpio = FakeGPIO()
+    driver = SlowPWMDriver(tick=0.1, gpio=gpio, clock=VirtualClock().monotonic)
+    output = driver.output(4)
+    output.ChangeDutyCycle(0)
+    driver.outputs = [output]
+    driver.step()
+    assert gpio.levels[4] == FakeGPIO.LOW
+    temps.TerrariumLamp(1, pwm_pin=output).release()
+    assert gpio.levels[4] == FakeGPIO.HIGH
+    assert output not in driver.outputs
@@ -0,0 +1,78 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from async_poller import AsyncSensorReader, LampLoop
+from sensor_cache import SensorCache, sensor_key
+from temperature_estimator import TemperatureEstimator
+
+
+class FailingProbe:
+    """DS18B20, który po pierwszym odczycie znika z magistrali."""
+
+    id = "3ce1d4433914"
+
+    def __init__(self):
+        self.reads = 0
+
+    def get_temperature(self):
+        self.reads += 1
+        if self.reads > 1:
+            raise OSError("sensor not found")
+        return 25.0
+
+
+def test_failed_read_is_not_served_from_cache():
+    async def scenario():
+        reader = AsyncSensorReader(ThreadPoolExecutor(max_workers=2), max_age=1.0)
+        probe = FailingProbe()
+        errors = reader.read_errors.value
+        values = [await reader.read_ds18b20(probe) for _ in range(3)]
+        return values, reader.read_errors.value - errors
+
+    values, errors = asyncio.run(scenario())
+    assert values == [25.0, None, None]
+    assert errors == 2
+
+
+def test_hung_read_serves_only_recent_value():
+    now = [100.0]
+    cache = SensorCache(clock=lambda: now[0])
+    reader = AsyncSensorReader(ThreadPoolExecutor(max_workers=1), cache=cache, max_age=1.0)
+    probe = FailingProbe()
+    cache.update(probe, 24.5)
+    # Poprzedni odczyt wciąż trwa w puli
+    reader._busy.add(sensor_key(probe))
+    assert asyncio.run(reader.read_ds18b20(probe)) == 24.5
+    now[0] += 5.0
+    assert asyncio.run(reader.read_ds18b20(probe)) is None
+
+
+class _Lamp:
+    def __init__(self, ds18b20):
+        self.terrarium_id = 1
+        self.ds18b20 = ds18b20
+        self.dht22_t1 = None
+        self.dht11_t2 = None
+        self.pwm_pin = None
+
+
+class _Controller:
+    def compute(self, setpoint, measured_value):
+        return 0.0, setpoint - measured_value, 0.0, 0.0, 0.0
+
+
+def test_repeated_cached_ds18b20_value_does_not_keep_estimate_alive():
+    now = [100.0]
+    cache = SensorCache(clock=lambda: now[0])
+    reader = AsyncSensorReader(ThreadPoolExecutor(max_workers=1), cache=cache)
+    probe = FailingProbe()
+    cache.update(probe, 30.0)
+    # Zawieszony odczyt: każdy cykl dostaje tę samą wartość z bufora
+    reader._busy.add(sensor_key(probe))
+    estimator = TemperatureEstimator(max_blind=5.0)
+    lamp_loop = LampLoop(_Lamp(probe), _Controller(), 34.0, 1.0, estimator)
+    lamp_loop._ds18b20_source = lamp_loop.ds18b20 = probe
+    for _ in range(10):
+        asyncio.run(lamp_loop.step(reader))
+        estimator.time += 1.0  # Cykle co sekundę bez czekania w teście
+    assert not estimator.valid
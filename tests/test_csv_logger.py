@@ -0,0 +1,23 @@
+import csv
+import glob
+import os
+
+from csv_logger import CsvLogger
+
+
+def test_rotations_within_one_second_keep_every_file(tmp_path):
+    path = str(tmp_path / "log.csv")
+    logger = CsvLogger(path, ["Time (s)", "Temperature (°C)"], flush_rows=1, max_bytes=60)
+    for i in range(20):
+        logger.write_row([i, 24.0625])
+    logger.close()
+    files = glob.glob(str(tmp_path / "log*.csv"))
+    assert len(files) > 2
+    times = []
+    for name in files:
+        with open(name, newline="", encoding="utf-8") as file:
+            rows = list(csv.reader(file))
+        assert rows[0] == ["Time (s)", "Temperature (°C)"]
+        times += [int(row[0]) for row in rows[1:]]
+    assert sorted(times) == list(range(20))
+    assert os.path.exists(path)
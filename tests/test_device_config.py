@@ -0,0 +1,76 @@
+import json
+
+import requests
+
+from device_config import DeviceConfig
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.status_code = 200
+        self.headers = {}
+        self.content = json.dumps(data).encode()
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    """API terrariów i pinów; pins_down udaje awarię tylko zasobu pinów."""
+
+    def __init__(self, terrariums, pins):
+        self.terrariums = terrariums
+        self.pins = pins
+        self.pins_down = False
+
+    def get(self, url, headers=None, timeout=None):
+        if "/pins/" in url:
+            if self.pins_down:
+                raise requests.ConnectionError("pins endpoint down")
+            return FakeResponse(self.pins)
+        return FakeResponse(self.terrariums)
+
+
+def make_config(tmp_path, session):
+    return DeviceConfig(1, path=str(tmp_path / "device_config.json"), session=session)
+
+
+def test_refresh_reports_added_removed_and_retyped_terrariums(tmp_path):
+    session = FakeSession([{"id": 1, "type": "lampa"}, {"id": 2, "type": "lampa"}],
+                          [{"terrarium_id": 1, "function": "pwm", "id": 18}])
+    config = make_config(tmp_path, session)
+    changes = []
+    config.subscribe(lambda config, changed_ids: changes.append(changed_ids))
+    assert config.refresh() == {1, 2}
+    session.terrariums = [{"id": 1, "type": "lampa"}, {"id": 2, "type": "mata"}, {"id": 3, "type": "lampa"}]
+    assert config.refresh() == {2, 3}
+    session.terrariums = [{"id": 2, "type": "mata"}, {"id": 3, "type": "lampa"}]
+    assert config.refresh() == {1}
+    assert config.terrarium(1) is None
+    assert changes == [{1, 2}, {2, 3}, {1}]
+
+
+def test_change_made_during_pins_outage_is_reported_later(tmp_path):
+    session = FakeSession([{"id": 1, "type": "lampa"}], [{"terrarium_id": 1, "function": "pwm", "id": 18}])
+    config = make_config(tmp_path, session)
+    config.refresh()
+    session.terrariums = [{"id": 1, "type": "mata"}]
+    session.pins_down = True
+    assert config.refresh() is None
+    session.pins_down = False
+    assert config.refresh() == {1}
+    assert config.terrarium(1)["type"] == "mata"
+    assert config.refresh() == set()
+
+
+def test_snapshot_restores_indexes(tmp_path):
+    session = FakeSession([{"id": 1, "type": "lampa"}], [{"terrarium_id": 1, "function": "pwm", "id": 18}])
+    make_config(tmp_path, session).refresh()
+    restored = make_config(tmp_path, None)
+    assert restored.load()
+    assert restored.terrarium(1) == {"id": 1, "type": "lampa"}
+    assert restored.pins_for(1) == [{"terrarium_id": 1, "function": "pwm", "id": 18}]
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from sample_ring import SampleRing
+
+
+@pytest.fixture
+def ring():
+    # Własny segment na proces testów, żeby nie trafić w bufor działającego samplera
+    ring = SampleRing.create(["1.ds18b20", "1.dht22_temp"], slots=8, key=0x7E5700 + os.getpid() % 0xFF,
+                             name=f"terrarium_ring_test_{os.getpid()}")
+    yield ring
+    ring.close()
+
+
+def test_window_without_retries_reads_once(ring):
+    for i in range(3):
+        ring.write(100.0 + i, [30.0 + i, 25.0])
+    times, values = ring.window(2, retries=0)
+    assert list(times) == [101.0, 102.0]
+    assert values[:, 0].tolist() == [31.0, 32.0]
+
+
+def test_torn_slot_is_skipped_after_retries(ring):
+    for i in range(3):
+        ring.write(100.0 + i, [30.0 + i, 25.0])
+    # Zapis w toku: nieparzysty licznik slotu
+    ring._table["seq"][1] += 1
+    for retries in (0, 3):
+        times, _ = ring.window(3, retries=retries)
+        assert list(times) == [100.0, 102.0]
@@ -0,0 +1,69 @@
+import time
+
+from supervisor import Supervisor
+
+
+class FakeProcess:
+    pid = 0
+    sentinel = None
+    exitcode = None
+
+    def __init__(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.alive = False
+
+    kill = terminate
+
+    def join(self, timeout=None):
+        pass
+
+
+def make_supervisor(monkeypatch, lamp_ids):
+    def spawn(self, worker, now):
+        self.heartbeats.clear(worker.terrarium_ids)
+        worker.process = FakeProcess()
+        worker.started = now
+
+    monkeypatch.setattr(Supervisor, "_spawn", spawn)
+    switched_off = []
+    supervisor = Supervisor([sorted(lamp_ids)], pins_for=lambda terrarium_id: [{"id": 17 + terrarium_id,
+                                                                                "function": "pwm"}],
+                            heartbeat_timeout=1.0, config_interval=100.0, safe_off=switched_off.append,
+                            lamp_ids=lambda: list(lamp_ids), worker_count=1)
+    return supervisor, switched_off
+
+
+def silence(supervisor, terrarium_id, seconds):
+    supervisor.heartbeats.times[supervisor.heartbeats.index[terrarium_id]] = time.monotonic() - seconds
+
+
+def test_lamp_removed_by_worker_is_resharded_not_failed(monkeypatch):
+    lamp_ids = [1, 2]
+    supervisor, switched_off = make_supervisor(monkeypatch, lamp_ids)
+    supervisor.check()
+    supervisor.heartbeats.beat(2)
+    # Worker zatrzymał lampę 1 po zmianie konfiguracji, zanim nadzorca ją sprawdził
+    lamp_ids.remove(1)
+    silence(supervisor, 1, 5.0)
+    supervisor.check()
+    worker = supervisor.workers[0]
+    assert worker.terrarium_ids == [2]
+    assert worker.failures == 0 and worker.restarts == 0
+    assert 18 in switched_off
+
+
+def test_silent_lamp_still_in_config_is_a_hang(monkeypatch):
+    supervisor, switched_off = make_supervisor(monkeypatch, [1, 2])
+    supervisor.check()
+    supervisor.heartbeats.beat(2)
+    silence(supervisor, 1, 5.0)
+    supervisor.check()
+    worker = supervisor.workers[0]
+    assert worker.failures == 1
+    assert worker.last_error == "no heartbeat from Terrarium ID 1"
+    assert sorted(switched_off) == [18, 19]
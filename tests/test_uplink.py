@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from uplink import Uplink
+
+
+class CountingServer:
+    """Lokalny serwer HTTP liczący żądania, elementy paczek i połączenia."""
+
+    def __init__(self, delay=0.0, status=200):
+        self.requests = 0
+        self.items = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+        counter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def _reply(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(delay)
+                with counter.lock:
+                    counter.requests += 1
+                    counter.items += len(json.loads(body)) if self.path.endswith("/batch") else 1
+                    counter.connections.add(self.client_address)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_PUT = _reply
+            do_POST = _reply
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server():
+    server = CountingServer()
+    yield server
+    server.close()
+
+
+PARAMS = {"current_temperature1": 24.5, "current_temperature2": 24.0, "current_hum": 60.0}
+
+
+def test_throughput_over_keep_alive_session(server):
+    count = 500
+    uplink = Uplink(max_queue=count).start()
+    for i in range(count):
+        uplink.put(f"{server.url}/terrariums/update/{i % 8}", params=PARAMS)
+    uplink.stop(timeout=30)
+    assert server.requests == count
+    assert uplink.sent == count and uplink.failed == 0 and uplink.dropped == 0
+    # Jeden wątek wysyłający: wszystko przez jedno połączenie keep-alive
+    assert len(server.connections) == 1
+
+
+def test_batching_sends_one_request_per_batch(server):
+    uplink = Uplink(max_queue=256, batch_url=f"{server.url}/terrariums/update/batch", batch_size=32)
+    # Kolejka zapełniona przed startem wątku, więc paczki są pełne
+    for i in range(256):
+        uplink.put(f"{server.url}/terrariums/update/{i % 8}", params=PARAMS,
+                   batch_payload=dict(PARAMS, terrarium_id=i % 8))
+    uplink.start().stop(timeout=30)
+    assert server.items == 256
+    assert server.requests == 256 // 32
+
+
+def test_enqueue_does_not_wait_for_slow_backend():
+    slow = CountingServer(delay=0.05)
+    try:
+        uplink = Uplink(max_queue=100).start()
+        start = time.perf_counter()
+        for i in range(20):
+            uplink.put(f"{slow.url}/terrariums/update/{i}", params=PARAMS)
+        enqueue_time = time.perf_counter() - start
+        # Wysyłka 20 żądań trwa co najmniej 1 s, dodanie do kolejki - ułamek jednego
+        assert enqueue_time < 0.05
+        uplink.stop(timeout=30)
+        assert slow.requests == 20
+    finally:
+        slow.close()
+
+
+def test_full_queue_drops_oldest_without_blocking():
+    uplink = Uplink(max_queue=10)
+    for i in range(25):
+        uplink.put(f"http://127.0.0.1:9/update/{i}")
+    assert uplink.pending() == 10
+    assert uplink.dropped == 15
+    assert uplink.queue.get_nowait().url.endswith("/update/15")
+
+
+def test_server_errors_count_as_failed():
+    failing = CountingServer(status=503)
+    try:
+        uplink = Uplink(max_queue=10).start()
+        for i in range(5):
+            uplink.put(f"{failing.url}/terrariums/update/{i}", params=PARAMS)
+        uplink.stop(timeout=30)
+        assert failing.requests == 5
+        assert uplink.sent == 0 and uplink.failed == 5
+    finally:
+        failing.close()
+
+
+def test_stop_reports_request_still_in_flight():
+    slow = CountingServer(delay=0.5)
+    try:
+        uplink = Uplink().start()
+        uplink.put(f"{slow.url}/terrariums/update/1", params=PARAMS)
+        time.sleep(0.1)
+        assert uplink.stop(timeout=0.05) is False
+        assert uplink.stop(timeout=5) is True
+        assert slow.requests == 1
+    finally:
+        slow.close()
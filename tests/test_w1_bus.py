@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from w1_bus import CONVERSION_TIMES, W1BusReader, parse_w1_slave, write_fake_w1_tree
+
+TEMPERATURES = {"3ce1d4433914": 21.5, "0316a2794e0c": 34.25, "01191ea1a8ff": 28.0}
+
+
+def test_bulk_read_triggers_one_conversion(tmp_path):
+    write_fake_w1_tree(str(tmp_path), TEMPERATURES)
+    bus = W1BusReader(str(tmp_path))
+    assert bus.supports_bulk_read()
+    assert bus.read_all() == TEMPERATURES
+    with open(bus.bus_masters()[0]) as file:
+        assert file.read().strip() == "trigger"
+
+
+def test_bulk_read_uses_converted_temperature(tmp_path):
+    write_fake_w1_tree(str(tmp_path), TEMPERATURES)
+    bus = W1BusReader(str(tmp_path))
+    # Po wspólnej konwersji w1_slave (nowa konwersja) nie jest czytany
+    os.remove(bus._sensor_path("3ce1d4433914", "w1_slave"))
+    assert bus.read_all(["3ce1d4433914"]) == {"3ce1d4433914": 21.5}
+
+
+def test_per_sensor_fallback_on_older_kernel(tmp_path):
+    write_fake_w1_tree(str(tmp_path), TEMPERATURES, bulk_read=False)
+    bus = W1BusReader(str(tmp_path))
+    assert not bus.supports_bulk_read()
+    assert bus.read_all() == TEMPERATURES
+
+
+def test_bulk_read_can_be_disabled(tmp_path):
+    write_fake_w1_tree(str(tmp_path), TEMPERATURES)
+    with open(os.path.join(tmp_path, "28-3ce1d4433914", "temperature"), "w") as file:
+        file.write("99000\n")
+    bus = W1BusReader(str(tmp_path), use_bulk_read=False)
+    assert bus.read_all()["3ce1d4433914"] == 21.5
+
+
+def test_crc_error_and_reset_value_are_missing(tmp_path):
+    write_fake_w1_tree(str(tmp_path), {"3ce1d4433914": 85.0, "0316a2794e0c": 30.0}, bulk_read=False)
+    with open(os.path.join(tmp_path, "28-0316a2794e0c", "w1_slave"), "w") as file:
+        file.write("e0 01 4b 46 7f ff 0c 10 1c : crc=00 NO\ne0 01 4b 46 7f ff 0c 10 1c t=30000\n")
+    assert W1BusReader(str(tmp_path)).read_all() == {"3ce1d4433914": None, "0316a2794e0c": None}
+
+
+def test_set_resolution_shortens_bus_conversion(tmp_path):
+    write_fake_w1_tree(str(tmp_path), TEMPERATURES)
+    bus = W1BusReader(str(tmp_path))
+    for sensor_id in TEMPERATURES:
+        bus.set_resolution(sensor_id, 9)
+    with open(bus._sensor_path("3ce1d4433914", "resolution")) as file:
+        assert file.read().strip() == "9"
+    assert bus.conversion_time == CONVERSION_TIMES[9]
+    # Wspólna konwersja czeka na najwolniejszy czujnik
+    bus.set_resolution("0316a2794e0c", 12)
+    assert bus.conversion_time == CONVERSION_TIMES[12]
+    with pytest.raises(ValueError):
+        bus.set_resolution("0316a2794e0c", 13)
+
+
+def test_parse_w1_slave():
+    assert parse_w1_slave("72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n72 01 4b 46 7f ff 0e 10 57 t=23125\n") == 23.125
+    assert parse_w1_slave("72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n") is None
+
+
+def test_bulk_timeout_falls_back_to_w1_slave(tmp_path, monkeypatch):
+    write_fake_w1_tree(str(tmp_path), TEMPERATURES)
+    bus = W1BusReader(str(tmp_path))
+    # Wynik poprzedniej konwersji w atrybucie temperature
+    with open(bus._sensor_path("3ce1d4433914", "temperature"), "w") as file:
+        file.write("19000\n")
+    monkeypatch.setattr(bus, "_wait_for_conversion", lambda masters: False)
+    assert bus.read_all() == TEMPERATURES
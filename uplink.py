@@ -0,0 +1,289 @@
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import REGISTRY
+
+# Wysyłka telemetrii w tle przez jedną sesję HTTP z pulą połączeń keep-alive.
+# Pętla sterowania tylko wrzuca żądanie do ograniczonej kolejki i wraca od razu;
+# gdy kolejka jest pełna, najstarsze żądanie jest porzucane albo, jeśli podano
+# store (store_forward.DurableQueue), zapisywane na dysk.
+
+
+class UplinkRequest:
+    __slots__ = ("method", "url", "params", "json", "callback", "batch_payload", "coalesce_key", "created")
+
+    def __init__(self, method, url, params=None, json=None, callback=None, batch_payload=None, coalesce_key=None):
+        self.method = method
+        self.url = url
+        self.params = params
+        self.json = json
+        self.callback = callback
+        self.batch_payload = batch_payload
+        self.coalesce_key = coalesce_key
+        self.created = time.time()
+
+
+class Uplink:
+    """Kolejka żądań HTTP obsługiwana przez wątek w tle.
+
+    callback(request, response, error) wywoływany jest w wątku wysyłającym.
+    Gdy podano batch_url, żądania z batch_payload są łączone w jedną listę
+    JSON (do batch_size elementów) i wysyłane jednym POST.
+
+    Z trwałą kolejką store żądania, które nie doszły (błąd połączenia lub
+    odpowiedź 5xx), trafiają na dysk. Dopóki API nie odpowiada, nowe żądania
+    od razu idą do store, a wątek co retry_min..retry_max sekund (backoff
+    wykładniczy) próbuje wysłać zaległe wpisy, od najstarszych.
+    """
+
+    def __init__(self, max_queue=1000, batch_url=None, batch_size=32, pool_size=4, timeout=5.0, session=None,
+                 store=None, retry_min=1.0, retry_max=300.0):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.store = store
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self._retry_delay = retry_min
+        self._next_attempt = 0.0  # Do tego czasu API uznajemy za niedostępne
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="uplink", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Wysyła to, co zostało w kolejce (maks. timeout sekund) i zatrzymuje wątek.
+
+        Zwraca False, gdy wątek nie zdążył się zakończyć: żądanie w drodze
+        może jeszcze zapisać do store, więc nie wolno go wtedy zamykać.
+        """
+        if self._thread is None:
+            return True
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        self._thread = None
+        return True
+
+    def submit(self, request):
+        # Nigdy nie blokuje wywołującego
+        while True:
+            try:
+                self.queue.put_nowait(request)
+                return
+            except queue.Full:
+                try:
+                    oldest = self.queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if self.store is not None:
+                    self._persist(oldest)
+                else:
+                    self.dropped += 1
+
+    def put(self, url, params=None, json=None, callback=None, batch_payload=None, coalesce_key=None):
+        self.submit(UplinkRequest("PUT", url, params, json, callback, batch_payload, coalesce_key))
+
+    def post(self, url, params=None, json=None, callback=None, batch_payload=None, coalesce_key=None):
+        self.submit(UplinkRequest("POST", url, params, json, callback, batch_payload, coalesce_key))
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                request = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                self._drain()
+                continue
+            batch = [request]
+            if self.batch_url is not None and request.batch_payload is not None:
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            self._send(batch)
+
+    def _backend_down(self):
+        return self.store is not None and time.monotonic() < self._next_attempt
+
+    def _mark_failure(self):
+        self._next_attempt = time.monotonic() + self._retry_delay
+        self._retry_delay = min(self._retry_delay * 2, self.retry_max)
+
+    def _mark_success(self):
+        self._retry_delay = self.retry_min
+        self._next_attempt = 0.0
+
+    def _persist(self, request):
+        try:
+            self.store.append(request.method, request.url, request.params, request.json,
+                              request.batch_payload, request.coalesce_key, request.created)
+        except Exception as e:
+            self.dropped += 1
+            print(f"Error saving request to durable queue: {e}")
+
+    def _drain(self, limit=100):
+        """Wysyła zaległe wpisy z dysku, od najstarszych, aż do pierwszego błędu."""
+        if self.store is None or not len(self.store) or self._backend_down():
+            return
+        items = self.store.peek(limit)
+        batched = [item for item in items if self.batch_url is not None and item["batch_payload"] is not None]
+        single = [item for item in items if item not in batched]
+        sent_ids = []
+        attempts = [([item["id"] for item in batched], "POST", self.batch_url, None,
+                     [item["batch_payload"] for item in batched])] if batched else []
+        attempts += [([item["id"]], item["method"], item["url"], item["params"], item["json"]) for item in single]
+        for ids, method, url, params, json in attempts:
+            try:
+                response = self.session.request(method, url, params=params, json=json, timeout=self.timeout)
+            except requests.RequestException:
+                response = None
+            if response is None or response.status_code >= 500:
+                self._mark_failure()
+                break
+            # 4xx nie zniknie przy ponownej próbie, więc wpis też jest usuwany
+            sent_ids.extend(ids)
+            self._mark_success()
+        self.store.ack(sent_ids)
+        if sent_ids:
+            print(f"Forwarded {len(sent_ids)} queued requests, {len(self.store)} left")
+
+    def _send(self, batch):
+        if self._backend_down():
+            error = requests.ConnectionError("backend unavailable, request queued on disk")
+            for request in batch:
+                self._persist(request)
+                self._notify(request, None, error)
+            return
+
+        batched = [request for request in batch if self.batch_url is not None and request.batch_payload is not None]
+        single = [request for request in batch if request not in batched]
+
+        if len(batched) == 1:
+            single.append(batched.pop())
+        if batched:
+            payload = [request.batch_payload for request in batched]
+            self._execute(batched, "POST", self.batch_url, None, payload)
+        for request in single:
+            self._execute([request], request.method, request.url, request.params, request.json)
+
+    def _execute(self, items, method, url, params, json):
+        response = None
+        error = None
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, params=params, json=json, timeout=self.timeout)
+        except requests.RequestException as e:
+            error = e
+        # 5xx to nieudana wysyłka (jak w _drain), 4xx nie zniknie przy ponownej próbie
+        if response is not None and response.status_code < 500:
+            self.sent += len(items)
+        else:
+            self.failed += len(items)
+        REGISTRY.histogram("http_request_seconds", "Uplink HTTP request latency", method=method).observe(
+            time.perf_counter() - start)
+        status = "error" if response is None else f"{response.status_code // 100}xx"
+        REGISTRY.counter("http_requests_total", "Uplink HTTP requests by status", method=method, status=status).inc()
+
+        if self.store is not None:
+            if error is not None or response.status_code >= 500:
+                self._mark_failure()
+                for request in items:
+                    self._persist(request)
+            else:
+                self._mark_success()
+                for request in items:
+                    # Starsze wersje tego żądania z dysku są już nieaktualne
+                    if request.coalesce_key is not None:
+                        self.store.discard_key(request.coalesce_key)
+        for request in items:
+            self._notify(request, response, error)
+
+    def _notify(self, request, response, error):
+        if request.callback is None:
+            return
+        try:
+            request.callback(request, response, error)
+        except Exception as e:
+            print(f"Error in uplink callback: {e}")
+
+
+# Test przepustowości na lokalnym serwerze HTTP
+def _start_local_server():
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def _reply(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        do_PUT = _reply
+        do_POST = _reply
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark(count=500, terrariums=8):
+    """Porównuje żądania/s: requests.put per wywołanie, sesja keep-alive i paczki."""
+    server = _start_local_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    params = {"current_temperature1": 24.5, "current_temperature2": 24.0, "current_hum": 60.0}
+    results = {}
+    try:
+        start = time.perf_counter()
+        for i in range(count):
+            requests.put(f"{url}/terrariums/update/{i % terrariums}", params=params)
+        results["requests_put_per_call"] = count / (time.perf_counter() - start)
+
+        for name, batch_url in (("uplink_session", None), ("uplink_batched", f"{url}/terrariums/update/batch")):
+            uplink = Uplink(max_queue=count, batch_url=batch_url).start()
+            start = time.perf_counter()
+            for i in range(count):
+                terrarium_id = i % terrariums
+                uplink.put(f"{url}/terrariums/update/{terrarium_id}", params=params,
+                           batch_payload=dict(params, terrarium_id=terrarium_id))
+            enqueue_time = time.perf_counter() - start
+            uplink.stop(timeout=60)
+            results[name] = count / (time.perf_counter() - start)
+            results[name + "_enqueue_us"] = enqueue_time / count * 1e6
+    finally:
+        server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:.1f}")
@@ -0,0 +1,336 @@
+import asyncio
+import os
+import time
+
+from streaming_stats import RunningStats
+
+# Odczyt wszystkich DS18B20 na magistrali 1-Wire jedną wspólną konwersją.
+# Jądro (>= 5.10) udostępnia w1_bus_master*/therm_bulk_read: zapis "trigger"
+# startuje konwersję na wszystkich czujnikach naraz, a potem atrybut
+# "temperature" każdego czujnika zwraca gotowy wynik bez nowej konwersji.
+# Na starszych jądrach każdy czujnik czytany jest osobno przez w1_slave.
+#
+# Rozdzielczość DS18B20 (9-12 bitów) zmienia czas konwersji z 94 ms do
+# 750 ms. AdaptiveResolution przełącza czujnik na 9 bitów, gdy temperatura
+# jest daleko od zadanej (nagrzewanie), i wraca do 12 bitów przy zadanej;
+# ResolutionPolicy ma histerezę, żeby nie przełączać co cykl.
+
+W1_DEVICES_PATH = "/sys/bus/w1/devices"
+DS18B20_FAMILY = "28"
+CONVERSION_TIME = 0.75  # Konwersja 12-bit
+# Czas konwersji [s] według rozdzielczości z noty katalogowej
+CONVERSION_TIMES = {9: 0.09375, 10: 0.1875, 11: 0.375, 12: 0.75}
+RESET_VALUE = 85.0  # Wartość po resecie czujnika, nie jest prawdziwym pomiarem
+
+
+def parse_w1_slave(content):
+    """Zwraca temperaturę w °C z zawartości pliku w1_slave albo None przy błędzie CRC."""
+    lines = content.strip().splitlines()
+    if len(lines) < 2 or not lines[0].strip().endswith("YES"):
+        return None
+    position = lines[1].find("t=")
+    if position == -1:
+        return None
+    return int(lines[1][position + 2:]) / 1000.0
+
+
+class W1BusReader:
+    def __init__(self, base_path=W1_DEVICES_PATH, family=DS18B20_FAMILY,
+                 conversion_time=CONVERSION_TIME, poll_interval=0.01, use_bulk_read=True):
+        self.base_path = base_path
+        self.family = family
+        self.conversion_time = conversion_time
+        self.poll_interval = poll_interval
+        self.use_bulk_read = use_bulk_read
+        self.resolutions = {}  # Rozdzielczości ustawione przez set_resolution
+
+    def bus_masters(self):
+        """Ścieżki do therm_bulk_read wszystkich masterów, które go obsługują."""
+        masters = []
+        for name in sorted(os.listdir(self.base_path)):
+            path = os.path.join(self.base_path, name, "therm_bulk_read")
+            if name.startswith("w1_bus_master") and os.path.exists(path):
+                masters.append(path)
+        return masters
+
+    def sensor_ids(self):
+        # Identyfikatory w formacie W1ThermSensor.id, bez prefiksu rodziny
+        prefix = f"{self.family}-"
+        return [name[len(prefix):] for name in sorted(os.listdir(self.base_path)) if name.startswith(prefix)]
+
+    def supports_bulk_read(self):
+        return self.use_bulk_read and bool(self.bus_masters())
+
+    def _sensor_path(self, sensor_id, attribute):
+        return os.path.join(self.base_path, f"{self.family}-{sensor_id}", attribute)
+
+    def _trigger(self, masters):
+        for path in masters:
+            with open(path, "w") as file:
+                file.write("trigger\n")
+
+    def _wait_for_conversion(self, masters):
+        # therm_bulk_read zwraca -1, dopóki którakolwiek konwersja trwa
+        deadline = time.monotonic() + 2 * self.conversion_time
+        while True:
+            pending = False
+            for path in masters:
+                with open(path) as file:
+                    if file.read().strip() == "-1":
+                        pending = True
+                        break
+            if not pending or time.monotonic() > deadline:
+                return not pending
+            time.sleep(self.poll_interval)
+
+    def _read_converted(self, sensor_id):
+        path = self._sensor_path(sensor_id, "temperature")
+        if not os.path.exists(path):
+            return self.read_sensor(sensor_id)
+        with open(path) as file:
+            return int(file.read().strip()) / 1000.0
+
+    def read_sensor(self, sensor_id):
+        """Pojedynczy odczyt z własną konwersją (ścieżka dla starszych jąder)."""
+        with open(self._sensor_path(sensor_id, "w1_slave")) as file:
+            return parse_w1_slave(file.read())
+
+    def set_resolution(self, sensor_id, bits):
+        """Rozdzielczość czujnika przez atrybut "resolution" (nowsze jądra) albo w1_slave."""
+        if not 9 <= bits <= 12:
+            raise ValueError(f"DS18B20 resolution out of range (9-12): {bits}")
+        path = self._sensor_path(sensor_id, "resolution")
+        if not os.path.exists(path):
+            path = self._sensor_path(sensor_id, "w1_slave")
+        with open(path, "w") as file:
+            file.write(f"{bits}\n")
+        self.resolutions[sensor_id] = bits
+        # Wspólna konwersja trwa tyle, co najwolniejszy czujnik (domyślnie 12 bitów)
+        self.conversion_time = max(CONVERSION_TIMES[self.resolutions.get(other, 12)]
+                                   for other in self.sensor_ids())
+
+    def read_all(self, sensor_ids=None):
+        """Zwraca {sensor_id: temperatura w °C lub None} dla wszystkich czujników."""
+        if sensor_ids is None:
+            sensor_ids = self.sensor_ids()
+        masters = self.bus_masters() if self.use_bulk_read else []
+        if masters:
+            try:
+                self._trigger(masters)
+                if self._wait_for_conversion(masters):
+                    read = self._read_converted
+                else:
+                    # Atrybut temperature trzyma wtedy wynik poprzedniej konwersji
+                    print("Error reading DS18B20 bus: bulk conversion timeout, reading sensors one by one")
+                    read = self.read_sensor
+            except OSError as e:
+                print(f"Error triggering bulk conversion: {e}")
+                read = self.read_sensor
+        else:
+            read = self.read_sensor
+
+        temperatures = {}
+        for sensor_id in sensor_ids:
+            try:
+                temperature = read(sensor_id)
+            except (OSError, ValueError) as e:
+                print(f"Error reading from DS18B20 {sensor_id}: {e}")
+                temperature = None
+            if temperature == RESET_VALUE:
+                print(f"Error reading from DS18B20 {sensor_id}: power-on reset value")
+                temperature = None
+            temperatures[sensor_id] = temperature
+        return temperatures
+
+
+def resolution_step(bits):
+    """Krok odczytu [°C] przy danej rozdzielczości (12 bitów: 0.0625)."""
+    return 1.0 / (1 << (bits - 8))
+
+
+class ResolutionPolicy:
+    """Niska rozdzielczość od |uchybu| >= far, wysoka od |uchybu| <= near."""
+
+    def __init__(self, far=2.0, near=1.0, low=9, high=12):
+        if near >= far:
+            raise ValueError("near must be smaller than far")
+        self.far = far
+        self.near = near
+        self.low = low
+        self.high = high
+
+    def choose(self, current, error):
+        if error is None:
+            return current
+        if abs(error) >= self.far:
+            return self.low
+        if abs(error) <= self.near:
+            return self.high
+        return current
+
+
+class AdaptiveResolution:
+    """DS18B20 (W1ThermSensor lub AsyncW1ThermSensor) ze zmienną rozdzielczością.
+
+    Mierzy czas konwersji dla każdej rozdzielczości i efektywną częstotliwość
+    odczytów. adjust(uchyb) wołany po każdym cyklu regulatora zmienia
+    rozdzielczość według policy.
+    """
+
+    def __init__(self, sensor, policy=None, resolution=12, clock=None):
+        self.sensor = sensor
+        self.policy = policy or ResolutionPolicy()
+        self.resolution = resolution
+        self.clock = clock or (lambda: time.monotonic())
+        self.conversion = {}  # bity -> RunningStats czasu odczytu [s]
+        self.switches = 0
+        self.failed = False  # set_resolution niedostępne (np. brak roota)
+        self._last_read = None
+        self._interval = None  # Średnia krocząca odstępu między odczytami [s]
+
+    @property
+    def id(self):
+        return getattr(self.sensor, "id", None)
+
+    @property
+    def step(self):
+        return resolution_step(self.resolution)
+
+    def get_temperature(self):
+        start = self.clock()
+        result = self.sensor.get_temperature()
+        if asyncio.iscoroutine(result):
+            return self._timed(result, start, self.resolution)
+        self._record(start, self.resolution)
+        return result
+
+    async def _timed(self, coroutine, start, bits):
+        result = await coroutine
+        self._record(start, bits)
+        return result
+
+    def _record(self, start, bits):
+        now = self.clock()
+        self.conversion.setdefault(bits, RunningStats()).add(now - start)
+        if self._last_read is not None:
+            interval = now - self._last_read
+            self._interval = interval if self._interval is None else 0.8 * self._interval + 0.2 * interval
+        self._last_read = now
+
+    def set_resolution(self, bits):
+        try:
+            self.sensor.set_resolution(bits)
+        except Exception as e:
+            print(f"Error setting DS18B20 resolution to {bits} bit: {e}")
+            self.failed = True
+            return False
+        self.resolution = bits
+        self.switches += 1
+        return True
+
+    def target(self, error):
+        """Rozdzielczość, na którą trzeba przejść przy danym uchybie (None: bez zmiany)."""
+        if self.failed:
+            return None
+        bits = self.policy.choose(self.resolution, error)
+        return None if bits == self.resolution else bits
+
+    def adjust(self, error):
+        """Zmienia rozdzielczość według uchybu; zwraca aktualną rozdzielczość."""
+        bits = self.target(error)
+        if bits is not None:
+            self.set_resolution(bits)
+        return self.resolution
+
+    def conversion_time(self, bits=None):
+        """Średni zmierzony czas odczytu (z katalogu, gdy jeszcze nie mierzony)."""
+        bits = self.resolution if bits is None else bits
+        stats = self.conversion.get(bits)
+        return stats.mean if stats is not None and stats.count else CONVERSION_TIMES[bits]
+
+    @property
+    def sample_rate(self):
+        """Efektywna liczba odczytów na sekundę."""
+        return 1.0 / self._interval if self._interval else None
+
+    def stats(self):
+        return {
+            "resolution": self.resolution,
+            "switches": self.switches,
+            "sample_rate": self.sample_rate,
+            "conversion_time": {bits: stats.mean for bits, stats in sorted(self.conversion.items())},
+        }
+
+
+def write_fake_w1_tree(base_path, temperatures, bulk_read=True):
+    """Tworzy sztuczne drzewo /sys/bus/w1/devices do testów bez Raspberry Pi.
+
+    temperatures to {sensor_id: °C}; bulk_read=False udaje starsze jądro.
+    """
+    master = os.path.join(base_path, "w1_bus_master1")
+    os.makedirs(master, exist_ok=True)
+    if bulk_read:
+        with open(os.path.join(master, "therm_bulk_read"), "w") as file:
+            file.write("0\n")
+    for sensor_id, temperature in temperatures.items():
+        path = os.path.join(base_path, f"{DS18B20_FAMILY}-{sensor_id}")
+        os.makedirs(path, exist_ok=True)
+        millidegrees = int(temperature * 1000)
+        raw = int(temperature * 16) & 0xFFFF
+        scratchpad = f"{raw & 0xFF:02x} {raw >> 8:02x} 4b 46 7f ff 0c 10 1c"
+        with open(os.path.join(path, "w1_slave"), "w") as file:
+            file.write(f"{scratchpad} : crc=1c YES\n{scratchpad} t={millidegrees}\n")
+        if bulk_read:
+            with open(os.path.join(path, "temperature"), "w") as file:
+                file.write(f"{millidegrees}\n")
+            with open(os.path.join(path, "resolution"), "w") as file:
+                file.write("12\n")
+
+
+def simulate_warmup(adaptive=True, setpoint=34.0, duration=1800.0, gain=40.0):
+    """Nagrzewanie symulowanego terrarium (hardware_sim) regulatorem P.
+
+    Odczyty idą jeden za drugim, więc czas konwersji wprost wyznacza
+    częstotliwość próbkowania. Zwraca liczbę odczytów, średni czas odczytu
+    i rozdzielczość na końcu.
+    """
+    from hardware_sim import PlantBackend, VirtualClock, make_w1thermsensor_module
+
+    clock = VirtualClock()
+    backend = PlantBackend(clock)
+    sensor = make_w1thermsensor_module(backend, clock).W1ThermSensor()
+    policy = ResolutionPolicy() if adaptive else ResolutionPolicy(low=12, high=12)
+    adaptive_sensor = AdaptiveResolution(sensor, policy, clock=clock.monotonic)
+    reads = 0
+    while clock.now < duration:
+        temperature = adaptive_sensor.get_temperature()
+        reads += 1
+        error = setpoint - temperature
+        backend.set_duty(None, 100.0 - min(max(gain * error, 0.0), 100.0))
+        adaptive_sensor.adjust(error)
+    return {"reads": reads, "mean_read_time": clock.now / reads, **adaptive_sensor.stats()}
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    for adaptive in (False, True):
+        result = simulate_warmup(adaptive)
+        print(f"Warm-up 24 -> 34 C (adaptive={adaptive}): {result['reads']} reads, "
+              f"{result['mean_read_time'] * 1000:.0f} ms/read, {result['switches']} switches, "
+              f"final {result['resolution']} bits")
+
+    if os.path.isdir(W1_DEVICES_PATH):
+        reader = W1BusReader()
+        start = time.monotonic()
+        temperatures = reader.read_all()
+        mode = "bulk" if reader.supports_bulk_read() else "per-sensor"
+        print(f"Read {len(temperatures)} sensors ({mode}) in {time.monotonic() - start:.3f}s")
+        for sensor_id, temperature in temperatures.items():
+            print(f"DS18B20 {sensor_id}: {temperature}")
+    else:
+        with tempfile.TemporaryDirectory() as base_path:
+            write_fake_w1_tree(base_path, {"3ce1d4433914": 24.9375, "3ce1d4430a2b": 31.0625})
+            for use_bulk_read in (True, False):
+                reader = W1BusReader(base_path, use_bulk_read=use_bulk_read)
+                print(f"Fake bus (bulk={use_bulk_read}): {reader.read_all()}")
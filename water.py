@@ -1,28 +1,26 @@
 import RPi.GPIO as GPIO
-import time
+
+from actuator_schedule import Actuator, ActuatorScheduler
 
 # Pin configuration
 GPIO_PIN = 4  # GPIO pin connected to the pump
 
 # GPIO setup
 GPIO.setmode(GPIO.BCM)  # Use BCM numbering
-GPIO.setup(GPIO_PIN, GPIO.OUT)  # Set the pin as an output
 
-try:
-    while True:
-        # Set pin to LOW (turn pump ON)
-        GPIO.output(GPIO_PIN, GPIO.LOW)
-        print("Pump ON (LOW)")
-        time.sleep(10)  # Wait for 10 seconds
+# Pompa 10 s włączona / 10 s wyłączona z harmonogramu wyjść zamiast pętli
+# z time.sleep(); limit max_on wyłączy pompę, gdyby coś poszło nie tak
+scheduler = ActuatorScheduler()
+scheduler.add_actuator(Actuator("Pump", GPIO_PIN, active_low=True, max_on=15))  # LOW = pump ON
+scheduler.every("pump_cycle", "Pump", period=20, duration=10)
 
-        # Set pin to HIGH (turn pump OFF)
-        GPIO.output(GPIO_PIN, GPIO.HIGH)
-        print("Pump OFF (HIGH)")
-        time.sleep(10)  # Wait for 10 seconds
+try:
+    scheduler.run()
 
 except KeyboardInterrupt:
     print("Stopping script...")
 
 finally:
+    scheduler.all_off()
     # Cleanup GPIO settings before exiting
     GPIO.cleanup()